@@ -1,9 +1,20 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Q
+
+from atss_backend.largetables import LargeTableAdminMixin
 from .models import CustomUser
 
+
+def email_search(term, path='pk'):
+    """Admin search filter: users at ``path`` whose email is ``term`` (served by the email index)"""
+    if '@' not in term:
+        return Q(pk__in=[])
+    return Q(**{f'{path}__in': CustomUser.objects.with_email(term).values('pk')})
+
+
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
 
     list_display = (
         'username', 'email', 'first_name', 'last_name',
@@ -40,5 +51,10 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-    search_fields = ('username', 'email')
-    ordering = ('email',)
+    # newest accounts first, paged on the (date_joined, id) index
+    keyset_fields = ('date_joined', 'pk')
+    search_fields = ('^username', '^last_name')
+
+    def search_filters(self, request, term):
+        yield from super().search_filters(request, term)
+        yield email_search(term)
@@ -1,17 +1,44 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+
+from .hashing import ahash_password
 
 User = get_user_model()
 
 class EmailAuthBackend(ModelBackend):
+    """
+    Email + password login. One indexed, case-insensitive lookup; an
+    unknown email still pays for one password hash so it takes as long as
+    a wrong password. A failed email login raises PermissionDenied, which
+    makes django.contrib.auth.authenticate() stop instead of trying the
+    remaining backends. Hashing runs in the accounts.hashing pool;
+    aauthenticate (used by django.contrib.auth.aauthenticate) awaits it.
+    """
+
     def authenticate(self, request, email=None, password=None, **kwargs):
         if email is None or password is None:
             return None
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.get_by_email(email)
         except User.DoesNotExist:
-            return None
-        
+            # constant cost: same hasher and work factor as a real check
+            User().set_password(password)
+            raise PermissionDenied
+
         if user.check_password(password):
             return user
-        return None
+        raise PermissionDenied
+
+    async def aauthenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        try:
+            user = await User.objects.with_email(email).aget()
+        except User.DoesNotExist:
+            await ahash_password(password)
+            raise PermissionDenied
+
+        if await user.acheck_password(password):
+            return user
+        raise PermissionDenied
@@ -0,0 +1,135 @@
+# accounts/bulk.py
+"""
+Bulk account changes: verify/unverify, activate/deactivate, user type.
+
+Targets are a list of user ids or a filter expression (FILTER_FIELDS).
+They're processed in batches of BATCH_SIZE; each batch is one transaction
+that locks its rows, reads the current values and issues a single UPDATE
+for the rows that actually change. ``users_bulk_updated`` is sent once
+per committed batch (cache invalidation and the audit log listen in
+accounts/signals.py) instead of a post_save per user.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+from .models import CustomUser
+from .tokens import forget_token_versions
+
+BATCH_SIZE = 500
+MAX_IDS = 10000
+
+ACTIONS = {
+    'verify': {'is_verified': True},
+    'unverify': {'is_verified': False},
+    'activate': {'is_active': True},
+    'deactivate': {'is_active': False},
+    'set_user_type': {},  # {'user_type': ...} from the request
+}
+# an admin can't lock themselves out
+SELF_FORBIDDEN = {'deactivate', 'set_user_type'}
+
+# filter expression key -> queryset lookup
+FILTER_FIELDS = {
+    'user_type': 'user_type',
+    'is_verified': 'is_verified',
+    'is_active': 'is_active',
+    'joined_after': 'date_joined__gte',
+    'joined_before': 'date_joined__lt',
+    'year_graduated': 'alumni_profile__year_graduated',
+    'program': 'alumni_profile__program',
+}
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+# sent once per committed batch: sender=CustomUser, actor, action, changes, user_ids
+users_bulk_updated = Signal()
+
+
+def _id_batches(ids, filters, batch_size):
+    if ids is not None:
+        for start in range(0, len(ids), batch_size):
+            yield ids[start:start + batch_size]
+        return
+    # filter: walk the primary key so each batch is an index range
+    queryset = CustomUser.objects.filter(**filters).order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def _apply_batch(actor, action, changes, batch):
+    results = {}
+    fields = list(changes)
+    with transaction.atomic():
+        current = {
+            row[0]: row[1:]
+            for row in CustomUser.objects.select_for_update()
+            .filter(pk__in=batch).values_list('pk', *fields)
+        }
+        target = tuple(changes[field] for field in fields)
+        to_update = []
+        for user_id in batch:
+            if user_id not in current:
+                results[user_id] = NOT_FOUND
+            elif user_id == actor.pk and action in SELF_FORBIDDEN:
+                results[user_id] = FORBIDDEN
+            elif current[user_id] == target:
+                results[user_id] = UNCHANGED
+            else:
+                results[user_id] = UPDATED
+                to_update.append(user_id)
+
+        if to_update:
+            update = dict(changes)
+            if action == 'deactivate':
+                # revoke their tokens, as CustomUser.save does for one user
+                update['token_version'] = F('token_version') + 1
+            CustomUser.objects.filter(pk__in=to_update).update(**update)
+            if action == 'deactivate':
+                forget_token_versions(to_update)
+            transaction.on_commit(lambda: users_bulk_updated.send(
+                sender=CustomUser, actor=actor, action=action,
+                changes=changes, user_ids=to_update,
+            ))
+    return results
+
+
+def bulk_update_users(actor, action, ids=None, filters=None, user_type=None, batch_size=None):
+    """
+    Apply ``action`` to the users in ``ids`` (a list of UUIDs) or matching
+    ``filters`` (FILTER_FIELDS keys). Returns {user id: result}, where
+    result is one of UPDATED, UNCHANGED, NOT_FOUND or FORBIDDEN.
+    """
+    changes = dict(ACTIONS[action])
+    if action == 'set_user_type':
+        changes['user_type'] = user_type
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+    lookups = {FILTER_FIELDS[key]: value for key, value in (filters or {}).items()}
+
+    results = {}
+    for batch in _id_batches(ids, lookups, batch_size or BATCH_SIZE):
+        results.update(_apply_batch(actor, action, changes, batch))
+    return results
+
+
+def summarize(action, results):
+    """Response body for a bulk action: per-result counts and per-id results"""
+    counts = {}
+    for result in results.values():
+        counts[result] = counts.get(result, 0) + 1
+    return {
+        'action': action,
+        'counts': counts,
+        'results': {str(key): result for key, result in results.items()},
+    }
@@ -0,0 +1,117 @@
+# accounts/hashing.py
+"""
+Password hashing in a process pool.
+
+PBKDF2 is pure CPU work that holds the GIL for the whole hash, so a burst
+of logins on the request worker stalls every other request in the same
+process. These helpers run the hash or verify in a bounded
+ProcessPoolExecutor (PASSWORD_HASHING_WORKERS processes) instead:
+the calling thread only waits on a future, and async callers await it
+without tying up a thread at all.
+
+CustomUser.set_password / check_password / acheck_password and
+CustomUserManager.create_user go through here, so registration, login,
+password change and reset all use the pool. A sync view still holds its
+thread while it waits, and under ASGI every sync view shares one thread,
+so the login and registration views are async and await the pool
+(aauthenticate, ahash_password); password change and reset are rare
+enough to stay sync. With
+PASSWORD_HASHING_WORKERS=0 (the default under DEBUG and in tests)
+everything runs inline, exactly as Django would.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_lock = threading.Lock()
+_executor = None
+
+
+# ──────────────────────────────────────────────────────────
+# WORKER SIDE
+# ──────────────────────────────────────────────────────────
+def _hash(password):
+    return hashers.make_password(password)
+
+
+def _verify(password, encoded):
+    """(is_correct, new encoded hash if the stored one needs upgrading)"""
+    is_correct, must_update = hashers.verify_password(password, encoded)
+    return is_correct, hashers.make_password(password) if is_correct and must_update else None
+
+
+# ──────────────────────────────────────────────────────────
+# POOL
+# ──────────────────────────────────────────────────────────
+def worker_count():
+    return getattr(settings, 'PASSWORD_HASHING_WORKERS', 0)
+
+
+def get_executor():
+    """The shared pool, started on first use. None when hashing runs inline."""
+    global _executor
+    if worker_count() <= 0:
+        return None
+    with _lock:
+        if _executor is None:
+            # spawn, not fork: the parent has DB connections and logging threads
+            _executor = ProcessPoolExecutor(
+                max_workers=worker_count(),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+
+
+def _run(fn, *args):
+    executor = get_executor()
+    if executor is not None:
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # a worker died; start a fresh pool next time, do this one inline
+            shutdown(wait=False)
+    return fn(*args)
+
+
+async def _arun(fn, *args):
+    executor = get_executor()
+    if executor is not None:
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            shutdown(wait=False)
+    return await asyncio.to_thread(fn, *args)
+
+
+# ──────────────────────────────────────────────────────────
+# API
+# ──────────────────────────────────────────────────────────
+def hash_password(password):
+    return _run(_hash, password)
+
+
+def verify_password(password, encoded):
+    """(is_correct, upgraded hash or None); see django.contrib.auth.hashers.verify_password"""
+    return _run(_verify, password, encoded)
+
+
+async def ahash_password(password):
+    return await _arun(_hash, password)
+
+
+async def averify_password(password, encoded):
+    return await _arun(_verify, password, encoded)
@@ -0,0 +1,106 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from accounts import hashing
+from accounts.models import CustomUser
+from atss_backend.loadtest import percentile
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login throughput with password hashing inline and in the "
+        "accounts.hashing process pool. Logins run from several threads, like "
+        "concurrent requests in one Daphne process, while a bystander thread "
+        "measures how long a trivial request would be stalled. The benchmark "
+        "users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=48, help='Logins per mode')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent login threads')
+        parser.add_argument('--workers', type=int, default=4, help='Hashing processes for the pooled run')
+
+    def handle(self, *args, **options):
+        logins, threads, workers = options['logins'], options['threads'], options['workers']
+        if logins <= 0 or threads <= 0 or workers <= 0:
+            raise CommandError('--logins, --threads and --workers must be positive')
+
+        tag = uuid.uuid4().hex[:8]
+        emails = [f'bench-login-{tag}-{i}@example.com' for i in range(threads)]
+        with override_settings(PASSWORD_HASHING_WORKERS=0):
+            encoded = hashing.hash_password(PASSWORD)
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench-login-{tag}-{i}', email=email, password=encoded)
+            for i, email in enumerate(emails)
+        ])
+        try:
+            for label, count in (('inline', 0), (f'pool x{workers}', workers)):
+                with override_settings(PASSWORD_HASHING_WORKERS=count):
+                    if count:
+                        self._warm_up(count)
+                    self._report(label, self._run(emails, logins, threads))
+                    hashing.shutdown()
+        finally:
+            CustomUser.objects.filter(username__startswith=f'bench-login-{tag}-').delete()
+
+    def _warm_up(self, workers):
+        # start every worker process before timing
+        executor = hashing.get_executor()
+        list(executor.map(hashing._hash, ['warm-up'] * workers))
+
+    def _run(self, emails, logins, threads):
+        latencies = []
+        stalls = []
+        done = threading.Event()
+
+        def bystander():
+            # a request that needs 1 ms of wall time; anything beyond that is
+            # time spent waiting for the GIL
+            while not done.is_set():
+                start = time.perf_counter()
+                time.sleep(0.001)
+                stalls.append((time.perf_counter() - start) * 1000 - 1)
+
+        def login(i):
+            start = time.perf_counter()
+            try:
+                user = authenticate(email=emails[i % len(emails)], password=PASSWORD)
+            finally:
+                connection.close()
+            if user is None:
+                raise CommandError('benchmark login failed')
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        watcher = threading.Thread(target=bystander, daemon=True)
+        watcher.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        watcher.join()
+        return {
+            'logins': logins,
+            'per_second': logins / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': percentile(latencies, 99),
+            'stall_p50': statistics.median(stalls),
+            'stall_p99': percentile(stalls, 99),
+        }
+
+    def _report(self, label, result):
+        self.stdout.write(
+            f"{label:10} {result['logins']} logins  {result['per_second']:6.1f}/s  "
+            f"p50 {result['p50']:7.1f} ms  p99 {result['p99']:7.1f} ms  "
+            f"bystander stall p50 {result['stall_p50']:6.2f} ms  p99 {result['stall_p99']:6.2f} ms"
+        )
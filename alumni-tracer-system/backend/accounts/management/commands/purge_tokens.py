@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired JWT refresh tokens and their blacklist entries in "
+        "batches. Run it from cron; once a token has expired its rows "
+        "serve no purpose."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Count expired tokens without deleting')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('Batch size must be positive')
+
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        count = purge_expired_tokens(options['batch_size'], dry_run=options['dry_run'], log=log)
+        if options['dry_run']:
+            self.stdout.write(f"[dry run] {count} expired tokens would be deleted")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired tokens"))
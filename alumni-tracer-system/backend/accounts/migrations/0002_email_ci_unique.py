@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:24
+
+import accounts.models
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    The unique index can't be built while two accounts share an address in
+    different case. Merging accounts is a judgement call, so list them and
+    stop instead of guessing.
+    """
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+
+    accounts = {}
+    for user_id, email in CustomUser.objects.exclude(email='').values_list('id', 'email'):
+        accounts.setdefault(email.lower(), []).append(str(user_id))
+
+    duplicates = {email: ids for email, ids in accounts.items() if len(ids) > 1}
+    if duplicates:
+        listing = '\n'.join(f'  {email}: {", ".join(ids)}' for email, ids in sorted(duplicates.items()))
+        raise RuntimeError(
+            'These emails belong to more than one account (ignoring case). '
+            'Merge or rename them, then migrate again:\n' + listing
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', accounts.models.CustomUserManager()),
+            ],
+        ),
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='accounts_user_email_ci_unique'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+def revoke_inactive_users(apps, schema_editor):
+    """
+    Tokens issued so far have no version claim and count as version 0.
+    Start inactive accounts at 1 so their outstanding tokens stop working
+    now that refresh no longer checks is_active itself.
+    """
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    CustomUser.objects.filter(is_active=False).update(token_version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(revoke_inactive_users, migrations.RunPython.noop),
+    ]
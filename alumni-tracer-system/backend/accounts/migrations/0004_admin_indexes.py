@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_token_version'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['date_joined', 'id'], name='accounts_user_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name'], name='accounts_user_last_name_idx'),
+        ),
+    ]
@@ -1,8 +1,42 @@
 import uuid
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.utils import timezone
 
+from .hashing import averify_password, hash_password, verify_password
+
+
+class CustomUserManager(UserManager):
+    def with_email(self, email):
+        """
+        Users whose email matches case-insensitively. Compares lower(email)
+        so the lookup is served by the unique index on that expression
+        (``__iexact`` compiles to UPPER()/LIKE, which no index covers).
+        """
+        if not email:
+            return self.none()
+        # the index is partial (blank emails are exempt), so repeat its
+        # condition for the planner to pick it
+        return self.alias(email_lower=Lower('email')).filter(
+            ~models.Q(email=''), email_lower=email.lower()
+        )
+
+    def get_by_email(self, email):
+        return self.with_email(email).get()
+
+    def _create_user_object(self, username, email, password, password_hash=None, **extra_fields):
+        # hash through accounts.hashing (CustomUser.set_password) instead of
+        # make_password() on the request worker; async callers pass the
+        # ahash_password() result as password_hash
+        user = super()._create_user_object(username, email, None, **extra_fields)
+        if password_hash is not None:
+            user.password = password_hash
+        elif password is not None:
+            user.set_password(password)
+        return user
+
+
 class CustomUser(AbstractUser):
     USER_TYPE_CHOICES = (
         ('alumni', 'Alumni'),
@@ -15,6 +49,9 @@ class CustomUser(AbstractUser):
     date_joined = models.DateTimeField(default=timezone.now)
     is_active=models.BooleanField(default=True)
     is_verified = models.BooleanField(default=False)
+    # JWTs carry the version they were issued under; bumping it revokes them
+    # all (accounts/tokens.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     GENDER_CHOICES = [
         ('M', 'Male'),
         ('F', 'Female'),
@@ -29,6 +66,74 @@ class CustomUser(AbstractUser):
         null=True
     )
 
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # one account per address regardless of case; also the index
+            # behind CustomUserManager.with_email. Blank emails are exempt.
+            models.UniqueConstraint(
+                Lower('email'),
+                name='accounts_user_email_ci_unique',
+                condition=~models.Q(email=''),
+            ),
+        ]
+        indexes = [
+            # admin changelist: keyset pages and surname search
+            models.Index(fields=['date_joined', 'id'], name='accounts_user_joined_idx'),
+            models.Index(fields=['last_name'], name='accounts_user_last_name_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # read __dict__ so a deferred is_active isn't fetched; unknown counts
+        # as active, an extra revocation is harmless
+        user._was_active = user.__dict__.get('is_active', True)
+        return user
+
+    def save(self, *args, **kwargs):
+        # token_version only changes through F() updates (tokens.revoke_tokens
+        # and below): writing back the value this instance was loaded with
+        # would undo a revocation made since
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skip = {'token_version'} | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skip
+            ]
+        # deactivating an account revokes every token issued to it
+        revoke = self.__dict__.get('is_active') is False and getattr(self, '_was_active', False)
+        if revoke:
+            from .tokens import revoke_tokens
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                revoke_tokens([self.pk])
+            self.refresh_from_db(fields=['token_version'])
+        else:
+            super().save(*args, **kwargs)
+        self._was_active = self.__dict__.get('is_active', True)
+
+    # password hashing runs in the accounts.hashing process pool
+    def set_password(self, raw_password):
+        self.password = hash_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, upgraded = verify_password(raw_password, self.password)
+        if upgraded:
+            # a hash upgrade isn't a password change, so bypass set_password
+            self.password = upgraded
+            self.save(update_fields=['password'])
+        return is_correct
+
+    async def acheck_password(self, raw_password):
+        is_correct, upgraded = await averify_password(raw_password, self.password)
+        if upgraded:
+            self.password = upgraded
+            await self.asave(update_fields=['password'])
+        return is_correct
+
     def get_full_name(self):
         """Returns the first_name plus the last_name, with a space in between."""
         full_name = f'{self.first_name} {self.last_name}'
@@ -1,14 +1,19 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from django.contrib.auth import authenticate
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
 from django.contrib.auth import get_user_model
+from . import bulk
+from .hashing import ahash_password
 from .models import CustomUser
-from alumni.models import AlumniProfile
+from alumni.models import AlumniProfile, UserProfile
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
 from rest_framework.exceptions import AuthenticationFailed
 from django.core.mail import send_mail
 from rest_framework import generics, permissions
+from atss_backend.fieldsets import SparseFieldsMixin
 
 User = get_user_model()
 
@@ -26,11 +31,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ('email', 'username', 'password', 'password2', 'first_name', 'last_name', 
                  'phone_number', 'student_id', 'year_graduated', 'program')
     
+    def validate_email(self, value):
+        if User.objects.with_email(value).exists():
+            raise serializers.ValidationError("A user with this email already exists.")
+        return value
+
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password": "Password fields didn't match."})
         return attrs
     
+    @transaction.atomic
     def create(self, validated_data):
         # Remove alumni-specific fields if they exist
         student_id = validated_data.pop('student_id', None)
@@ -39,15 +50,27 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password2')
         
         # Create user
-        user = CustomUser.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=validated_data.get('first_name', ''),
-            last_name=validated_data.get('last_name', ''),
-            phone_number=validated_data.get('phone_number', ''),
-            user_type='alumni'  # Default to alumni for registration
-        )
+        try:
+            # a savepoint, so the unique checks below can still query
+            with transaction.atomic():
+                user = CustomUser.objects.create_user(
+                    username=validated_data['username'],
+                    email=validated_data['email'],
+                    password=validated_data['password'],
+                    password_hash=getattr(self, 'password_hash', None),
+                    first_name=validated_data.get('first_name', ''),
+                    last_name=validated_data.get('last_name', ''),
+                    phone_number=validated_data.get('phone_number', ''),
+                    user_type='alumni'  # Default to alumni for registration
+                )
+        except IntegrityError:
+            # a concurrent registration took the email (in any case) or the
+            # username between validation and the insert
+            if User.objects.with_email(validated_data['email']).exists():
+                raise serializers.ValidationError({"email": ["A user with this email already exists."]})
+            raise serializers.ValidationError({"username": ["A user with that username already exists."]})
+        # chat presence row, created here rather than by a post_save on every user save
+        UserProfile.objects.provision(user)
         
         # Create alumni profile if alumni-specific data provided
         if student_id and year_graduated and program:
@@ -60,7 +83,16 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         
         return user
 
+    async def asave(self):
+        """save() with the password hashed on the pool without holding a thread"""
+        self.password_hash = await ahash_password(self.validated_data['password'])
+        return await sync_to_async(self.save)()
+
 class UserLoginSerializer(serializers.Serializer):
+    """
+    Checks the fields; ``aauthenticate`` then checks the credentials with
+    the password hash awaited on the accounts.hashing pool.
+    """
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
 
@@ -72,25 +104,21 @@ class UserLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError({
                 "detail": "Email and password are required."
             })
+        return attrs
 
-        # Check if user exists
-        try:
-            User.objects.get(email=email)
-        except User.DoesNotExist as e:
-            raise serializers.ValidationError(
-                {"email": ["No user found with this email address"]}
-            ) from e
-
-        # Authenticate using custom backend
-        user = authenticate(
-            request=self.context.get("request"),
-            email=email,
-            password=password
+    async def aauthenticate(self, request=None):
+        """The user the validated credentials belong to; raises ValidationError"""
+        # EmailAuthBackend: one indexed lookup, and the same cost and the
+        # same answer whether the email or the password was wrong
+        user = await aauthenticate(
+            request=request,
+            email=self.validated_data["email"],
+            password=self.validated_data["password"]
         )
 
         if user is None:
             raise serializers.ValidationError({
-                "password": ["Invalid password"]
+                "detail": ["Invalid email or password"]
             })
 
         if not user.is_active:
@@ -98,11 +126,10 @@ class UserLoginSerializer(serializers.Serializer):
                 "detail":["Account is disabled"]
             })
 
-        attrs["user"] = user
-        return attrs
+        return user
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 
@@ -132,7 +159,7 @@ class EmailSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
     def validate_email(self, value):
-        if not User.objects.filter(email=value).exists():
+        if not User.objects.with_email(value).exists():
             raise serializers.ValidationError("No account found with this email address.")
         return value
 
@@ -168,4 +195,40 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError("Old password is incorrect")
-        return value
\ No newline at end of file
+        return value
+
+class BulkFilterSerializer(serializers.Serializer):
+    """Filter expression for bulk actions (accounts/bulk.py FILTER_FIELDS)"""
+    user_type = serializers.ChoiceField(choices=CustomUser.USER_TYPE_CHOICES, required=False)
+    is_verified = serializers.BooleanField(required=False)
+    is_active = serializers.BooleanField(required=False)
+    joined_after = serializers.DateTimeField(required=False)
+    joined_before = serializers.DateTimeField(required=False)
+    year_graduated = serializers.IntegerField(required=False)
+    program = serializers.CharField(required=False)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict) and set(data) - set(self.fields):
+            raise serializers.ValidationError(
+                f"Unknown filter fields: {', '.join(sorted(set(data) - set(self.fields)))}"
+            )
+        return super().to_internal_value(data)
+
+
+class BulkUserActionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=list(bulk.ACTIONS))
+    user_type = serializers.ChoiceField(choices=CustomUser.USER_TYPE_CHOICES, required=False)
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False, max_length=bulk.MAX_IDS
+    )
+    filter = BulkFilterSerializer(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Give either ids or filter.")
+        if 'filter' in data and not data['filter']:
+            # an empty filter would match every account
+            raise serializers.ValidationError({'filter': "At least one filter field is required."})
+        if data['action'] == 'set_user_type' and 'user_type' not in data:
+            raise serializers.ValidationError({'user_type': "Required for set_user_type."})
+        return data
@@ -1,9 +1,16 @@
+import logging
+
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from django.conf import settings
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from atss_backend.caching import invalidate_on, invalidate_tags
+from .bulk import users_bulk_updated
 from .models import CustomUser
 
+logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger('accounts.audit')
+
 @receiver(post_delete, sender=CustomUser)
 def delete_user_tokens_on_delete(sender, instance, **kwargs):
     """
@@ -17,4 +24,26 @@ def delete_user_tokens_on_delete(sender, instance, **kwargs):
         OutstandingToken.objects.filter(user=instance).delete()
     except Exception as e:
         # Log the error but don't crash the deletion process
-        print(f"Error deleting tokens for user {instance.id}: {e}")
\ No newline at end of file
+        logger.warning("Error deleting tokens for user %s: %s", instance.id, e, extra={'user_id': str(instance.id)})
+
+
+# Cached user lists/profiles and the alumni directory embed user fields.
+# Logins only touch last_login, which none of them show.
+invalidate_on(CustomUser, "users", "alumni", ignore_fields=("last_login",))
+# Event and notice lists only show their author's name and email
+invalidate_on(CustomUser, "user_names", fields=("first_name", "last_name", "email"))
+
+
+@receiver(users_bulk_updated)
+def on_users_bulk_updated(sender, actor, action, changes, user_ids, **kwargs):
+    # queryset.update() sends no post_save, so invalidate once for the batch
+    invalidate_tags("users", "alumni")
+    audit_logger.info(
+        "%s applied %s to %d users", actor.pk, action, len(user_ids),
+        extra={
+            'actor_id': str(actor.pk),
+            'action': action,
+            'changes': changes,
+            'user_ids': [str(user_id) for user_id in user_ids],
+        },
+    )
@@ -1,3 +1,277 @@
-from django.test import TestCase
+import importlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import bulk, hashing
+from .models import CustomUser
+from .serializers import UserRegistrationSerializer
+from .tokens import VersionedRefreshToken, purge_expired_tokens
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'auth': '3/min'},
+})
+class LoginThrottleTests(TestCase):
+    """Logins from one address are limited by the ``auth`` bucket"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_login_throttled_per_ip(self):
+        payload = {'email': 'nobody@example.com', 'password': 'wrong'}
+        for _ in range(3):
+            self.assertEqual(self.client.post('/api/auth/login/', payload, format='json').status_code, 400)
+        response = self.client.post('/api/auth/login/', payload, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response['Retry-After']), range(1, 21))
+
+        # another address has its own bucket
+        response = self.client.post('/api/auth/login/', payload, format='json', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 400)
+
+    def test_forwarded_for_does_not_reset_the_bucket(self):
+        payload = {'email': 'nobody@example.com', 'password': 'wrong'}
+        statuses = [
+            self.client.post(
+                '/api/auth/login/', payload, format='json', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}'
+            ).status_code
+            for i in range(5)
+        ]
+        self.assertEqual(statuses, [400, 400, 400, 429, 429])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_forwarded_for_behind_a_proxy(self):
+        payload = {'email': 'nobody@example.com', 'password': 'wrong'}
+        for _ in range(3):
+            self.client.post('/api/auth/login/', payload, format='json', HTTP_X_FORWARDED_FOR='203.0.113.1')
+        # the proxy's address is shared; the client address it appended isn't
+        response = self.client.post('/api/auth/login/', payload, format='json', HTTP_X_FORWARDED_FOR='203.0.113.2')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=1)
+class PooledAuthViewTests(TestCase):
+    """Registration and login await the hashing pool from async views"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(hashing.shutdown)
+
+    def test_register_and_login(self):
+        response = APIClient().post('/api/auth/register/', {
+            'email': 'pooled@example.com', 'username': 'pooled',
+            'password': 'S3cure-pass', 'password2': 'S3cure-pass',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(hashing._executor)
+        user = CustomUser.objects.get(email='pooled@example.com')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+        payload = {'email': 'pooled@example.com', 'password': 'S3cure-pass'}
+        response = APIClient().post('/api/auth/login/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'pooled@example.com')
+        self.assertIn('access', response.json())
+
+        payload['password'] = 'wrong'
+        response = APIClient().post('/api/auth/login/', payload, format='json')
+        self.assertEqual(response.json(), {'detail': ['Invalid email or password']})
+
+    def test_register_errors(self):
+        response = APIClient().post('/api/auth/register/', {
+            'email': 'pooled@example.com', 'username': 'pooled',
+            'password': 'a', 'password2': 'b',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+        response = APIClient().post('/api/auth/register/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class EmailLoginTests(TestCase):
+    """Emails are unique and matched ignoring case"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='mixed', email='Mixed.Case@Example.com', password='S3cure-pass'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, email, password='S3cure-pass'):
+        return APIClient().post('/api/auth/login/', {'email': email, 'password': password}, format='json')
+
+    def register(self, email, username='newcomer'):
+        return APIClient().post('/api/auth/register/', {
+            'email': email, 'username': username,
+            'password': 'S3cure-pass', 'password2': 'S3cure-pass',
+        }, format='json')
+
+    def test_login_ignores_case(self):
+        response = self.login('mixed.case@example.COM')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], str(self.user.id))
+
+    def test_same_answer_for_unknown_email_and_wrong_password(self):
+        unknown = self.login('nobody@example.com')
+        wrong = self.login('mixed.case@example.com', 'wrong')
+        self.assertEqual(unknown.status_code, 400)
+        self.assertEqual(unknown.json(), wrong.json())
+        self.assertEqual(wrong.json(), {'detail': ['Invalid email or password']})
+
+    def test_register_case_variant(self):
+        response = self.register('MIXED.case@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+
+    def test_concurrent_case_variant_is_a_400(self):
+        # the other registration commits between validation and the insert
+        with mock.patch.object(UserRegistrationSerializer, 'validate_email', side_effect=lambda value: value):
+            response = self.register('MIXED.case@example.com')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'email': ['A user with this email already exists.']})
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_migration_lists_duplicates(self):
+        migration = importlib.import_module('accounts.migrations.0002_email_ci_unique')
+        apps = mock.Mock()
+        apps.get_model.return_value.objects.exclude.return_value.values_list.return_value = [
+            (1, 'A@example.com'), (2, 'a@EXAMPLE.com'), (3, 'b@example.com'),
+        ]
+        with self.assertRaisesMessage(RuntimeError, 'a@example.com: 1, 2'):
+            migration.check_duplicate_emails(apps, None)
+
+        apps.get_model.return_value.objects.exclude.return_value.values_list.return_value = [
+            (1, 'a@example.com'), (3, 'b@example.com'),
+        ]
+        migration.check_duplicate_emails(apps, None)
+
+
+class TokenRevocationTests(TestCase):
+    """Bumping the token version invalidates access and refresh tokens already issued"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='revoked', email='revoked@example.com', password='pw'
+        )
+        self.refresh = VersionedRefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def refresh_status(self):
+        return APIClient().post('/api/auth/token/refresh/', {'refresh': str(self.refresh)}, format='json').status_code
+
+    def test_refresh_rotates(self):
+        response = APIClient().post('/api/auth/token/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # the used refresh token is blacklisted
+        self.assertEqual(self.refresh_status(), 401)
+
+    def test_logout_all(self):
+        self.assertEqual(self.client.post('/api/auth/logout-all/').status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+        self.assertEqual(self.refresh_status(), 401)
+
+    def test_deactivation_revokes(self):
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.refresh_status(), 401)
+
+    def test_stale_save_keeps_revocation(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        self.assertEqual(self.client.post('/api/auth/logout-all/').status_code, 200)
+        stale.first_name = 'Stale'
+        stale.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_stale_deactivation_increments(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        self.client.post('/api/auth/logout-all/')
+        stale.is_active = False
+        stale.save()
+        self.assertEqual(stale.token_version, 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 2)
+
+    def test_calendar_token_revoked(self):
+        url = self.client.get('/api/events/calendar-token/').json()['url']
+        self.assertEqual(APIClient().get(url).status_code, 200)
+        self.client.post('/api/auth/logout-all/')
+        self.assertEqual(APIClient().get(url).status_code, 401)
+
+    def test_purge_expired_tokens(self):
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.refresh.blacklist()
+        VersionedRefreshToken.for_user(self.user)  # still valid
+        self.assertEqual(purge_expired_tokens(batch_size=1), 1)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class BulkUserActionTests(TestCase):
+    """Bulk actions update many users per UPDATE and report a result per id"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='boss', email='boss@example.com', password='pw'
+        )
+        cls.users = [
+            CustomUser.objects.create_user(username=f'member{i}', email=f'member{i}@example.com', password='pw')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, payload):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post('/api/auth/users/bulk/', payload, format='json')
+        return response, callbacks
+
+    def test_verify_ids(self):
+        CustomUser.objects.filter(pk=self.users[0].pk).update(is_verified=True)
+        missing = '00000000-0000-0000-0000-000000000000'
+        ids = [str(u.pk) for u in self.users] + [missing]
+        with mock.patch.object(bulk, 'BATCH_SIZE', 3), mock.patch('accounts.signals.invalidate_tags') as invalidate:
+            response, callbacks = self.post({'action': 'verify', 'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['counts'], {'unchanged': 1, 'updated': 4, 'not_found': 1})
+        self.assertEqual(body['results'][missing], 'not_found')
+        self.assertEqual(CustomUser.objects.filter(is_verified=True).count(), 5)
+        # one hook call per batch (3 + 3 ids), not per user
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(invalidate.call_count, 2)
+
+    def test_deactivate_by_filter_skips_self(self):
+        response, _ = self.post({'action': 'deactivate', 'filter': {'is_active': True}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][str(self.admin.pk)], 'forbidden')
+        self.assertEqual(list(CustomUser.objects.filter(is_active=True)), [self.admin])
+        self.assertTrue(all(u.token_version == 1 for u in CustomUser.objects.exclude(pk=self.admin.pk)))
+
+    def test_validation(self):
+        self.assertEqual(self.post({'action': 'verify'})[0].status_code, 400)
+        self.assertEqual(self.post({'action': 'verify', 'filter': {}})[0].status_code, 400)
+        self.assertEqual(self.post({'action': 'verify', 'filter': {'password': 'x'}})[0].status_code, 400)
+        self.assertEqual(self.post({'action': 'set_user_type', 'ids': [str(self.users[0].pk)]})[0].status_code, 400)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.post({'action': 'verify', 'ids': [str(self.users[1].pk)]})[0].status_code, 403)
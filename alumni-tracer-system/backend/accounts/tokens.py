@@ -0,0 +1,173 @@
+# accounts/tokens.py
+"""
+JWT revocation by per-user token version, and pruning of the blacklist.
+
+Tokens are issued with the user's ``token_version`` in a ``ver`` claim.
+Bumping the version (``revoke_tokens``: "log out everywhere", account
+deactivation) makes every earlier token fail the comparison, so revoking
+is one UPDATE and checking is a cache read instead of a lookup in an
+ever-growing token table. The version is only ever written with an F()
+update (CustomUser.save leaves it out), so saving a stale user instance
+can't undo a revocation. Tokens issued before the claim existed count as
+version 0.
+
+Access tokens are checked against the user row the authentication loads
+anyway. The refresh endpoint reads the version from the cache under
+``token_version:<user id>`` (the user row on a miss). A revocation deletes
+that key, but only in the cache of the process that made it when CACHES is
+the per-process locmem default, so entries live VERSION_CACHE_TIMEOUT
+seconds: that bounds how long another worker can still refresh a revoked
+token. Use a shared cache (Redis, memcached) to make it immediate.
+
+Rotation still blacklists each used refresh token (simplejwt's
+token_blacklist app) so it can't be replayed, but those rows are dead
+weight once the token has expired; ``purge_expired_tokens`` (the
+``purge_tokens`` command) deletes them in batches.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+VERSION_CLAIM = 'ver'
+VERSION_CACHE_TIMEOUT = 60
+
+
+# ──────────────────────────────────────────────────────────
+# VERSIONS
+# ──────────────────────────────────────────────────────────
+def _version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def get_token_version(user_id):
+    """Current token version of ``user_id``, None if there is no such user"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = (
+            get_user_model().objects.filter(pk=user_id)
+            .values_list('token_version', flat=True).first()
+        )
+        if version is None:
+            return None
+        cache.add(key, version, VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def forget_token_versions(user_ids):
+    keys = [_version_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    # a request that read the old row before the bump committed may have
+    # cached it again
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def revoke_tokens(user_ids):
+    """Invalidate every token issued so far to ``user_ids``. Returns the number of users."""
+    user_ids = list(user_ids)
+    count = get_user_model().objects.filter(pk__in=user_ids).update(
+        token_version=F('token_version') + 1
+    )
+    forget_token_versions(user_ids)
+    return count
+
+
+# ──────────────────────────────────────────────────────────
+# TOKENS
+# ──────────────────────────────────────────────────────────
+class VersionedRefreshToken(RefreshToken):
+    """Refresh token carrying the user's token version (copied to its access tokens)"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    token_class = VersionedRefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    simplejwt's refresh with the version check in place of its user lookup:
+    deactivation bumps the version, so a current version implies an
+    active user.
+    """
+    token_class = VersionedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if get_token_version(user_id) != refresh.payload.get(VERSION_CLAIM, 0):
+            raise AuthenticationFailed('Token has been revoked.', 'token_revoked')
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+
+        return data
+
+
+def token_is_current(payload, user):
+    return payload.get(VERSION_CLAIM, 0) == user.token_version
+
+
+class VersionedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that rejects access tokens issued before the user's last revocation"""
+
+    def get_user(self, validated_token):
+        # the user row is loaded anyway, so compare against it rather than the cache
+        user = super().get_user(validated_token)
+        if not token_is_current(validated_token, user):
+            raise AuthenticationFailed('Token has been revoked.', 'token_revoked')
+        return user
+
+
+# ──────────────────────────────────────────────────────────
+# BLACKLIST PRUNING
+# ──────────────────────────────────────────────────────────
+def purge_expired_tokens(batch_size=1000, dry_run=False, log=None):
+    """
+    Delete outstanding tokens (and their blacklist entries) that have
+    expired, ``batch_size`` per statement. Returns the number deleted.
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+    if dry_run:
+        return expired.count()
+
+    deleted = 0
+    last_pk = 0
+    while True:
+        # walk the primary key instead of re-filtering from the start:
+        # expires_at has no index, but rows expire in roughly insertion order
+        batch = list(
+            expired.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if batch:
+            with transaction.atomic():
+                OutstandingToken.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+            last_pk = batch[-1]
+            if log:
+                log(f'Deleted {deleted} expired tokens')
+        if len(batch) < batch_size:
+            return deleted
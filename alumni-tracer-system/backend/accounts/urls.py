@@ -1,3 +1,4 @@
+from django.apps import apps
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
@@ -10,6 +11,7 @@ from .views import (
     request_password_reset,
     reset_password_confirm,
     change_password,
+    logout_all,
     verify_reset_token,
     UserDetailView,
     send_verification_email,
@@ -24,11 +26,10 @@ urlpatterns = [
     path('login/', login_user),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('logout-all/', logout_all, name='logout_all'),
     path('profile/', get_user_profile),
     path('profile/update/', update_user_profile),
-    path('users/<uuid:user_id>/', UserDetailView.as_view(), name='user-detail'),path('api/auth/', include('allauth.urls')),
-    path('api/auth/', include('dj_rest_auth.urls')),
-    path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
+    path('users/<uuid:user_id>/', UserDetailView.as_view(), name='user-detail'),
     
     # Password reset endpoints
     path('password/reset/', request_password_reset, name='password_reset'),
@@ -40,3 +41,11 @@ urlpatterns = [
     
     path('', include(router.urls)),
 ]
+
+# not installed under APP_PROFILE=api (see settings)
+if apps.is_installed('allauth.account'):
+    urlpatterns += [
+        path('api/auth/', include('allauth.urls')),
+        path('api/auth/', include('dj_rest_auth.urls')),
+        path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
+    ]
@@ -1,8 +1,9 @@
 import os
+from asgiref.sync import sync_to_async
 from rest_framework import status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login, get_user_model
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -11,9 +12,17 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.core.mail import send_mail
+from django.http import JsonResponse
 from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth.tokens import default_token_generator
+from atss_backend.caching import CachedResponseMixin, cache_response
+from atss_backend.fieldsets import get_sparse_params, select_fields
+from atss_backend.ratelimit import throttle
+from chat.auth import async_api_view, request_data
+
+from .bulk import bulk_update_users, summarize
+from .tokens import VersionedRefreshToken, revoke_tokens
 
 from .serializers import (
     EmailSerializer, 
@@ -25,7 +34,8 @@ from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
     UserProfileSerializer,
-    AdminUserSerializer
+    AdminUserSerializer,
+    BulkUserActionSerializer,
 )
 
 CustomUser = get_user_model()   # FIXED
@@ -33,50 +43,58 @@ User = get_user_model()
 
 password_reset_token_generator = PasswordResetTokenGenerator()
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def register_user(request):
-    serializer = UserRegistrationSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+# Login and registration are native async views: the password hash is
+# awaited on the accounts.hashing pool. As DRF (sync) views they would block
+# on it in the one thread ASGI servers run sync views in, stalling every
+# other sync request for the length of the hash.
+def _malformed():
+    return JsonResponse({'detail': 'JSON parse error.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            'user': UserProfileSerializer(user).data,
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-        }, status=status.HTTP_201_CREATED)
-    if user:
-        # Send verification email
-        token = default_token_generator.make_token(user)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        verification_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/verify-email/{uid}/{token}/"
 
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+async def _token_response(user, status_code):
+    refresh = await sync_to_async(VersionedRefreshToken.for_user)(user)
+    return JsonResponse({
+        'user': UserProfileSerializer(user).data,
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }, status=status_code)
 
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def login_user(request):
-    serializer = UserLoginSerializer(data=request.data)
-
-    if serializer.is_valid():
-        user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+@async_api_view(['POST'], scope='auth', authenticated=False)
+async def register_user(request):
+    data = request_data(request)
+    if data is None:
+        return _malformed()
+    serializer = UserRegistrationSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        user = await serializer.asave()
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+    return await _token_response(user, status.HTTP_201_CREATED)
 
-        return Response({
-            'user': UserProfileSerializer(user).data,
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-        }, status=status.HTTP_200_OK)
 
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+@async_api_view(['POST'], scope='auth', authenticated=False)
+async def login_user(request):
+    data = request_data(request)
+    if data is None:
+        return _malformed()
+    serializer = UserLoginSerializer(data=data)
+    try:
+        serializer.is_valid(raise_exception=True)
+        user = await serializer.aauthenticate(request)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+    return await _token_response(user, status.HTTP_200_OK)
 
 
 @api_view(['GET'])
+@cache_response('users', per_user=True)
 def get_user_profile(request):
     serializer = UserProfileSerializer(request.user)
-    return Response(serializer.data)
+    fields, _ = get_sparse_params(request)
+    return Response(select_fields(serializer.data, fields))
 
 
 @api_view(['PUT', 'PATCH'])  # Accept both PUT and PATCH
@@ -88,11 +106,27 @@ def update_user_profile(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()    # FIXED
     serializer_class = AdminUserSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+    cache_tags = ('users',)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk(self, request):
+        """
+        Verify/unverify, activate/deactivate or change the type of many users:
+        {"action": "verify", "ids": [...]} or {"action": "set_user_type",
+        "user_type": "admin", "filter": {"year_graduated": 2024}}
+        """
+        serializer = BulkUserActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return Response(summarize(data['action'], bulk_update_users(
+            request.user, data['action'], ids=data.get('ids'),
+            filters=data.get('filter'), user_type=data.get('user_type'),
+        )))
+
 from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -128,11 +162,12 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([throttle('email')])
 def request_password_reset(request):
     serializer = EmailSerializer(data=request.data)
     if serializer.is_valid():
         email = serializer.validated_data['email']
-        user = User.objects.get(email=email)
+        user = User.objects.get_by_email(email)
         
         # Generate password reset token using single instance
         token = password_reset_token_generator.make_token(user)
@@ -209,6 +244,13 @@ def reset_password_confirm(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_all(request):
+    """Revoke every access and refresh token of the current user"""
+    revoke_tokens([request.user.pk])
+    return Response({'message': 'Logged out on all devices'}, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def change_password(request):
@@ -265,11 +307,12 @@ def verify_reset_token(request, uidb64, token):
         )
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([throttle('email')])
 def send_verification_email(request):
     email = request.data.get('email')
     
     try:
-        user = CustomUser.objects.get(email=email)
+        user = CustomUser.objects.get_by_email(email)
         if user.is_verified:
             return Response({'message': 'Email is already verified'}, status=status.HTTP_400_BAD_REQUEST)
         
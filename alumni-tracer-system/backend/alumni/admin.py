@@ -1,21 +1,54 @@
 from django.contrib import admin
-from .models import AlumniProfile, Event, Notice
+
+from accounts.admin import email_search
+from atss_backend.largetables import LargeTableAdmin
+from .models import AlumniProfile, Event, EventRegistration, Notice
+from .registrations import promote_waitlist
 
 @admin.register(AlumniProfile)
-class AlumniProfileAdmin(admin.ModelAdmin):
+class AlumniProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'student_id', 'program', 'year_graduated', 'current_employer')
     list_filter = ('program', 'year_graduated')
-    search_fields = ('user__username', 'user__first_name', 'user__last_name', 'student_id')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    search_fields = ('=student_id', '^user__username', '^user__last_name')
+
+    def search_filters(self, request, term):
+        yield from super().search_filters(request, term)
+        yield email_search(term, 'user')
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('title', 'date', 'location', 'created_by', 'created_at')
+    list_display = ('title', 'date', 'location', 'capacity', 'registrations_count', 'waitlist_count', 'created_by', 'created_at')
     list_filter = ('date', 'created_at')
+    list_select_related = ('created_by',)
+    autocomplete_fields = ('created_by',)
     search_fields = ('title', 'description', 'location')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            # a raised (or removed) capacity frees seats for the waitlist
+            promote_waitlist(obj)
+
+@admin.register(EventRegistration)
+class EventRegistrationAdmin(LargeTableAdmin):
+    list_display = ('event', 'user', 'status', 'registration_date')
+    list_filter = ('status',)
+    list_select_related = ('event', 'user')
+    search_fields = ('^user__username',)
+    # counters on Event are maintained by alumni/registrations.py
+    readonly_fields = ('event', 'user', 'status', 'registration_date')
+
+    def search_filters(self, request, term):
+        yield from super().search_filters(request, term)
+        yield email_search(term, 'user')
+
 @admin.register(Notice)
 class NoticeAdmin(admin.ModelAdmin):
     list_display = ('title', 'created_by', 'created_at', 'is_active')
     list_filter = ('is_active', 'created_at')
+    list_select_related = ('created_by',)
+    autocomplete_fields = ('created_by',)
     search_fields = ('title', 'content')
 
@@ -0,0 +1,232 @@
+# alumni/feeds.py
+"""
+Calendar / timeline feeds for events.
+
+Both read active events through the (is_active, date, id) index:
+
+* the timeline pages with a cursor over (date, id) instead of OFFSET, so
+  deep pages cost the same as the first one;
+* the iCalendar feed is rendered row by row from a values() iterator and
+  streamed, and the rendered body is cached under the "events" tag so
+  calendar clients polling the feed only hit the database after an event
+  changes.
+
+Calendar apps subscribe to a URL and can't send an Authorization header,
+so the feed URL carries a feed token (``calendar_feed_token``) instead of
+an access token: it only opens the feed, doesn't expire with the access
+token, and is revoked with the user's other tokens (token_version).
+"""
+
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.pagination import CursorPagination
+
+from atss_backend.caching import get_tag_version
+
+ICAL_CACHE_TIMEOUT = 60 * 60
+ICAL_CHUNK_SIZE = 500
+
+TIMELINE_SCOPES = ('upcoming', 'past', 'all')
+
+
+# -----------------------------
+#  FILTERS
+# -----------------------------
+def _parse_bound(value, name):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Expected an ISO date or datetime"})
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_events(queryset, params):
+    """
+    Apply ``scope`` (upcoming/past/all) and the optional ``start``/``end``
+    range to active events. Returns (queryset, scope).
+    """
+    scope = params.get('scope', 'upcoming')
+    if scope not in TIMELINE_SCOPES:
+        raise ValidationError({'scope': f"Expected one of {', '.join(TIMELINE_SCOPES)}"})
+
+    queryset = queryset.filter(is_active=True)
+    now = timezone.now()
+    if scope == 'upcoming':
+        queryset = queryset.filter(date__gte=now)
+    elif scope == 'past':
+        queryset = queryset.filter(date__lt=now)
+
+    if start := _parse_bound(params.get('start'), 'start'):
+        queryset = queryset.filter(date__gte=start)
+    if end := _parse_bound(params.get('end'), 'end'):
+        queryset = queryset.filter(date__lt=end)
+    return queryset, scope
+
+
+class EventTimelinePagination(CursorPagination):
+    """
+    Keyset pagination over (date, id). Upcoming events read forwards in
+    time, past events backwards, both straight off the index.
+    """
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('date', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        if getattr(view, 'timeline_scope', None) == 'past':
+            return ('-date', '-id')
+        return self.ordering
+
+
+FEED_TOKEN_SALT = 'alumni.feeds.calendar'
+
+
+def calendar_feed_token(user):
+    """Signed token that opens ``user``'s calendar feed until their tokens are revoked"""
+    return signing.dumps({'user': str(user.pk), 'ver': user.token_version}, salt=FEED_TOKEN_SALT)
+
+
+class CalendarFeedAuthentication(BaseAuthentication):
+    """``?token=<calendar_feed_token>`` on the calendar feed"""
+
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=FEED_TOKEN_SALT)
+        except signing.BadSignature:
+            raise AuthenticationFailed('Invalid feed token.', 'token_not_valid')
+        user = get_user_model().objects.filter(pk=payload.get('user'), is_active=True).first()
+        if user is None or user.token_version != payload.get('ver'):
+            raise AuthenticationFailed('Feed token has been revoked.', 'token_revoked')
+        return user, None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
+
+
+# -----------------------------
+#  ICALENDAR
+# -----------------------------
+def _escape(text):
+    return (
+        (text or '')
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Fold content lines at 75 octets (RFC 5545 3.1)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # don't split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ical_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _vevent(row, domain):
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:event-{row['id']}@{domain}",
+        f"DTSTAMP:{_ical_datetime(row['updated_at'])}",
+        f"LAST-MODIFIED:{_ical_datetime(row['updated_at'])}",
+        f"DTSTART:{_ical_datetime(row['date'])}",
+        f"SUMMARY:{_escape(row['title'])}",
+        f"LOCATION:{_escape(row['location'])}",
+        f"DESCRIPTION:{_escape(row['description'])}",
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+
+def iter_ical(queryset, domain):
+    """Yield the calendar in pieces, one VEVENT per event"""
+    yield (
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        f'PRODID:-//{domain}//Alumni Events//EN\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+        'METHOD:PUBLISH\r\n'
+        'X-WR-CALNAME:Alumni Events\r\n'
+    )
+    rows = queryset.order_by('date', 'id').values(
+        'id', 'title', 'description', 'location', 'date', 'updated_at'
+    )
+    for row in rows.iterator(chunk_size=ICAL_CHUNK_SIZE):
+        yield _vevent(row, domain)
+    yield 'END:VCALENDAR\r\n'
+
+
+def _caching_stream(chunks, key):
+    """Pass chunks through and cache the full body once the stream completes"""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(body), ICAL_CACHE_TIMEOUT)
+
+
+def ical_response(request, queryset, cache_key):
+    """
+    Serve the calendar for ``queryset``: from the cache when the events tag
+    hasn't moved, otherwise streamed from the database while the cache is
+    filled.
+    """
+    domain = request.get_host().split(':')[0] or 'localhost'
+    version = get_tag_version('events')
+    key = f"ical:{version}:{cache_key}:{domain}"
+    content_type = 'text/calendar; charset=utf-8'
+
+    # calendar clients poll; let them revalidate without a body
+    etag = f'"ical-{version}-{hashlib.md5(key.encode()).hexdigest()[:12]}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    body = cache.get(key)
+    if body is not None:
+        response = HttpResponse(body, content_type=content_type)
+        response['X-Cache'] = 'HIT'
+    else:
+        response = StreamingHttpResponse(
+            _caching_stream(iter_ical(queryset, domain), key), content_type=content_type
+        )
+        response['X-Cache'] = 'MISS'
+    response['Content-Disposition'] = 'inline; filename="events.ics"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
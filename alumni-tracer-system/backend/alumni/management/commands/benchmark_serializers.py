@@ -0,0 +1,114 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from accounts.models import CustomUser
+from alumni.models import AlumniProfile, Event, Notice
+from alumni.projections import ALUMNI_LIST, EVENT_LIST, NOTICE_LIST
+from alumni.views import AlumniProfileViewSet, EventViewSet, NoticeViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the ModelSerializer list path with the values() projections on "
+        "generated pages of alumni, events and notices. Runs inside a transaction "
+        "that is rolled back, so no data is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per page')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        if rows <= 0 or repeat <= 0:
+            raise CommandError('--rows and --repeat must be positive')
+
+        with transaction.atomic():
+            admin = self._generate(rows)
+            request = Request(RequestFactory().get('/'))
+            request.user = admin
+
+            for label, viewset, projection in (
+                ('alumni', AlumniProfileViewSet, ALUMNI_LIST),
+                ('events', EventViewSet, EVENT_LIST),
+                ('notices', NoticeViewSet, NOTICE_LIST),
+            ):
+                self._compare(label, viewset, projection, request, rows, repeat)
+
+            transaction.set_rollback(True)
+
+    def _generate(self, rows):
+        now = timezone.now()
+        tag = uuid.uuid4().hex[:8]
+        admin = CustomUser.objects.create(
+            username=f'bench-admin-{tag}', email=f'bench-admin-{tag}@example.com', user_type='admin'
+        )
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'bench-{tag}-{i}', email=f'bench-{tag}-{i}@example.com',
+                first_name='Alumnus', last_name=str(i), phone_number='0700000000',
+                password='!',
+            )
+            for i in range(rows)
+        ])
+        AlumniProfile.objects.bulk_create([
+            AlumniProfile(
+                user=user, student_id=f'B{tag}{i}', year_graduated=2000 + i % 25,
+                program='Computer Science', current_employer='Acme', job_title='Engineer',
+                location='Nairobi', bio='Bio ' * 20,
+            )
+            for i, user in enumerate(users)
+        ])
+        Event.objects.bulk_create([
+            Event(
+                title=f'Event {i}', description='Description ' * 20, location='Main hall',
+                date=now + timedelta(days=i), capacity=100 if i % 2 else None,
+                created_by=admin,
+            )
+            for i in range(rows)
+        ])
+        Notice.objects.bulk_create([
+            Notice(title=f'Notice {i}', content='Content ' * 20, created_by=admin)
+            for i in range(rows)
+        ])
+        return admin
+
+    def _compare(self, label, viewset, projection, request, rows, repeat):
+        view = viewset(request=request, action='list', format_kwarg=None)
+        queryset = view.get_queryset()[:rows]
+        serializer_class = view.get_serializer_class()
+        context = view.get_serializer_context()
+        render = JSONRenderer().render
+
+        def serializer_path():
+            return render(serializer_class(list(queryset.all()), many=True, context=context).data)
+
+        def projection_path():
+            return render(projection.render_rows(queryset.values(*projection.columns), request))
+
+        if serializer_path() != projection_path():
+            raise CommandError(f'{label}: projection output differs from {serializer_class.__name__}')
+
+        before = self._time(serializer_path, repeat)
+        after = self._time(projection_path, repeat)
+        self.stdout.write(
+            f"{label:8} {rows} rows  serializer {before:8.1f} ms  "
+            f"projection {after:8.1f} ms  speedup {before / after:5.1f}x"
+        )
+
+    def _time(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
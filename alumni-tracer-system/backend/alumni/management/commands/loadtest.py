@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from atss_backend.loadtest import dump_results, format_report, run_rest_load, run_ws_load
+
+REST_SCENARIOS = ('alumni', 'conversations', 'messages', 'dashboard')
+
+
+class Command(BaseCommand):
+    help = (
+        "Scripted load against the hot REST endpoints and ws/chat/, reporting "
+        "p50/p99 latency, throughput and query counts. Run seed_load_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=REST_SCENARIOS,
+            help='REST scenario to run (repeatable; default all)',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requests per REST scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent REST workers')
+        parser.add_argument('--base-url', help='Send REST load to a running server instead of in-process')
+        parser.add_argument('--ws-clients', type=int, default=20, help='Concurrent websocket clients (0 to skip)')
+        parser.add_argument('--ws-messages', type=int, default=10, help='Messages sent per websocket client')
+        parser.add_argument('--skip-rest', action='store_true')
+        parser.add_argument('--seed', type=int, help='Random seed for the request plan')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0 or options['concurrency'] <= 0:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        results = []
+        try:
+            if not options['skip_rest']:
+                results += run_rest_load(
+                    names=options['scenario'],
+                    requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    base_url=options['base_url'],
+                    seed=options['seed'],
+                )
+            if options['ws_clients'] > 0:
+                results += run_ws_load(
+                    clients=options['ws_clients'],
+                    messages=options['ws_messages'],
+                    seed=options['seed'],
+                )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(format_report(results))
+        if options['json_path']:
+            dump_results(results, options['json_path'])
+            self.stdout.write(f"Wrote {options['json_path']}")
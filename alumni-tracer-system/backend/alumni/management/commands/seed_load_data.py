@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from atss_backend.loadtest import flush_load_data, seed_load_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic alumni, direct conversations, messages, events and "
+        "notices for load testing (users are named load-*)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alumni', type=int, default=1000, help='Alumni users with profiles')
+        parser.add_argument('--conversations', type=int, default=200, help='Direct conversations')
+        parser.add_argument('--messages', type=int, default=20, help='Messages per conversation')
+        parser.add_argument('--events', type=int, default=100)
+        parser.add_argument('--notices', type=int, default=50)
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible data')
+        parser.add_argument('--flush', action='store_true', help='Delete existing load data first')
+        parser.add_argument('--flush-only', action='store_true', help='Delete load data and exit')
+
+    def handle(self, *args, **options):
+        if options['flush'] or options['flush_only']:
+            deleted = flush_load_data()
+            self.stdout.write(f"Deleted {deleted} rows of load data")
+            if options['flush_only']:
+                return
+
+        if min(options['alumni'], options['conversations'], options['messages']) < 0:
+            raise CommandError('Counts must not be negative')
+        if options['alumni'] < 2:
+            raise CommandError('Need at least 2 alumni')
+
+        try:
+            summary = seed_load_data(
+                alumni=options['alumni'],
+                conversations=options['conversations'],
+                messages=options['messages'],
+                events=options['events'],
+                notices=options['notices'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded run {run}: {alumni} alumni, {conversations} conversations, "
+            "{messages} messages, {events} events, {notices} notices".format(**summary)
+        ))
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot the project in a fresh process and report how long settings, "
+        "each app (module import, models, ready()) and, optionally, the "
+        "warm-up take. Compare --profile full and --profile api."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=('full', 'api'), help='APP_PROFILE of the child process')
+        parser.add_argument('--warm-up', action='store_true', help='Also time the warm-up (uses the database)')
+        parser.add_argument('--limit', type=int, default=15, help='Apps listed, slowest first (0 for all)')
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        if options['profile']:
+            env['APP_PROFILE'] = options['profile']
+        command = [sys.executable, '-c', 'from atss_backend.startup import main; main()']
+        if options['warm_up']:
+            command.append('--warm-up')
+
+        # this process is already set up; only a new one shows the cold cost
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Startup failed:\n{result.stderr}")
+        report = json.loads(result.stdout)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"Profile {env.get('APP_PROFILE', 'full')}: {report['total_ms']:.0f} ms, "
+            f"{len(report['apps'])} apps"
+        )
+        self.stdout.write(f"{'app':<40} {'import':>8} {'models':>8} {'ready':>8} {'total':>8}")
+        apps = list(report['apps'].items())
+        for name, phases in apps[:options['limit'] or None]:
+            total = sum(phases.values())
+            self.stdout.write(
+                f"{name:<40} {phases['import']:>8.1f} {phases['models']:>8.1f} "
+                f"{phases['ready']:>8.1f} {total:>8.1f}"
+            )
+        self.stdout.write(f"{'settings':<40} {'':>26} {report['settings_ms']:>8.1f}")
+        self.stdout.write(f"{'other (logging, middleware)':<40} {'':>26} {report['other_ms']:>8.1f}")
+        for step, ms in report.get('warm_up', {}).items():
+            self.stdout.write(f"{'warm-up ' + step:<40} {'':>26} {ms:>8.1f}")
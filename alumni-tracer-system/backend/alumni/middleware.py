@@ -1,26 +1,52 @@
 # middleware.py
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import OperationalError
 
+logger = logging.getLogger(__name__)
+
+LAST_SEEN_INTERVAL = 60
+
 class UserActivityMiddleware:
+    # async-capable so async views (chat.api) stay on the event loop
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         response = self.get_response(request)
-        
+        self.touch(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        await sync_to_async(self.touch)(request)
+        return response
+
+    def touch(self, request):
         if request.user.is_authenticated:
             try:
                 # Try to update user profile, but don't crash if table doesn't exist
                 from .models import UserProfile
-                profile, created = UserProfile.objects.get_or_create(user=request.user)
-                profile.last_seen = timezone.now()
-                profile.save()
+                # one UPDATE per user per LAST_SEEN_INTERVAL instead of a
+                # SELECT + full-row save on every request
+                key = f"last_seen:{request.user.pk}"
+                if cache.add(key, 1, LAST_SEEN_INTERVAL):
+                    now = timezone.now()
+                    if not UserProfile.objects.filter(user=request.user).update(last_seen=now):
+                        UserProfile.objects.provision(request.user, last_seen=now)
             except OperationalError:
                 # Table doesn't exist yet, just ignore for now
                 pass
-            except Exception as e:
+            except Exception:
                 # Any other error, log it but don't crash
-                print(f"Error in UserActivityMiddleware: {e}")
-            
-        return response
\ No newline at end of file
+                logger.exception("Error in UserActivityMiddleware", extra={'user_id': str(request.user.pk)})
\ No newline at end of file
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alumni', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum confirmed registrations. Leave empty for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='registrations_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waitlist_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='EventRegistration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('registered', 'Registered'), ('waitlisted', 'Waitlisted'), ('cancelled', 'Cancelled')], default='registered', max_length=20)),
+                ('registration_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registrations', to='alumni.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_registrations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'event_registrations',
+                'ordering': ['registration_date'],
+                'indexes': [models.Index(fields=['event', 'status', 'registration_date'], name='event_reg_status_idx')],
+                'unique_together': {('event', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alumni', '0002_event_registrations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_active', 'date', 'id'], name='event_active_date_idx'),
+        ),
+    ]
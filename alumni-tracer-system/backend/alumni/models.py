@@ -41,6 +41,17 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+class UserProfileManager(models.Manager):
+    def provision(self, user, **fields):
+        """
+        Create ``user``'s profile unless it exists: a single INSERT that
+        ignores the conflict when a concurrent request got there first.
+        """
+        # user_id, not user: assigning the instance would cache this unsaved
+        # row as user.profile
+        self.bulk_create([self.model(user_id=user.pk, **fields)], ignore_conflicts=True)
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -49,6 +60,8 @@ class UserProfile(models.Model):
     )
     is_online = models.BooleanField(default=False)
     last_seen = models.DateTimeField(default=timezone.now)  # Use timezone.now as default
+
+    objects = UserProfileManager()
     
     def __str__(self):
         return f"{self.user.get_full_name()} Profile"
@@ -88,6 +101,16 @@ class Event(models.Model):
         help_text="Event banner image"
     )
     is_active = models.BooleanField(default=True)
+    capacity = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Maximum confirmed registrations. Leave empty for no limit."
+    )
+    # Denormalized counters, only ever changed inside the registration
+    # transactions in alumni/registrations.py
+    registrations_count = models.PositiveIntegerField(default=0, editable=False)
+    waitlist_count = models.PositiveIntegerField(default=0, editable=False)
+    COUNTER_FIELDS = ('registrations_count', 'waitlist_count')
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -96,9 +119,27 @@ class Event(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # timeline / calendar feeds: active events by date (upcoming, past, ranges)
+            models.Index(fields=['is_active', 'date', 'id'], name='event_active_date_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # the counters are changed by UPDATEs in alumni/registrations.py;
+        # writing back the values this instance was loaded with would undo
+        # registrations made since
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skip = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skip
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def image_url(self):
         if self.image and hasattr(self.image, 'url'):
@@ -110,8 +151,43 @@ class Event(models.Model):
         return self.created_by.get_full_name() or self.created_by.email
 
     @property
-    def registrations_count(self):
-        return self.registrations.count()
+    def spots_left(self):
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.registrations_count, 0)
+
+
+class EventRegistration(models.Model):
+    STATUS_REGISTERED = 'registered'
+    STATUS_WAITLISTED = 'waitlisted'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_REGISTERED, 'Registered'),
+        (STATUS_WAITLISTED, 'Waitlisted'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='registrations')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='event_registrations'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_REGISTERED)
+    registration_date = models.DateTimeField(default=timezone.now)
+    notes = models.TextField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'event_registrations'
+        unique_together = ['event', 'user']
+        ordering = ['registration_date']
+        indexes = [
+            # waitlist promotion picks the oldest waitlisted row
+            models.Index(fields=['event', 'status', 'registration_date'], name='event_reg_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.event} ({self.status})"
 
 class Notice(models.Model):
     title = models.CharField(max_length=200)
@@ -0,0 +1,253 @@
+# alumni/projections.py
+"""
+Fast read path for the hot list endpoints.
+
+List pages are rendered from values() rows by plain functions instead of
+ModelSerializer instances: no model instances, no per-row field binding,
+one flat query with the joined columns. The output matches the serializer
+the viewset uses for writes and detail views (see the ``benchmark_serializers``
+command, which checks that before timing), so clients can't tell the
+difference.
+
+Each output key declares the columns it needs, so ?fields= / ?expand=
+(atss_backend/fieldsets.py) narrow the SELECT as well as the payload.
+
+Viewsets opt in per action with ProjectedListMixin.projections.
+"""
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from accounts.models import CustomUser
+from atss_backend.fieldsets import get_sparse_params
+
+from .models import Event
+
+# DRF's own field renders dates, so formats and timezone conversion match
+_datetime = serializers.DateTimeField().to_representation
+
+
+def _full_name(first_name, last_name):
+    # CustomUser.get_full_name
+    return f'{first_name} {last_name}'.strip()
+
+
+def _file_url(name, storage, request):
+    # ImageField.to_representation with use_url=True
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class Field:
+    """One output key: the values() columns it needs and how to render it"""
+
+    def __init__(self, columns, render):
+        self.columns = tuple(columns)
+        self.render = render
+
+
+def column(name, convert=None):
+    if convert is None:
+        return Field((name,), lambda row, request: row[name])
+    return Field((name,), lambda row, request: convert(row[name]))
+
+
+class Projection:
+    """
+    An ordered set of Fields (or nested Projections) rendered from one
+    values() row. ``expandable`` holds nested projections that replace a
+    field when the client asks for ?expand=<name>.
+    """
+
+    def __init__(self, fields, expandable=None):
+        self.fields = dict(fields)
+        self.expandable = expandable or {}
+
+    @property
+    def columns(self):
+        return tuple(dict.fromkeys(c for field in self.fields.values() for c in field.columns))
+
+    def render(self, row, request=None):
+        return {key: field.render(row, request) for key, field in self.fields.items()}
+
+    def render_rows(self, rows, request=None):
+        fields = list(self.fields.items())
+        return [{key: field.render(row, request) for key, field in fields} for row in rows]
+
+    def select(self, tree=None, expand=None):
+        """Narrowed copy for a fields tree / expand tree (see fieldsets.parse_tree)"""
+        expand = expand or {}
+        fields = dict(self.fields)
+        for name in expand:
+            if name in self.expandable:
+                fields[name] = self.expandable[name]
+        if tree is not None:
+            fields = {key: field for key, field in fields.items() if key in tree}
+
+        for key, field in fields.items():
+            if isinstance(field, Projection):
+                sub_tree = tree[key] if tree is not None else None
+                if sub_tree is not None or expand.get(key):
+                    fields[key] = field.select(sub_tree, expand.get(key))
+        return Projection(fields)
+
+
+def user_projection(prefix, fields, storage=None):
+    """Nested user object read from ``<prefix>__<field>`` columns"""
+    converters = {
+        'id': str,
+        'date_joined': _datetime,
+    }
+    result = {}
+    for name in fields:
+        col = f'{prefix}__{name}'
+        if name == 'profile_picture':
+            result[name] = Field((col,), lambda row, request, col=col: _file_url(row[col], storage, request))
+        else:
+            result[name] = column(col, converters.get(name))
+    return Projection(result)
+
+
+# -----------------------------
+#  ALUMNI PROFILES
+# -----------------------------
+_profile_picture_storage = CustomUser._meta.get_field('profile_picture').storage
+
+ALUMNI_LIST = Projection({
+    'id': column('id'),
+    # UserProfileSerializer
+    'user': user_projection(
+        'user',
+        ('id', 'username', 'email', 'first_name', 'last_name', 'phone_number',
+         'user_type', 'profile_picture', 'date_joined'),
+        storage=_profile_picture_storage,
+    ),
+    'student_id': column('student_id'),
+    'year_graduated': column('year_graduated'),
+    'program': column('program'),
+    'current_employer': column('current_employer'),
+    'job_title': column('job_title'),
+    'location': column('location'),
+    'bio': column('bio'),
+    'linkedin_url': column('linkedin_url'),
+    'twitter_url': column('twitter_url'),
+    'gender': column('gender'),
+})
+
+
+# -----------------------------
+#  EVENTS / NOTICES
+# -----------------------------
+_event_image_storage = Event._meta.get_field('image').storage
+
+_event_image = Field(('image',), lambda row, request: _file_url(row['image'], _event_image_storage, request))
+
+_created_by_name = Field(
+    ('created_by__first_name', 'created_by__last_name'),
+    lambda row, request: _full_name(row['created_by__first_name'], row['created_by__last_name']),
+)
+
+# SimpleUserSerializer, for ?expand=created_by
+_created_by_user = user_projection('created_by', ('id', 'first_name', 'last_name', 'email'))
+
+
+def _spots_left(row, request):
+    # Event.spots_left
+    capacity = row['capacity']
+    return None if capacity is None else max(capacity - row['registrations_count'], 0)
+
+
+EVENT_LIST = Projection(
+    {
+        'id': column('id'),
+        'title': column('title'),
+        'description': column('description'),
+        'date': column('date', _datetime),
+        'location': column('location'),
+        'image': _event_image,
+        'image_url': _event_image,
+        'created_by': column('created_by', str),
+        'created_by_name': _created_by_name,
+        'is_active': column('is_active'),
+        'capacity': column('capacity'),
+        'registrations_count': column('registrations_count'),
+        'waitlist_count': column('waitlist_count'),
+        'spots_left': Field(('capacity', 'registrations_count'), _spots_left),
+        # annotated by EventViewSet.get_queryset
+        'my_registration_status': column('my_registration_status'),
+        'created_at': column('created_at', _datetime),
+        'updated_at': column('updated_at', _datetime),
+    },
+    expandable={'created_by': _created_by_user},
+)
+
+NOTICE_LIST = Projection(
+    {
+        'id': column('id'),
+        'created_by_name': _created_by_name,
+        'title': column('title'),
+        'content': column('content'),
+        'created_at': column('created_at', _datetime),
+        'is_active': column('is_active'),
+        'created_by': column('created_by', str),
+    },
+    expandable={'created_by': _created_by_user},
+)
+
+
+# -----------------------------
+#  VIEWSET MIXIN
+# -----------------------------
+class ProjectedListMixin:
+    """
+    Render the actions named in ``projections`` ({action: Projection}) from
+    values() rows. Other actions keep using the serializer; for ``retrieve``
+    the 'list' projection's columns narrow the query with .only() when the
+    client sent ?fields=.
+    """
+    projections = {}
+
+    def get_projection(self):
+        projection = self.projections.get(self.action)
+        if projection is None:
+            return None
+        return projection.select(*get_sparse_params(self.request))
+
+    def project(self, queryset):
+        """Paginated response for ``queryset`` using the action's projection"""
+        projection = self.get_projection()
+        rows = queryset.values(*projection.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(projection.render_rows(page, self.request))
+        return Response(projection.render_rows(rows, self.request))
+
+    def list(self, request, *args, **kwargs):
+        if self.get_projection() is None:
+            return super().list(request, *args, **kwargs)
+        return self.project(self.filter_queryset(self.get_queryset()))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        projection = self.projections.get('list')
+        if self.action != 'retrieve' or projection is None:
+            return queryset
+
+        tree, expand = get_sparse_params(self.request)
+        if tree is None:
+            return queryset
+        annotations = queryset.query.annotations
+        columns = [c for c in projection.select(tree, expand).columns if c not in annotations]
+        # a select_related relation can't be deferred: keep the joins the
+        # columns go through (with their foreign key) and drop the others
+        joined = list(dict.fromkeys(c.split('__', 1)[0] for c in columns if '__' in c))
+        related = queryset.query.select_related
+        if related:
+            kept = joined if related is True else [name for name in related if name in joined]
+            queryset = queryset.select_related(None).select_related(*kept)
+        # the serializer may still touch a deferred field; that only costs a query
+        return queryset.only('pk', *joined, *columns)
@@ -0,0 +1,148 @@
+# alumni/registrations.py
+"""
+Event registration with capacity limits and a waitlist.
+
+Event.registrations_count / waitlist_count are denormalized counters. They
+are only changed here, inside the same transaction as the registration row,
+and confirmed seats are taken with a conditional UPDATE
+(registrations_count < capacity) so a registration rush cannot oversell an
+event no matter how many requests race. Ordinary Event saves leave the
+counters alone (Event.save).
+
+A new registration only gets a seat while nobody is waitlisted; freed or
+added seats (cancel, a capacity increase: promote_waitlist) go to the
+waitlist first, oldest registration first.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Event, EventRegistration
+
+
+class RegistrationError(Exception):
+    """Raised when a registration change is not allowed"""
+
+
+def _take_seat(event_id, from_waitlist=False):
+    """
+    Atomically claim a confirmed seat. Returns False when the event is full,
+    or, for a new registration, when others are waiting for a seat.
+    """
+    condition = Q(capacity__isnull=True) | Q(registrations_count__lt=F('capacity'))
+    if not from_waitlist:
+        condition &= Q(waitlist_count=0)
+    return Event.objects.filter(condition, pk=event_id).update(
+        registrations_count=F('registrations_count') + 1
+    ) == 1
+
+
+def _current_registration(event, user):
+    return (
+        EventRegistration.objects.select_for_update()
+        .filter(event=event, user=user)
+        .first()
+    )
+
+
+def register(event, user, notes=None):
+    """Register ``user`` for ``event``, joining the waitlist if it is full"""
+    if not event.is_active:
+        raise RegistrationError("Registration is closed for this event")
+
+    try:
+        with transaction.atomic():
+            registration = _current_registration(event, user)
+            if registration and registration.status != EventRegistration.STATUS_CANCELLED:
+                raise RegistrationError(f"Already {registration.status} for this event")
+
+            if _take_seat(event.pk):
+                status = EventRegistration.STATUS_REGISTERED
+            else:
+                status = EventRegistration.STATUS_WAITLISTED
+                Event.objects.filter(pk=event.pk).update(waitlist_count=F('waitlist_count') + 1)
+
+            if registration:
+                registration.status = status
+                registration.notes = notes
+                registration.registration_date = timezone.now()
+                registration.save(update_fields=['status', 'notes', 'registration_date'])
+            else:
+                registration = EventRegistration.objects.create(
+                    event=event, user=user, status=status, notes=notes
+                )
+    except IntegrityError as exc:
+        # a concurrent request by the same user created the row first; the
+        # seat taken above was rolled back with the transaction
+        raise RegistrationError("Already registered for this event") from exc
+
+    return registration
+
+
+def promote_waitlist(event):
+    """
+    Give free seats to waitlisted registrations, oldest first. Called after
+    a cancellation and when an event's capacity is raised. Updates the
+    counters on ``event`` and returns the promoted registrations.
+    """
+    with transaction.atomic():
+        # the event lock serializes promotions, so no waitlisted
+        # registration is promoted twice
+        locked = Event.objects.select_for_update().get(pk=event.pk)
+        free = locked.waitlist_count if locked.capacity is None else locked.capacity - locked.registrations_count
+        promoted = []
+        if free > 0 and locked.waitlist_count:
+            promoted = list(
+                EventRegistration.objects.select_for_update()
+                .filter(event=event, status=EventRegistration.STATUS_WAITLISTED)
+                .order_by('registration_date')[:free]
+            )
+        if promoted:
+            EventRegistration.objects.filter(pk__in=[r.pk for r in promoted]).update(
+                status=EventRegistration.STATUS_REGISTERED
+            )
+            for registration in promoted:
+                registration.status = EventRegistration.STATUS_REGISTERED
+            Event.objects.filter(pk=event.pk).update(
+                registrations_count=F('registrations_count') + len(promoted),
+                waitlist_count=F('waitlist_count') - len(promoted),
+            )
+        event.registrations_count = locked.registrations_count + len(promoted)
+        event.waitlist_count = locked.waitlist_count - len(promoted)
+    return promoted
+
+
+def cancel(event, user):
+    """
+    Cancel a registration. Freeing a confirmed seat promotes the oldest
+    waitlisted registration in the same transaction. Returns the promoted
+    registration, if any.
+    """
+    with transaction.atomic():
+        # Lock the event row so two cancellations can't promote the same
+        # waitlisted registration.
+        Event.objects.select_for_update().filter(pk=event.pk).first()
+
+        registration = (
+            EventRegistration.objects.select_for_update()
+            .filter(event=event, user=user)
+            .exclude(status=EventRegistration.STATUS_CANCELLED)
+            .first()
+        )
+        if not registration:
+            raise RegistrationError("You are not registered for this event")
+
+        was_confirmed = registration.status == EventRegistration.STATUS_REGISTERED
+        registration.status = EventRegistration.STATUS_CANCELLED
+        registration.save(update_fields=['status'])
+
+        if not was_confirmed:
+            Event.objects.filter(pk=event.pk).update(waitlist_count=F('waitlist_count') - 1)
+            return None
+
+        Event.objects.filter(pk=event.pk).update(registrations_count=F('registrations_count') - 1)
+        # promote_waitlist re-checks capacity, which may have been lowered since
+        promoted = promote_waitlist(event)
+
+    return promoted[0] if promoted else None
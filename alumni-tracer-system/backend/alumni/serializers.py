@@ -7,10 +7,12 @@ from rest_framework import serializers
 from .models import (
     AlumniProfile,
     Event,
-    Notice,Invitation
+    Notice,Invitation, EventRegistration
 
 )
+from accounts import bulk
 from accounts.serializers import UserProfileSerializer  # This one is fine
+from atss_backend.fieldsets import SparseFieldsMixin
 
 User = get_user_model()
 
@@ -18,7 +20,7 @@ User = get_user_model()
 # -----------------------------
 #  SIMPLE USER SERIALIZER
 # -----------------------------
-class SimpleUserSerializer(serializers.ModelSerializer):
+class SimpleUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'first_name', 'last_name', 'email')
@@ -27,7 +29,7 @@ class SimpleUserSerializer(serializers.ModelSerializer):
 # -----------------------------
 #  ALUMNI PROFILE LIST
 # -----------------------------
-class AlumniProfileListSerializer(serializers.ModelSerializer):
+class AlumniProfileListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
 
     class Meta:
@@ -94,16 +96,29 @@ class AlumniProfileUpdateSerializer(serializers.ModelSerializer):
         
         return instance
     
-class EventSerializer(serializers.ModelSerializer):
+class BulkVerifySerializer(serializers.Serializer):
+    """Alumni profile ids whose users are (un)verified in one bulk action"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=bulk.MAX_IDS
+    )
+    verified = serializers.BooleanField(default=True)
+
+
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'created_by': (SimpleUserSerializer, {})}
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     image_url = serializers.SerializerMethodField()
+    spots_left = serializers.ReadOnlyField()
+    # annotated by EventViewSet.get_queryset, so no per-row query
+    my_registration_status = serializers.CharField(read_only=True, default=None)
     
     class Meta:
         model = Event
         fields = [
             'id', 'title', 'description', 'date', 'location', 
             'image', 'image_url', 'created_by', 'created_by_name',
-            'is_active', 'created_at', 'updated_at'
+            'is_active', 'capacity', 'registrations_count', 'waitlist_count',
+            'spots_left', 'my_registration_status', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at']
 
@@ -125,10 +140,18 @@ class EventSerializer(serializers.ModelSerializer):
         if image is not None:
             instance.image = image
         return super().update(instance, validated_data)
+class EventRegistrationSerializer(serializers.ModelSerializer):
+    user = SimpleUserSerializer(read_only=True)
+
+    class Meta:
+        model = EventRegistration
+        fields = ['id', 'event', 'user', 'status', 'registration_date', 'notes']
+        read_only_fields = fields
 # -----------------------------
 #  NOTICES
 # -----------------------------
-class NoticeSerializer(serializers.ModelSerializer):
+class NoticeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'created_by': (SimpleUserSerializer, {})}
     created_by_name = serializers.CharField(
         source='created_by.get_full_name', read_only=True
     )
@@ -158,7 +181,7 @@ class InvitationCreateSerializer(serializers.ModelSerializer):
         value = value.lower().strip()  # Normalize email
         
         # Check if user with this email already exists
-        if User.objects.filter(email=value).exists():
+        if User.objects.with_email(value).exists():
             raise serializers.ValidationError("A user with this email already exists.")
         
         # Check if pending invitation already exists for this email
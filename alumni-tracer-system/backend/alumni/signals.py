@@ -1,21 +1,84 @@
-# Create a signal to ensure UserProfile is created for each user
-from datetime import timezone
-from django.db.models.signals import post_save
+import json
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
-from .models import UserProfile
-from django.conf import settings
-
-User = settings.AUTH_USER_MODEL
-
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.get_or_create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    # Ensure profile exists and has valid last_seen
-    profile, created = UserProfile.objects.get_or_create(user=instance)
-    if created and not profile.last_seen:
-        profile.last_seen = timezone.now()
-        profile.save()
\ No newline at end of file
+from atss_backend.caching import invalidate_on
+from .models import AlumniProfile, Event, EventRegistration, Notice
+
+# Channel-layer group every connected client (websocket or SSE) joins
+BROADCAST_GROUP = "broadcasts"
+
+# UserProfile rows are created at registration (UserRegistrationSerializer)
+# or by the first request's last_seen update (UserActivityMiddleware), not
+# from post_save: user rows are saved on every login and verification toggle.
+
+
+# -----------------------------
+#  REALTIME BROADCASTS
+# -----------------------------
+def publish(event_type, action, data):
+    """Push a notice/event change to every connected client once the transaction commits"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    # channel layers only carry plain JSON types (no UUIDs/datetimes)
+    data = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    event = {"type": event_type, "action": action, "data": data}
+    transaction.on_commit(
+        lambda: async_to_sync(channel_layer.group_send)(BROADCAST_GROUP, event)
+    )
+
+@receiver(post_init, sender=Notice)
+@receiver(post_init, sender=Event)
+def remember_active(sender, instance, **kwargs):
+    # deferred is_active counts as active, so deactivating still sends "deleted"
+    instance._was_active = instance.__dict__.get("is_active", True)
+
+
+def broadcast_saved(event_type, serializer_class, instance, created):
+    """
+    Clients only list active rows: an inactive row is never sent, and one
+    that stops being active is "deleted" for them (one that becomes active
+    again is "created").
+    """
+    was_active = not created and instance._was_active
+    instance._was_active = instance.is_active
+    if instance.is_active:
+        publish(event_type, "updated" if was_active else "created", serializer_class(instance).data)
+    elif was_active:
+        publish(event_type, "deleted", {"id": instance.id})
+
+@receiver(post_save, sender=Notice)
+def broadcast_notice_saved(sender, instance, created, **kwargs):
+    from .serializers import NoticeSerializer
+
+    broadcast_saved("notice_update", NoticeSerializer, instance, created)
+
+@receiver(post_delete, sender=Notice)
+def broadcast_notice_deleted(sender, instance, **kwargs):
+    if instance._was_active:
+        publish("notice_update", "deleted", {"id": instance.id})
+
+@receiver(post_save, sender=Event)
+def broadcast_event_saved(sender, instance, created, **kwargs):
+    from .serializers import EventSerializer
+
+    broadcast_saved("event_update", EventSerializer, instance, created)
+
+@receiver(post_delete, sender=Event)
+def broadcast_event_deleted(sender, instance, **kwargs):
+    if instance._was_active:
+        publish("event_update", "deleted", {"id": instance.id})
+
+# -----------------------------
+#  RESPONSE CACHE INVALIDATION
+# -----------------------------
+invalidate_on(AlumniProfile, "alumni")
+invalidate_on(Event, "events")
+invalidate_on(Notice, "notices")
+# counters and the caller's registration status are part of the events list
+invalidate_on(EventRegistration, "events")
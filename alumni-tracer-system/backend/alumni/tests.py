@@ -1,3 +1,907 @@
-from django.test import TestCase
+import asyncio
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.apps import AppConfig
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import CustomUser
+from accounts.tokens import VERSION_CLAIM
+from atss_backend.db import ReadReplicaRouter, _use_replica
+from atss_backend.log import JsonFormatter, NonBlockingQueueHandler, SamplingFilter, _listeners, _queued
+from atss_backend.media import MediaASGIApp
+from atss_backend.startup import timed_setup, warm_up
+from atss_backend.testing import QueryBudgetMixin
+from chat.services import create_group
+
+from .admin import AlumniProfileAdmin
+from .models import AlumniProfile, Event, EventRegistration, Invitation, Notice, UserProfile
+from .projections import ALUMNI_LIST, EVENT_LIST, NOTICE_LIST
+from .registrations import RegistrationError, cancel, register
+from .signals import BROADCAST_GROUP
+from .views import AlumniProfileViewSet, EventViewSet, NoticeViewSet
+
+
+class HotEndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Query budgets for the list endpoints. Budgets must not depend on the
+    number of rows, so every list is seeded with several of them. One of
+    the queries in each budget is UserActivityMiddleware's last_seen update.
+    """
+    ROWS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            username='admin', email='admin@example.com', password='pw', user_type='admin'
+        )
+        # as registration would; the first request would otherwise create it
+        UserProfile.objects.provision(cls.admin)
+        now = timezone.now()
+        for i in range(cls.ROWS):
+            user = CustomUser.objects.create_user(
+                username=f'alumnus{i}', email=f'alumnus{i}@example.com', password='pw'
+            )
+            AlumniProfile.objects.create(
+                user=user, student_id=f'S{i}', year_graduated=2020, program='CS'
+            )
+            Event.objects.create(
+                title=f'Event {i}', description='d', location='l',
+                date=now + timedelta(days=i + 1), created_by=cls.admin,
+            )
+            Notice.objects.create(title=f'Notice {i}', content='c', created_by=cls.admin)
+            Invitation.objects.create(inviter=cls.admin, email=f'guest{i}@example.com', name='Guest')
+
+    def setUp(self):
+        # responses are cached across requests; measure the uncached path
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def assertEndpointBudget(self, url, max_queries):
+        with self.assertQueryBudget(max_queries, max_duplicates=0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response
+
+    def test_alumni_list(self):
+        self.assertEndpointBudget('/api/alumni/', 3)
+
+    def test_event_list(self):
+        self.assertEndpointBudget('/api/events/', 3)
+
+    def test_event_timeline(self):
+        self.assertEndpointBudget('/api/events/timeline/', 2)
+
+    def test_notice_list(self):
+        self.assertEndpointBudget('/api/notices/', 3)
+
+    def test_invitation_list(self):
+        self.assertEndpointBudget('/api/invitations/', 2)
+
+    def test_cached_list_skips_the_database(self):
+        self.client.get('/api/events/')
+        # last_seen was written by the first request and is throttled now
+        self.assertEndpointBudget('/api/events/', 0)
+
+
+class LargeTableAdminTests(QueryBudgetMixin, TestCase):
+    """The alumni changelist pages by keyset and doesn't query per row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='root', email='root@example.com', password='pw'
+        )
+        for i in range(5):
+            user = CustomUser.objects.create_user(
+                username=f'grad{i}', email=f'grad{i}@example.com', password='pw'
+            )
+            AlumniProfile.objects.create(user=user, student_id=f'G{i}', year_graduated=2021, program='CS')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, query=''):
+        response = self.client.get(f'/admin/alumni/alumniprofile/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    @mock.patch.object(AlumniProfileAdmin, 'list_per_page', 2)
+    def test_keyset_pages(self):
+        seen = []
+        cl = self.changelist()
+        while True:
+            seen += [profile.student_id for profile in cl.result_list]
+            if not cl.next_page_url:
+                break
+            cl = self.changelist(cl.next_page_url)
+        self.assertEqual(seen, ['G4', 'G3', 'G2', 'G1', 'G0'])
+
+    def test_no_query_per_row(self):
+        with self.assertQueryBudget(20, max_duplicates=0):
+            self.changelist()
+
+    def test_search(self):
+        self.assertEqual(len(self.changelist('?q=G3').result_list), 1)
+        self.assertEqual(len(self.changelist('?q=GRAD2@example.com').result_list), 1)
+        self.assertEqual(len(self.changelist('?q=grad').result_list), 5)
+
+
+class UserProfileProvisioningTests(QueryBudgetMixin, TestCase):
+    """Presence profiles are created once, not checked on every user save"""
+
+    def test_user_save_has_no_profile_overhead(self):
+        user = CustomUser.objects.create_user(username='plain', email='plain@example.com', password='pw')
+        user.is_verified = True
+        with self.assertQueryBudget(1):
+            user.save(update_fields=['is_verified'])
+        self.assertFalse(UserProfile.objects.filter(user=user).exists())
+
+    def test_created_on_first_request(self):
+        cache.clear()
+        user = CustomUser.objects.create_user(username='lazy', email='lazy@example.com', password='pw')
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get('/api/notices/')
+        profile = UserProfile.objects.get(user=user)
+        # a concurrent first request doesn't create a second row
+        UserProfile.objects.provision(user)
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=user).pk, profile.pk)
+
+    def test_created_at_registration(self):
+        cache.clear()
+        response = APIClient().post('/api/auth/register/', {
+            'email': 'new@example.com', 'username': 'newbie',
+            'password': 'a-long-password', 'password2': 'a-long-password',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content[:200])
+        self.assertTrue(UserProfile.objects.filter(user__username='newbie').exists())
+
+
+class StartupTests(TestCase):
+    def test_timed_setup_reports_each_app(self):
+        create = AppConfig.__dict__['create']
+        app_config, report = timed_setup(lambda: AppConfig.create('django.contrib.humanize'))
+        self.assertEqual(app_config.name, 'django.contrib.humanize')
+        self.assertIn('import', report.apps['django.contrib.humanize'])
+        self.assertIs(AppConfig.__dict__['create'], create)
+        app_config.ready()
+        self.assertIn('ready', report.apps['django.contrib.humanize'])
+
+    def test_warm_up_fills_the_response_cache(self):
+        cache.clear()
+        admin = CustomUser.objects.create_user(
+            username='boss', email='boss@example.com', password='pw', user_type='admin'
+        )
+        UserProfile.objects.provision(admin)
+        timings = warm_up(paths=['/api/dashboard/stats/'], host='testserver')
+        self.assertEqual(set(timings), {'urls', 'cache tags', '/api/dashboard/stats/'})
+
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get('/api/dashboard/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    @override_settings(WARMUP_HOST='')
+    def test_warm_up_requires_a_host(self):
+        with self.assertRaises(ImproperlyConfigured):
+            warm_up(paths=['/api/dashboard/stats/'])
+        self.assertEqual(set(warm_up(paths=[])), {'urls', 'cache tags'})
+
+
+class MediaServingTests(TestCase):
+    body = bytes(range(256)) * 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.outsider = [
+            CustomUser.objects.create_user(username=name, email=f'{name}@example.com', password='pw')
+            for name in ('reader', 'outsider')
+        ]
+        cls.conversation = create_group(cls.reader, 'Files', [])
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        os.makedirs(os.path.join(self.root.name, 'event_images'))
+        with open(os.path.join(self.root.name, 'event_images', 'poster.png'), 'wb') as f:
+            f.write(self.body)
+        self.note = f'/media/chat_files/{self.conversation.id}/note.txt'
+        os.makedirs(os.path.join(self.root.name, 'chat_files', str(self.conversation.id)))
+        for name in (f'{self.conversation.id}/note.txt', 'loose.txt'):
+            with open(os.path.join(self.root.name, 'chat_files', name), 'wb') as f:
+                f.write(b'secret')
+        settings = override_settings(MEDIA_ROOT=self.root.name, MEDIA_OFFLOAD='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, path='/media/event_images/poster.png', **headers):
+        return self.client.get(path, headers=headers)
+
+    def test_full_file_with_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(self.body)))
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        self.assertEqual(self.get(**{'If-None-Match': response['ETag']}).status_code, 304)
+        self.assertEqual(self.get(**{'If-Modified-Since': response['Last-Modified']}).status_code, 304)
+
+    def test_ranges(self):
+        response = self.get(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[100:200])
+
+        response = self.get(Range='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-10:])
+
+        response = self.get(Range=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+        # a stale If-Range gets the whole file
+        response = self.get(Range='bytes=0-9', **{'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_or_outside_root(self):
+        self.assertEqual(self.get('/media/event_images/nope.png').status_code, 404)
+        self.assertEqual(self.get('/media/../settings.py').status_code, 404)
+
+    def bearer(self, user):
+        token = AccessToken.for_user(user)
+        token[VERSION_CLAIM] = user.token_version
+        return f'Bearer {token}'
+
+    def test_private_files_need_a_user(self):
+        self.assertEqual(self.get(self.note).status_code, 401)
+        self.assertEqual(self.get(f'/media/event_images/../{self.note[7:]}').status_code, 401)
+        self.assertEqual(self.get('/media/chat_files/nope.txt').status_code, 401)
+        self.assertIn('public', self.get()['Cache-Control'])
+
+        response = self.get(self.note, Authorization=self.bearer(self.reader))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'secret')
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+    def test_private_files_need_a_member(self):
+        # the same answer whether the file exists or not
+        for path in (self.note, f'/media/chat_files/{self.conversation.id}/nope.txt', '/media/chat_files/x/note.txt'):
+            self.assertEqual(self.get(path, Authorization=self.bearer(self.outsider)).status_code, 404)
+        # outside a conversation directory: staff only
+        self.assertEqual(self.get('/media/chat_files/loose.txt', Authorization=self.bearer(self.reader)).status_code, 404)
+        self.outsider.is_staff = True
+        self.outsider.save()
+        self.assertEqual(self.get('/media/chat_files/loose.txt', Authorization=self.bearer(self.outsider)).status_code, 200)
+
+    def test_offload(self):
+        with override_settings(MEDIA_OFFLOAD='accel'):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/event_images/poster.png')
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_OFFLOAD='sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root.name, 'event_images', 'poster.png'))
+
+    def asgi_get(self, headers=(), extensions=None, path='/media/event_images/poster.png'):
+        async def fallback(scope, receive, send):
+            raise AssertionError('passed to Django')
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path,
+            'headers': [(name.encode(), value.encode()) for name, value in headers],
+            'extensions': extensions or {},
+        }
+        asyncio.run(MediaASGIApp(fallback)(scope, None, send))
+        return messages
+
+    def test_asgi_streams_in_chunks(self):
+        start, *body = self.asgi_get([('range', 'bytes=10-5000')])
+        self.assertEqual(start['status'], 206)
+        self.assertEqual(b''.join(message['body'] for message in body), self.body[10:5001])
+        self.assertFalse(body[-1]['more_body'])
+
+    def test_asgi_leaves_private_files_to_django(self):
+        with self.assertRaisesMessage(AssertionError, 'passed to Django'):
+            self.asgi_get(path=self.note)
+
+    def test_asgi_zero_copy(self):
+        _, send = self.asgi_get([('range', 'bytes=10-19')], {'http.response.zerocopysend': {}})
+        self.assertEqual(send['type'], 'http.response.zerocopysend')
+        self.assertEqual((send['offset'], send['count']), (10, 10))
+
+
+class HealthCheckTests(TestCase):
+    def test_reports_status_only(self):
+        response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_database_errors_are_not_exposed(self):
+        with mock.patch('atss_backend.db.connections') as connections, self.assertLogs('atss_backend.db', 'ERROR'):
+            connections.__getitem__.return_value.cursor.side_effect = Exception('password authentication failed')
+            response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'unavailable'})
+
+
+class EventRegistrationTests(TestCase):
+    """Capacity, waitlist and promotion (alumni/registrations.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            username='host', email='host@example.com', password='pw', user_type='admin'
+        )
+        cls.users = [
+            CustomUser.objects.create_user(username=f'guest{i}', email=f'guest{i}@example.com', password='pw')
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        self.event = Event.objects.create(
+            title='Reunion', description='d', location='l', capacity=1,
+            date=timezone.now() + timedelta(days=7), created_by=self.admin,
+        )
+
+    def statuses(self):
+        return dict(EventRegistration.objects.filter(event=self.event).values_list('user__username', 'status'))
+
+    def counts(self):
+        self.event.refresh_from_db()
+        return self.event.registrations_count, self.event.waitlist_count
+
+    def test_capacity_is_never_oversold(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        for user in self.users:
+            register(stale, user)
+        self.assertEqual(list(self.statuses().values()).count('registered'), 1)
+        self.assertEqual(self.counts(), (1, 3))
+
+    def test_cancel_promotes_the_oldest_waitlisted(self):
+        a, b, c = self.users[:3]
+        register(self.event, a)
+        register(self.event, b)
+        register(self.event, c)
+        promoted = cancel(self.event, a)
+        self.assertEqual(promoted.user, b)
+        self.assertEqual(self.statuses(), {'guest0': 'cancelled', 'guest1': 'registered', 'guest2': 'waitlisted'})
+        self.assertEqual(self.counts(), (1, 1))
+
+        # cancelling a waitlisted registration promotes nobody
+        self.assertIsNone(cancel(self.event, c))
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_raising_capacity_promotes_the_waitlist(self):
+        a, b, c = self.users[:3]
+        register(self.event, a)
+        register(self.event, b)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.patch(f'/api/events/{self.event.pk}/', {'capacity': 2}, format='json')
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        self.assertEqual(response.data['waitlist_count'], 0)
+        self.assertEqual(self.statuses(), {'guest0': 'registered', 'guest1': 'registered'})
+
+        # full again: the next registrant waits
+        self.assertEqual(register(self.event, c).status, 'waitlisted')
+
+    def test_no_seat_while_others_wait(self):
+        a, b, c = self.users[:3]
+        register(self.event, a)
+        register(self.event, b)
+        # a seat appears without going through promote_waitlist
+        Event.objects.filter(pk=self.event.pk).update(capacity=3)
+        self.assertEqual(register(self.event, c).status, 'waitlisted')
+
+    def test_event_save_keeps_counters(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        register(self.event, self.users[0])
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(self.event.title, 'Renamed')
+
+    def test_concurrent_duplicate_is_an_error(self):
+        register(self.event, self.users[0])
+        # the other request's row wasn't there when this one looked
+        with mock.patch('alumni.registrations._current_registration', return_value=None):
+            with self.assertRaises(RegistrationError):
+                register(self.event, self.users[0])
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_registration_list_reads_from_the_replica(self):
+        register(self.event, self.users[0])
+        reads = []
+
+        def db_for_read(router, model, **hints):
+            reads.append((model, _use_replica.get()))
+            return None
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        with mock.patch.object(ReadReplicaRouter, 'db_for_read', db_for_read):
+            response = client.get(f'/api/events/{self.event.pk}/registrations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        # the token is checked against the primary, the list comes from the replica
+        self.assertIn((CustomUser, False), reads)
+        self.assertIn((EventRegistration, True), reads)
+        self.assertNotIn((EventRegistration, False), reads)
+        self.assertFalse(_use_replica.get())
+
+
+class CacheInvalidationTests(TestCase):
+    """Tags are bumped after commit, and only by changes the lists show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            username='editor', email='editor@example.com', password='pw', user_type='admin'
+        )
+
+    def versions(self, *tags):
+        from atss_backend.caching import get_tag_versions
+        return get_tag_versions(*tags)
+
+    def test_bumped_on_commit(self):
+        before = self.versions('notices')
+        with self.captureOnCommitCallbacks(execute=True):
+            Notice.objects.create(title='t', content='c', created_by=self.admin)
+            self.assertEqual(self.versions('notices'), before)
+        self.assertNotEqual(self.versions('notices'), before)
+
+    def test_user_names_only_follow_shown_fields(self):
+        user = CustomUser.objects.get(pk=self.admin.pk)
+        before = self.versions('user_names')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.phone_number = '0700000000'
+            user.save()
+        self.assertEqual(self.versions('user_names'), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.first_name = 'Renamed'
+            user.save()
+        self.assertNotEqual(self.versions('user_names'), before)
+
+    def test_list_revalidation_follows_the_tags(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        first = client.get('/api/notices/')
+        self.assertEqual(first.status_code, 200)
+        revalidated = client.get('/api/notices/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], first['ETag'])
+
+        # a validator is only good for the caller it was issued to
+        alumnus = CustomUser.objects.create_user(username='reader', email='reader@example.com', password='pw')
+        other = APIClient()
+        other.force_authenticate(alumnus)
+        self.assertEqual(other.get('/api/notices/', headers={'If-None-Match': first['ETag']}).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notice.objects.create(title='t', content='c', created_by=self.admin)
+        changed = client.get('/api/notices/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+
+class BroadcastTests(TestCase):
+    """Connected clients hear about active notices/events only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            username='broadcaster', email='broadcaster@example.com', password='pw', user_type='admin'
+        )
+
+    def setUp(self):
+        layer = get_channel_layer()
+        self.channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(BROADCAST_GROUP, self.channel)
+        self.addCleanup(async_to_sync(layer.flush))
+
+    def broadcasts(self, change):
+        """(action, data) of every broadcast sent by ``change()`` after commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        return [(event['action'], event['data']) for event in async_to_sync(self.drain)()]
+
+    async def drain(self):
+        layer = get_channel_layer()
+        events = []
+        while True:
+            try:
+                events.append(await asyncio.wait_for(layer.receive(self.channel), timeout=0.1))
+            except asyncio.TimeoutError:
+                return events
+
+    def test_created_and_updated(self):
+        [(action, data)] = self.broadcasts(
+            lambda: Notice.objects.create(title='t', content='c', created_by=self.admin)
+        )
+        self.assertEqual(action, 'created')
+        notice = Notice.objects.get(pk=data['id'])
+        notice.title = 'renamed'
+        self.assertEqual(self.broadcasts(notice.save), [('updated', mock.ANY)])
+
+    def test_inactive_rows_are_not_published(self):
+        self.assertEqual(self.broadcasts(
+            lambda: Notice.objects.create(title='t', content='c', created_by=self.admin, is_active=False)
+        ), [])
+        notice = Notice.objects.get()
+        notice.title = 'still hidden'
+        self.assertEqual(self.broadcasts(notice.save), [])
+        self.assertEqual(self.broadcasts(notice.delete), [])
+
+    def test_deactivation_is_a_delete(self):
+        self.broadcasts(lambda: Notice.objects.create(title='t', content='c', created_by=self.admin))
+        notice = Notice.objects.get()
+        notice.is_active = False
+        self.assertEqual(self.broadcasts(notice.save), [('deleted', {'id': notice.pk})])
+        notice.is_active = True
+        self.assertEqual(self.broadcasts(notice.save), [('created', mock.ANY)])
+
+    def test_event_deactivated(self):
+        event = Event.objects.create(
+            title='Reunion', description='d', date=timezone.now() + timedelta(days=3),
+            location='Hall', created_by=self.admin,
+        )
+        event.is_active = False
+        self.assertEqual(self.broadcasts(event.save), [('deleted', {'id': event.pk})])
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+class QueryInstrumentationTests(TestCase):
+    """QueryCountMiddleware times sync and async views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='timed', email='timed@example.com', password='pw'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.token = AccessToken.for_user(self.user)
+        self.token[VERSION_CLAIM] = self.user.token_version
+
+    def test_sync_view(self):
+        with self.assertLogs('atss.queries', 'DEBUG') as logs:
+            response = self.client.get('/api/notices/', headers={'Authorization': f'Bearer {self.token}'})
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertEqual(logs.records[0].levelname, 'DEBUG')
+        self.assertEqual(logs.records[0].query_stats['path'], '/api/notices/')
+
+    def test_async_view(self):
+        with self.assertLogs('atss.queries', 'DEBUG'):
+            response = async_to_sync(AsyncClient().get)(
+                '/api/chat/conversations/', headers={'Authorization': f'Bearer {self.token}'}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    @override_settings(QUERY_COUNT_WARN=0)
+    def test_warns_past_the_limit(self):
+        with self.assertLogs('atss.queries', 'WARNING'):
+            self.client.get('/api/notices/', headers={'Authorization': f'Bearer {self.token}'})
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_off(self):
+        response = self.client.get('/api/health/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class EventFeedTests(TestCase):
+    """Cursor-paged timeline and the iCalendar feed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='subscriber', email='subscriber@example.com', password='pw'
+        )
+        now = timezone.now()
+        cls.events = [
+            Event.objects.create(
+                title=f'Event {days}', description='Bring friends, food; and\nfun',
+                date=now + timedelta(days=days), location='Main Hall', created_by=cls.user,
+            )
+            for days in (-2, -1, 1, 2, 3)
+        ]
+        Event.objects.create(
+            title='Hidden', description='', date=now + timedelta(days=1), location='x',
+            created_by=cls.user, is_active=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def titles(self, response):
+        return [event['title'] for event in response.json()['results']]
+
+    def test_timeline_pages_with_a_cursor(self):
+        response = self.client.get('/api/events/timeline/', {'limit': 2})
+        self.assertEqual(self.titles(response), ['Event 1', 'Event 2'])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(self.titles(response), ['Event 3'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_timeline_scopes(self):
+        response = self.client.get('/api/events/timeline/', {'scope': 'past'})
+        self.assertEqual(self.titles(response), ['Event -1', 'Event -2'])
+        end = (timezone.now() + timedelta(days=2)).date().isoformat()
+        response = self.client.get('/api/events/timeline/', {'scope': 'all', 'end': end})
+        self.assertEqual(self.titles(response), ['Event -2', 'Event -1', 'Event 1'])
+        self.assertEqual(self.client.get('/api/events/timeline/', {'scope': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/events/timeline/', {'start': 'tuesday'}).status_code, 400)
+
+    def feed_url(self):
+        return self.client.get('/api/events/calendar-token/').json()['url']
+
+    def test_ical_feed(self):
+        response = APIClient().get(self.feed_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 5)
+        self.assertNotIn('Hidden', body)
+        self.assertIn('DESCRIPTION:Bring friends\\, food\\; and\\nfun\r\n', body)
+
+        cached = APIClient().get(self.feed_url())
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content.decode(), body)
+        revalidated = APIClient().get(self.feed_url(), headers={'If-None-Match': cached['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_ical_feed_changes_with_events(self):
+        url = self.feed_url()
+        etag = APIClient().get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.filter(pk=self.events[0].pk).first().save()
+        response = APIClient().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_ical_feed_authentication(self):
+        self.assertEqual(self.client.get('/api/events/calendar.ics').status_code, 200)
+        self.assertEqual(APIClient().get('/api/events/calendar.ics').status_code, 401)
+        # an access token is not a feed token
+        access = AccessToken.for_user(self.user)
+        self.assertEqual(APIClient().get('/api/events/calendar.ics', {'token': str(access)}).status_code, 401)
+        self.assertEqual(APIClient().get('/api/events/calendar.ics', {'token': 'forged'}).status_code, 401)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingTests(TestCase):
+    """JSON lines, sampling and the queue in front of every handler"""
+
+    def record(self, name='chat.consumers', level=logging.DEBUG, msg='hello %s', args=('there',), **extra):
+        return logging.makeLogRecord({
+            'name': name, 'levelno': level, 'levelname': logging.getLevelName(level),
+            'msg': msg, 'args': args, **extra,
+        })
+
+    def test_json_formatter_includes_extras(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            exc_info = sys.exc_info()
+        entry = json.loads(JsonFormatter().format(self.record(
+            user_id='42', query_stats={'queries': 3}, _private=1, exc_info=exc_info,
+        )))
+        self.assertEqual(entry['message'], 'hello there')
+        self.assertEqual(entry['level'], 'DEBUG')
+        self.assertEqual(entry['user_id'], '42')
+        self.assertEqual(entry['query_stats'], {'queries': 3})
+        self.assertNotIn('_private', entry)
+        self.assertNotIn('args', entry)
+        self.assertIn('ValueError: boom', entry['exc'])
+
+    def test_sampling_filter(self):
+        sampler = SamplingFilter({'chat': 0.0, 'chat.api': 1.0})
+        self.assertFalse(sampler.filter(self.record('chat.consumers')))
+        self.assertFalse(sampler.filter(self.record('chat')))
+        # the longest prefix wins, other loggers and higher levels pass
+        self.assertTrue(sampler.filter(self.record('chat.api')))
+        self.assertTrue(sampler.filter(self.record('chatter')))
+        self.assertTrue(sampler.filter(self.record('chat.consumers', logging.INFO)))
+
+    def test_handlers_are_queued(self):
+        target = ListHandler()
+        target.setLevel(logging.INFO)
+        target.addFilter(SamplingFilter({'chat': 0.0}, max_level='INFO'))
+        front = _queued(target)
+        self.assertEqual(target.filters, [])
+
+        front.handle(self.record(level=logging.INFO))  # sampled out in the caller
+        front.handle(self.record('alumni', logging.INFO))
+        front.handle(self.record('alumni', logging.DEBUG))  # below the handler level
+        _, listener = _listeners.pop()
+        listener.stop()
+        self.assertEqual([r.name for r in target.records], ['alumni'])
+        self.assertEqual(target.records[0].getMessage(), 'hello there')
+
+    def test_full_queue_drops_and_reports(self):
+        records = queue.Queue(2)
+        front = NonBlockingQueueHandler(records)
+        for i in range(4):
+            front.handle(self.record('alumni', logging.INFO, msg=f'record {i}', args=None))
+        self.assertEqual((front.dropped, front.unreported), (2, 2))
+
+        records.get_nowait(), records.get_nowait()
+        front.handle(self.record('alumni', logging.INFO, msg='after', args=None))
+        report, after = records.get_nowait(), records.get_nowait()
+        self.assertEqual(report.getMessage(), 'Log queue full, dropped 2 records')
+        self.assertEqual(report.levelno, logging.WARNING)
+        self.assertEqual(report.dropped_records, 2)
+        self.assertEqual(after.getMessage(), 'after')
+        self.assertEqual((front.dropped, front.unreported), (2, 0))
+
+
+class ProjectionTests(TestCase):
+    """The values() projections render exactly what the list serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            username='editor', email='editor@example.com', password='pw', user_type='admin',
+            first_name='Ada', last_name='Admin',
+        )
+        for i in range(3):
+            user = CustomUser.objects.create_user(
+                username=f'grad{i}', email=f'grad{i}@example.com', password='pw',
+                first_name='Grace', last_name=str(i), phone_number='0700000000',
+                profile_picture='profile_pics/grad.png' if i else '',
+            )
+            AlumniProfile.objects.create(
+                user=user, student_id=f'S{i}', year_graduated=2020 + i, program='CS', bio='Bio',
+            )
+            event = Event.objects.create(
+                title=f'Event {i}', description='d', location='l', capacity=1 if i else None,
+                date=timezone.now() + timedelta(days=i + 1), created_by=cls.admin,
+                image='event_images/poster.png' if i else '',
+            )
+            register(event, user)
+            Notice.objects.create(title=f'Notice {i}', content='c', created_by=cls.admin, is_active=i != 1)
+
+    def assertMatches(self, viewset, projection):
+        request = Request(RequestFactory().get('/'))
+        request.user = self.admin
+        view = viewset(request=request, action='list', format_kwarg=None)
+        queryset = view.get_queryset()
+        serializer = view.get_serializer_class()(queryset, many=True, context=view.get_serializer_context())
+        rendered = projection.render_rows(queryset.values(*projection.columns), request)
+        self.assertTrue(rendered)
+        self.assertEqual(JSONRenderer().render(rendered), JSONRenderer().render(serializer.data))
+
+    def test_alumni(self):
+        self.assertMatches(AlumniProfileViewSet, ALUMNI_LIST)
+
+    def test_events(self):
+        self.assertMatches(EventViewSet, EVENT_LIST)
+
+    def test_notices(self):
+        self.assertMatches(NoticeViewSet, NOTICE_LIST)
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?expand= on the projected lists and the serialized items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(
+            username='editor', email='editor@example.com', password='pw', user_type='admin',
+            first_name='Ada', last_name='Admin',
+        )
+        user = CustomUser.objects.create_user(
+            username='grad', email='grad@example.com', password='pw', first_name='Grace', last_name='Grad',
+        )
+        cls.profile = AlumniProfile.objects.create(user=user, student_id='S1', year_graduated=2020, program='CS')
+        cls.event = Event.objects.create(
+            title='Reunion', description='d', location='l',
+            date=timezone.now() + timedelta(days=1), created_by=cls.admin,
+        )
+        cls.notice = Notice.objects.create(title='Hello', content='c', created_by=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        data = response.json()
+        return data['results'][0] if 'results' in data else data
+
+    def assertBoth(self, list_url, item_url, expected, **params):
+        self.assertEqual(self.get(list_url, **params), expected)
+        self.assertEqual(self.get(item_url, **params), expected)
+
+    def test_alumni(self):
+        list_url, item_url = '/api/alumni/', f'/api/alumni/{self.profile.pk}/'
+        self.assertBoth(list_url, item_url, {'program': 'CS'}, fields='program')
+        self.assertBoth(
+            list_url, item_url,
+            {'id': self.profile.pk, 'user': {'first_name': 'Grace'}},
+            fields='id,user.first_name',
+        )
+        self.assertBoth(list_url, item_url, {'program': 'CS'}, fields='program,nope,user_nope.x')
+        user = self.get(item_url, fields='user')['user']
+        self.assertEqual(user['email'], 'grad@example.com')
+
+    def test_events(self):
+        list_url, item_url = '/api/events/', f'/api/events/{self.event.pk}/'
+        self.assertBoth(list_url, item_url, {'title': 'Reunion'}, fields='title')
+        self.assertBoth(
+            list_url, item_url,
+            {'title': 'Reunion', 'created_by': str(self.admin.pk), 'created_by_name': 'Ada Admin'},
+            fields='title,created_by,created_by_name',
+        )
+        self.assertBoth(
+            list_url, item_url,
+            {'title': 'Reunion', 'created_by': {'first_name': 'Ada'}},
+            fields='title,created_by.first_name', expand='created_by',
+        )
+        expanded = self.get(item_url, expand='created_by')['created_by']
+        self.assertEqual(expanded, {
+            'id': str(self.admin.pk), 'first_name': 'Ada', 'last_name': 'Admin', 'email': 'editor@example.com',
+        })
+        self.assertEqual(self.get(list_url, expand='created_by')['created_by'], expanded)
+        self.assertBoth(list_url, item_url, {}, fields='nope')
+
+    def test_notices(self):
+        list_url, item_url = '/api/notices/', f'/api/notices/{self.notice.pk}/'
+        self.assertBoth(
+            list_url, item_url,
+            {'title': 'Hello', 'created_by_name': 'Ada Admin'},
+            fields='title,created_by_name,nope',
+        )
+        self.assertBoth(
+            list_url, item_url,
+            {'created_by': {'last_name': 'Admin'}},
+            fields='created_by.last_name', expand='created_by',
+        )
+        # without expand, created_by is the id and has nothing to reach into
+        self.assertBoth(list_url, item_url, {'created_by': str(self.admin.pk)}, fields='created_by.last_name')
+
+    def test_writes_ignore_fields(self):
+        response = self.client.patch(f'/api/notices/{self.notice.pk}/?fields=title', {'content': 'new'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], 'new')
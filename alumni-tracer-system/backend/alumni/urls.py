@@ -19,6 +19,9 @@ urlpatterns = [
     path('alumni/', views.AlumniProfileViewSet.as_view({'get': 'list', 'post': 'create'}), name='alumni-list'),
     path('alumni/<int:pk>/', views.AlumniProfileViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update'}), name='alumni-detail'),
     
+    # calendar apps expect a .ics URL without the router's trailing slash
+    path('events/calendar.ics', views.EventViewSet.as_view({'get': 'calendar'}, **views.EventViewSet.calendar.kwargs), name='events-calendar-ics'),
+
     # Add this for user management
     path('users/<uuid:user_id>/', views.UserDetailView.as_view(), name='user-detail'),
     path('users/<uuid:user_id>/alumni-profile/', views.UserAlumniProfileView.as_view(), name='user-alumni-profile'),
@@ -1,28 +1,46 @@
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.http import urlencode
 from rest_framework import viewsets
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import   Count
+from django.db.models import   Count, OuterRef, Subquery
 from rest_framework.permissions import IsAdminUser
 from rest_framework import permissions
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import generics, permissions, status
+from accounts.bulk import NOT_FOUND, bulk_update_users, summarize
 from accounts.models import CustomUser
 from accounts.serializers import UserProfileSerializer
+from accounts.tokens import VersionedJWTAuthentication
+from atss_backend.caching import CachedResponseMixin, ConditionalListMixin, cache_response
+from atss_backend.db import replica_reads
+from atss_backend.ratelimit import throttle
 
 
 
 from .models import (
-    AlumniProfile, Event, Notice,Invitation
+    AlumniProfile, Event, EventRegistration, Notice,Invitation
+)
+from .feeds import (
+    CalendarFeedAuthentication,
+    EventTimelinePagination,
+    calendar_feed_token,
+    filter_events,
+    ical_response,
+)
+from .projections import ALUMNI_LIST, EVENT_LIST, NOTICE_LIST, ProjectedListMixin
+from .registrations import (
+    RegistrationError, cancel as cancel_registration, promote_waitlist, register as register_for_event,
 )
 
 from .serializers import (
-    AlumniProfileListSerializer, AlumniProfileUpdateSerializer, EventSerializer,
-    NoticeSerializer,InvitationSerializer, 
+    AlumniProfileListSerializer, AlumniProfileUpdateSerializer, BulkVerifySerializer, EventSerializer,
+    NoticeSerializer,InvitationSerializer, EventRegistrationSerializer,
     InvitationCreateSerializer,
     InvitationDetailSerializer
 )
@@ -36,9 +54,11 @@ class AlumniPermission(permissions.BasePermission):
             'admin',
         ]
 
-class AlumniProfileViewSet(viewsets.ModelViewSet):
+class AlumniProfileViewSet(CachedResponseMixin, ProjectedListMixin, viewsets.ModelViewSet):
     serializer_class = AlumniProfileListSerializer
     permission_classes = [IsAuthenticated]
+    cache_tags = ('alumni', 'users')
+    projections = {'list': ALUMNI_LIST}
 
     def get_queryset(self):
         if self.action in ['update', 'partial_update', 'destroy']:
@@ -51,6 +71,7 @@ class AlumniProfileViewSet(viewsets.ModelViewSet):
         return self.serializer_class
 
     @action(detail=False, methods=['get'])
+    @cache_response('alumni', 'users', per_user=True)
     def my_profile(self, request):
         try:
             profile = AlumniProfile.objects.get(user=request.user)
@@ -65,7 +86,7 @@ class AlumniProfileViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
     
     def get_permissions(self):
-        if self.action in ['create', 'destroy', 'verify']:
+        if self.action in ['create', 'destroy', 'verify', 'bulk_verify']:
             return [IsAdminUser()]
         elif self.action in ['update', 'partial_update']:
             return [IsAuthenticated()]
@@ -83,7 +104,7 @@ class AlumniProfileViewSet(viewsets.ModelViewSet):
             profile = AlumniProfile.objects.get(pk=pk)
             user = profile.user
             user.is_verified = not user.is_verified
-            user.save()
+            user.save(update_fields=['is_verified'])
 
             return Response({
                 "message": "Verification updated",
@@ -92,6 +113,25 @@ class AlumniProfileViewSet(viewsets.ModelViewSet):
         except AlumniProfile.DoesNotExist:
             return Response({"detail": "Not found"}, status=404)
 
+    @action(detail=False, methods=['post'], url_path='bulk-verify', permission_classes=[IsAdminUser])
+    def bulk_verify(self, request):
+        """
+        Verify (or with "verified": false, unverify) the users of many
+        profiles: {"ids": [profile ids], "verified": true}. Results are keyed
+        by profile id. For whole classes use /api/auth/users/bulk/ with a
+        year_graduated filter.
+        """
+        serializer = BulkVerifySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user_ids = dict(AlumniProfile.objects.filter(pk__in=ids).values_list('pk', 'user_id'))
+        action_name = 'verify' if serializer.validated_data['verified'] else 'unverify'
+        by_user = bulk_update_users(request.user, action_name, ids=list(user_ids.values()))
+        return Response(summarize(action_name, {
+            profile_id: by_user[user_ids[profile_id]] if profile_id in user_ids else NOT_FOUND
+            for profile_id in dict.fromkeys(ids)
+        }))
+
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserProfileSerializer
@@ -115,12 +155,21 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
         return request.user and request.user.is_authenticated and request.user.user_type == 'admin'
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ConditionalListMixin, ProjectedListMixin, viewsets.ModelViewSet):
     serializer_class = EventSerializer
+    projections = {'list': EVENT_LIST, 'timeline': EVENT_LIST}
+    cache_tags = ('events', 'user_names')
+    # rows include the caller's registration status
+    cache_per_user = True
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
 
     def get_queryset(self):
-        return Event.objects.all().select_related('created_by').order_by('-date')
+        my_status = EventRegistration.objects.filter(
+            event=OuterRef('pk'), user=self.request.user
+        ).exclude(status=EventRegistration.STATUS_CANCELLED).values('status')[:1]
+        return Event.objects.all().select_related('created_by').annotate(
+            my_registration_status=Subquery(my_status)
+        ).order_by('-date')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -130,6 +179,11 @@ class EventViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        event = serializer.save()
+        # a raised (or removed) capacity frees seats for the waitlist
+        promote_waitlist(event)
+
     def create(self, request, *args, **kwargs):
         try:
             return super().create(request, *args, **kwargs)
@@ -148,8 +202,71 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class NoticeViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], pagination_class=EventTimelinePagination)
+    @cache_response('events', 'user_names', per_user=True)
+    def timeline(self, request):
+        """Active events by date: ?scope=upcoming|past|all&start=&end=&limit=&cursor="""
+        queryset, self.timeline_scope = filter_events(self.get_queryset(), request.query_params)
+        return self.project(queryset)
+
+    @action(
+        detail=False, methods=['get'],
+        authentication_classes=[CalendarFeedAuthentication, VersionedJWTAuthentication],
+    )
+    def calendar(self, request):
+        """iCalendar feed of active events (?scope=all by default, optional start/end)"""
+        params = request.query_params.copy()
+        params.setdefault('scope', 'all')
+        queryset, scope = filter_events(Event.objects.all(), params)
+        cache_key = f"{scope}:{params.get('start', '')}:{params.get('end', '')}"
+        return ical_response(request, queryset, cache_key)
+
+    @action(detail=False, methods=['get'], url_path='calendar-token')
+    def calendar_token(self, request):
+        """Subscription URL of the calendar feed for the caller's calendar app"""
+        token = calendar_feed_token(request.user)
+        url = request.build_absolute_uri(reverse('events-calendar-ics'))
+        return Response({'token': token, 'url': f'{url}?{urlencode({"token": token})}'})
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def register(self, request, pk=None):
+        event = self.get_object()
+        try:
+            registration = register_for_event(event, request.user, notes=request.data.get('notes'))
+        except RegistrationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(EventRegistrationSerializer(registration).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def cancel_registration(self, request, pk=None):
+        event = self.get_object()
+        try:
+            promoted = cancel_registration(event, request.user)
+        except RegistrationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'message': 'Registration cancelled',
+            'promoted_user_id': str(promoted.user_id) if promoted else None,
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdminOrReadOnly])
+    @replica_reads
+    def registrations(self, request, pk=None):
+        if request.user.user_type != 'admin':
+            return Response({"error": "Permission denied"}, status=403)
+        event = self.get_object()
+        registrations = event.registrations.select_related('user').exclude(
+            status=EventRegistration.STATUS_CANCELLED
+        )
+        page = self.paginate_queryset(registrations)
+        if page is not None:
+            return self.get_paginated_response(EventRegistrationSerializer(page, many=True).data)
+        return Response(EventRegistrationSerializer(registrations, many=True).data)
+
+class NoticeViewSet(ConditionalListMixin, ProjectedListMixin, viewsets.ModelViewSet):
     serializer_class = NoticeSerializer
+    projections = {'list': NOTICE_LIST}
+    cache_tags = ('notices', 'user_names')
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -159,6 +276,7 @@ class NoticeViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 @api_view(["GET"])
+@cache_response('alumni', 'events', 'notices')
 def dashboard_stats(request):
     if request.user.user_type != "admin":
         return Response({"error": "Permission denied"}, status=403)
@@ -182,7 +300,7 @@ def dashboard_stats(request):
 @permission_classes([permissions.IsAuthenticated])
 def invitation_list(request):
     if request.method == 'GET':
-        invitations = Invitation.objects.filter(inviter=request.user)
+        invitations = Invitation.objects.filter(inviter=request.user).select_related('inviter')
         serializer = InvitationSerializer(invitations, many=True)
         return Response(serializer.data)
     
@@ -198,6 +316,7 @@ def invitation_list(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
+@throttle_classes([throttle('invitation')])
 def invitation_detail(request, token):
     try:
         invitation = Invitation.objects.get(token=token)
@@ -1,18 +1,30 @@
 # asgi.py
 
 import os
-from django.core.asgi import get_asgi_application
+
 from channels.routing import ProtocolTypeRouter, URLRouter
-# from channels.auth import AuthMiddlewareStack # <--- REMOVE THIS IMPORT
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+
+from atss_backend.media import MediaASGIApp
+from atss_backend.startup import timed_setup, warm_up
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'atss_backend.settings')
+
+# sets Django up; chat.routing imports models, so it has to come after
+django_asgi_app, startup_report = timed_setup(get_asgi_application)
+startup_report.log()
 
-import chat.routing
+import chat.routing  # noqa: E402
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'your_project.settings')
+if settings.STARTUP_WARMUP:
+    warm_up()
 
 # This is a basic, non-authenticating routing structure
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": URLRouter( # <--- REPLACED AuthMiddlewareStack with just URLRouter
+    # media files skip the middleware stack (atss_backend/media.py)
+    "http": MediaASGIApp(django_asgi_app),
+    "websocket": URLRouter(
         chat.routing.websocket_urlpatterns
     ),
-})
\ No newline at end of file
+})
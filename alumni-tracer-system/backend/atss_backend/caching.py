@@ -0,0 +1,244 @@
+# atss_backend/caching.py
+"""
+Response caching with tag-based invalidation for the DRF views.
+
+Every cached response depends on one or more tags ("alumni", "events",
+"users", ...). A tag is just a version stamp in the cache; the stamps of a
+view's tags are part of its cache key, so invalidating a tag (from a model
+signal, see ``invalidate_on``) makes every dependent entry unreachable
+without having to find and delete them.
+
+Cache keys also include the caller's permission scope (user type and
+staff/superuser flags) so admins and alumni never share an entry, and the
+user id for views whose payload is personal (``per_user=True``).
+
+The same tag versions drive HTTP revalidation: ``ConditionalListMixin``
+turns them into the ETag and Last-Modified of a list, so a client holding
+the current copy gets a 304 without a cache lookup or a query, and any
+other request falls through to the server-side entry. There is one source
+of truth for "has this changed" (the tags, bumped by ``invalidate_on``),
+not a separate stamp per model for the HTTP layer.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.http import HttpRequest
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+DEFAULT_TIMEOUT = 60 * 10
+
+
+# ──────────────────────────────────────────────────────────
+# TAGS
+# ──────────────────────────────────────────────────────────
+def _tag_key(tag):
+    return f"tag:{tag}"
+
+
+def _new_version():
+    # microseconds since the epoch, so a version doubles as a last-modified time
+    return time.time_ns() // 1000
+
+
+def invalidate_tags(*tags):
+    """Mark everything cached under any of ``tags`` as stale"""
+    version = _new_version()
+    cache.set_many({_tag_key(tag): version for tag in tags}, None)
+
+
+def get_tag_versions(*tags):
+    """Current version of each tag, in one cache round trip"""
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        # cold cache or evicted: start fresh stamps (add() keeps a racing writer's value)
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        found.update(cache.get_many(list(missing)))
+    return [found.get(key, missing.get(key)) for key in keys]
+
+
+def get_tag_version(tag):
+    return get_tag_versions(tag)[0]
+
+
+def invalidate_on(model, *tags, ignore_fields=(), fields=()):
+    """
+    Invalidate ``tags`` whenever ``model`` is saved or deleted, once the
+    transaction commits: bumping earlier would let a request re-cache the
+    old rows under the new version before the write is visible.
+
+    Saves that only touch ``ignore_fields`` (e.g. last_login) are skipped.
+    With ``fields``, only saves that change one of them count, compared
+    with the values the instance was loaded with.
+    """
+    ignore_fields = frozenset(ignore_fields)
+    fields = tuple(fields)
+    uid = f"cache-tags:{model._meta.label}:{','.join(tags)}"
+    snapshot_attr = f"_{uid}"
+
+    def snapshot(instance):
+        # deferred fields aren't loaded; None makes any loaded value a change
+        return tuple(instance.__dict__.get(model._meta.get_field(name).attname) for name in fields)
+
+    def on_init(sender, instance, **kwargs):
+        instance.__dict__[snapshot_attr] = snapshot(instance)
+
+    def on_save(sender, instance, created=False, update_fields=None, **kwargs):
+        if ignore_fields and update_fields and set(update_fields) <= ignore_fields:
+            return
+        if fields and not created:
+            if update_fields and not set(update_fields) & set(fields):
+                return
+            current = snapshot(instance)
+            if instance.__dict__.get(snapshot_attr) == current:
+                return
+            instance.__dict__[snapshot_attr] = current
+        transaction.on_commit(lambda: invalidate_tags(*tags))
+
+    def on_delete(sender, instance, **kwargs):
+        transaction.on_commit(lambda: invalidate_tags(*tags))
+
+    if fields:
+        post_init.connect(on_init, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=uid)
+
+
+# ──────────────────────────────────────────────────────────
+# KEYS
+# ──────────────────────────────────────────────────────────
+def permission_scope(user):
+    """Part of the key that separates users who may see different data"""
+    if not user or not user.is_authenticated:
+        return "anon"
+    return f"{getattr(user, 'user_type', '')}:{int(user.is_staff)}:{int(user.is_superuser)}"
+
+
+def _request_digest(request, per_user=False):
+    """Who asked for what: path, host, permission scope (and user for per_user)"""
+    parts = [request.get_full_path(), request.get_host(), permission_scope(request.user)]
+    if per_user:
+        parts.append(str(request.user.pk))
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+def response_cache_key(request, prefix, tags, per_user=False):
+    digest = _request_digest(request, per_user)
+    versions = ".".join(str(v) for v in get_tag_versions(*tags))
+    return f"view:{prefix}:{digest}:{versions}"
+
+
+# ──────────────────────────────────────────────────────────
+# VIEWS
+# ──────────────────────────────────────────────────────────
+def _find_request(args):
+    for arg in args[:2]:
+        if isinstance(arg, (Request, HttpRequest)):
+            return arg
+    raise TypeError("cache_response could not find the request argument")
+
+
+def cache_response(*tags, per_user=False, timeout=DEFAULT_TIMEOUT):
+    """
+    Cache the data of successful GET responses of a DRF function view or
+    viewset action until one of ``tags`` is invalidated.
+
+        @api_view(['GET'])
+        @cache_response('alumni', 'events')
+        def dashboard_stats(request): ...
+    """
+    def decorator(view):
+        prefix = f"{view.__module__}.{view.__qualname__}"
+
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            request = _find_request(args)
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = response_cache_key(request, prefix, tags, per_user=per_user)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={'X-Cache': 'HIT'})
+
+            response = view(*args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'data'):
+                cache.set(key, response.data, timeout)
+                response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+class CachedResponseMixin:
+    """
+    Viewset mixin caching ``list`` and ``retrieve``. Set ``cache_tags`` and,
+    when the payload depends on the caller, ``cache_per_user = True``.
+    """
+    cache_tags = ()
+    cache_per_user = False
+    cache_timeout = DEFAULT_TIMEOUT
+
+    def _cached(self, handler, request, *args, **kwargs):
+        prefix = f"{type(self).__module__}.{type(self).__qualname__}.{self.action}"
+        key = response_cache_key(request, prefix, self.cache_tags, per_user=self.cache_per_user)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalListMixin(CachedResponseMixin):
+    """
+    CachedResponseMixin plus HTTP revalidation for ``list``: responses carry
+    an ETag and Last-Modified derived from the tag versions, and matching
+    If-None-Match / If-Modified-Since requests get a 304 without touching
+    the database. The ETag is scoped like the cache key, so one caller's
+    validator never matches another caller's list.
+    """
+
+    def list(self, request, *args, **kwargs):
+        version = max(get_tag_versions(*self.cache_tags))
+        scope = _request_digest(request, self.cache_per_user)[:12]
+        etag = f'W/"{"-".join(self.cache_tags)}-{version}-{scope}"'
+        # HTTP dates have one-second resolution
+        last_modified = version // 1_000_000
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(last_modified),
+            # clients may keep a copy but must revalidate every time
+            'Cache-Control': 'private, no-cache',
+            'Vary': 'Authorization',
+        }
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return Response(status=not_modified.status_code, headers=headers)
+
+        response = super().list(request, *args, **kwargs)
+        for name, value in headers.items():
+            response[name] = value
+        return response
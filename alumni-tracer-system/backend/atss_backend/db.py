@@ -0,0 +1,103 @@
+# atss_backend/db.py
+"""
+Database routing and health.
+
+When settings.DATABASES has a 'replica' alias, ReadReplicaRouter sends
+reads there, but only inside ``use_replica()``. Writes, migrations and
+every read outside that block stay on 'default', so code that reads its own
+writes never sees replication lag. Views opt in with ``@replica_reads``
+(e.g. the event registrations list), which routes the body of their
+safe-method requests to the replica; use it only for views whose data may
+be a few seconds stale.
+
+It goes under ``@api_view`` / ``@action``, so DRF has already
+authenticated the request on 'default' by the time the body runs: a token
+revoked on the primary is refused even if the replica lags.
+
+Don't combine it with the response cache (atss_backend/caching.py): a GET
+right after a write would read the lagging replica and store the old
+payload under the new tag version for the whole timeout.
+"""
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Route reads in this block to the replica, if there is one"""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+def replica_reads(view):
+    """
+    Run a DRF function view or viewset action against the read replica for
+    GET/HEAD/OPTIONS. Apply it below @api_view / @action.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        # (request) for a function view, (self, request) for an action
+        request = next(arg for arg in args[:2] if isinstance(arg, Request))
+        with use_replica(request.method in SAFE_METHODS):
+            return view(*args, **kwargs)
+    return wrapped
+
+
+def health(request):
+    """
+    GET /api/health/: round trip to every configured database. 200 when all
+    answer, 503 otherwise, for load balancer and orchestrator probes. The
+    endpoint is public, so the details only go to the log.
+    """
+    healthy = True
+    for alias in settings.DATABASES:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        except Exception:
+            healthy = False
+            logger.exception("Health check failed for database %s", alias)
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'unavailable'},
+        status=200 if healthy else 503,
+    )
@@ -0,0 +1,106 @@
+# atss_backend/fieldsets.py
+"""
+Sparse fieldsets for the REST API.
+
+    GET /api/alumni/?fields=id,program,user.first_name,user.last_name
+    GET /api/events/?fields=id,title,date&expand=created_by
+
+``fields`` keeps only the listed keys (dotted paths reach into nested
+objects; naming a nested object keeps all of it). ``expand`` inlines a
+related object that is normally rendered as its id. Both are parsed into
+trees such as {'id': None, 'user': {'first_name': None}}, where None means
+"everything below here". Unknown names are ignored.
+
+They only apply to safe methods, so a write never loses fields it needs to
+validate. Serializers opt in with SparseFieldsMixin; the values()
+projections (alumni/projections.py) and plain dict payloads (chat) use the
+same trees to narrow their queries and output.
+"""
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_tree(value):
+    """'a,b.c,b.d' -> {'a': None, 'b': {'c': None, 'd': None}}"""
+    tree = {}
+    for path in (value or '').split(','):
+        parts = [part for part in path.strip().split('.') if part]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                # the whole object was already asked for
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def get_sparse_params(request):
+    """(fields tree or None for everything, expand tree) for ``request``"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, {}
+    params = getattr(request, 'query_params', request.GET)
+    fields = params.get('fields')
+    return (parse_tree(fields) if fields else None), parse_tree(params.get('expand'))
+
+
+def select_fields(data, tree):
+    """Apply a fields tree to plain dict/list payloads"""
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: select_fields(value, tree[key])
+        for key, value in data.items()
+        if key in tree
+    }
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin honouring ?fields= and ?expand=. Nested
+    serializers that also use the mixin receive their part of the trees.
+
+    ``expandable_fields`` maps a field name to (serializer class, kwargs)
+    used in its place when expanded.
+    """
+    expandable_fields = {}
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def _sparse_trees(self):
+        if hasattr(self, '_sparse_fields'):
+            return self._sparse_fields, self._sparse_expand
+        if not self._is_root():
+            return None, {}
+        return get_sparse_params(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        tree, expand = self._sparse_trees()
+
+        for name, sub_expand in expand.items():
+            if name in self.expandable_fields:
+                serializer_class, kwargs = self.expandable_fields[name]
+                fields[name] = serializer_class(read_only=True, **kwargs)
+
+        if tree is not None:
+            fields = {name: field for name, field in fields.items() if name in tree}
+
+        for name, field in fields.items():
+            target = getattr(field, 'child', field)
+            if isinstance(target, SparseFieldsMixin):
+                target._sparse_fields = tree[name] if tree is not None else None
+                target._sparse_expand = expand.get(name) or {}
+        return fields
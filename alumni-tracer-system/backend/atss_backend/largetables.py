@@ -0,0 +1,185 @@
+# atss_backend/largetables.py
+"""
+Django admin settings for tables too big for the stock changelist.
+
+The stock changelist runs an exact COUNT(*) (twice when
+show_full_result_count is on), pages with OFFSET and searches with
+``icontains``, all of which scan the table. ``LargeTableAdminMixin``
+replaces them:
+
+- counts come from ``EstimatedCountPaginator``: the planner's row estimate
+  for the whole table, and a count that stops at ESTIMATE_THRESHOLD for
+  filtered lists;
+- with the default ordering, pages are fetched by keyset (``?after=`` the
+  last row's ``keyset_fields``) instead of OFFSET, so page 5000 costs the
+  same as page 1. Sorting by a column falls back to numbered pages;
+- ``search_fields`` are matched as ``=field`` exact and ``^field`` prefix
+  (a range on the column, so a plain index serves it) and never
+  ``icontains``. Bare names are treated as prefixes.
+
+Pair it with ``list_select_related`` and ``autocomplete_fields`` on the
+admin class.
+"""
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'after'
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimate_row_count(model, using='default'):
+    """Approximate number of rows in ``model``'s table without scanning it, or None"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            # highest rowid: one index seek, high only by rows deleted since
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+def prefix_q(name, prefix):
+    """``name`` starts with ``prefix``, as a range a plain index can serve (LIKE often can't)"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{name}__gte': prefix, f'{name}__lt': upper})
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is estimated once it's past ESTIMATE_THRESHOLD"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        # filtered: count at most one past the threshold
+        return queryset[:ESTIMATE_THRESHOLD + 1].count()
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList that pages by keyset while the admin's default ordering applies"""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    @property
+    def keyset(self):
+        return bool(
+            self.model_admin.keyset_fields
+            and ORDER_VAR not in self.params
+            and not self.list_editable
+            and not self.show_all
+        )
+
+    def _keyset_fields(self):
+        return [
+            self.lookup_opts.pk if name == 'pk' else self.lookup_opts.get_field(name)
+            for name in self.model_admin.keyset_fields
+        ]
+
+    def _after(self, cursor):
+        """Rows after ``cursor`` in descending keyset order"""
+        fields = self._keyset_fields()
+        values = cursor.split(',')
+        if len(values) != len(fields):
+            raise IncorrectLookupParameters
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except ValidationError as exc:
+            raise IncorrectLookupParameters from exc
+        # (a, b) < (x, y)  ->  a < x OR (a = x AND b < y); the leading
+        # a <= x lets the database walk the index in order and stop early
+        condition = Q()
+        for i, field in enumerate(fields):
+            equal = {f.attname: v for f, v in zip(fields[:i], values[:i])}
+            condition |= Q(**equal, **{f'{field.attname}__lt': values[i]})
+        return Q(**{f'{fields[0].attname}__lte': values[0]}) & condition
+
+    def _cursor_for(self, obj):
+        return ','.join(field.value_to_string(obj) for field in self._keyset_fields())
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+
+        cursor = request.GET.get(CURSOR_VAR)
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(cursor))
+        rows = list(queryset[:self.list_per_page + 1])
+        has_next = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_next or bool(cursor)
+        self.cursor = cursor
+        self.first_page_url = self.get_query_string(remove=[CURSOR_VAR]) if cursor else None
+        self.next_page_url = (
+            self.get_query_string({CURSOR_VAR: self._cursor_for(rows[-1])}) if has_next else None
+        )
+
+
+class LargeTableAdminMixin:
+    # newest first; the last field must be unique, and the fields together
+    # indexed. None disables keyset pages.
+    keyset_fields = ('pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_ordering(self, request):
+        if self.keyset_fields:
+            return tuple(f'-{name}' for name in self.keyset_fields)
+        return super().get_ordering(request)
+
+    def search_filters(self, request, term):
+        """Filters any of which matches ``term``; extend for lookups search_fields can't express"""
+        for field in self.get_search_fields(request):
+            if field.startswith('='):
+                yield Q(**{field[1:]: term})
+            else:
+                yield prefix_q(field.lstrip('^'), term)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q()
+        for q in self.search_filters(request, term):
+            try:
+                # values are checked against the field as the filter is built
+                queryset.filter(q)
+            except (ValueError, ValidationError):
+                continue
+            condition |= q
+        return (queryset.filter(condition) if condition else queryset.none()), False
+
+
+class LargeTableAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    pass
@@ -0,0 +1,419 @@
+# atss_backend/loadtest.py
+"""
+Synthetic data and scripted load for the REST and WebSocket paths.
+
+    python manage.py seed_load_data --alumni 2000 --conversations 500 --messages 40
+    python manage.py loadtest --requests 200 --concurrency 8 --ws-clients 50
+
+Seeded rows belong to users named ``load-*`` so they can be removed again
+with ``seed_load_data --flush``. The load runs in-process (Django test
+client in worker threads, channels' WebsocketCommunicator for sockets), so
+it needs no running server and measures whatever database the settings
+point at, SQLite or a local Postgres. With --base-url the REST scenarios go
+over HTTP to a running server instead, and query counts are read from its
+Server-Timing header (see querycount.py; start it with
+QUERY_INSTRUMENTATION=True).
+"""
+
+import asyncio
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import CustomUser
+from alumni.models import AlumniProfile, Event, Notice
+from chat.models import Conversation, ConversationMember, Message
+
+from .caching import invalidate_tags
+from .querycount import QueryRecorder
+
+LOAD_PREFIX = 'load-'
+LOAD_PASSWORD = 'loadtest-password'
+BATCH_SIZE = 2000
+
+
+# ──────────────────────────────────────────────────────────
+# DATA
+# ──────────────────────────────────────────────────────────
+def flush_load_data():
+    """Delete every seeded user; profiles, chats and events cascade"""
+    deleted, _ = CustomUser.objects.filter(username__startswith=LOAD_PREFIX).delete()
+    invalidate_tags('alumni', 'users', 'user_names', 'events', 'notices')
+    return deleted
+
+
+def seed_load_data(alumni=1000, conversations=200, messages=20, events=100, notices=50, seed=None):
+    """
+    Create ``alumni`` users with profiles, ``conversations`` direct chats
+    between random pairs of them holding ``messages`` messages each, plus
+    events and notices owned by a load admin. Returns a summary dict.
+    """
+    if conversations > alumni * (alumni - 1) // 2:
+        raise ValueError("Not enough alumni for that many distinct conversations")
+
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:6]
+    password = make_password(LOAD_PASSWORD)
+    now = timezone.now()
+
+    with transaction.atomic():
+        admin = CustomUser.objects.create(
+            username=f'{LOAD_PREFIX}admin-{run}', email=f'{LOAD_PREFIX}admin-{run}@example.com',
+            password=password, user_type='admin', first_name='Load', last_name='Admin',
+        )
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'{LOAD_PREFIX}{run}-{i}', email=f'{LOAD_PREFIX}{run}-{i}@example.com',
+                password=password, first_name=f'Alumnus{i}', last_name=run,
+                user_type='alumni', is_verified=True,
+            )
+            for i in range(alumni)
+        ], batch_size=BATCH_SIZE)
+        AlumniProfile.objects.bulk_create([
+            AlumniProfile(
+                user=user, student_id=f'L{run}{i}', year_graduated=1995 + i % 30,
+                program=rng.choice(['Computer Science', 'Economics', 'Law', 'Medicine', 'Education']),
+                current_employer=f'Company {i % 97}', job_title='Analyst',
+                location='Nairobi', bio='Synthetic alumnus ' * 5,
+            )
+            for i, user in enumerate(users)
+        ], batch_size=BATCH_SIZE)
+
+        pairs = set()
+        while len(pairs) < conversations:
+            a, b = rng.sample(range(alumni), 2)
+            pairs.add((min(a, b), max(a, b)))
+        pairs = sorted(pairs)
+        convs = Conversation.objects.bulk_create([
+            Conversation(direct_key=Conversation.direct_key_for(users[a].id, users[b].id))
+            for a, b in pairs
+        ], batch_size=BATCH_SIZE)
+        ConversationMember.objects.bulk_create([
+            ConversationMember(conversation=conv, user=users[i])
+            for conv, pair in zip(convs, pairs) for i in pair
+        ], batch_size=BATCH_SIZE)
+
+        batch = []
+        for conv, (a, b) in zip(convs, pairs):
+            for k in range(messages):
+                sender = users[a] if k % 2 == 0 else users[b]
+                batch.append(Message(conversation=conv, sender=sender, body=f'Message {k} in {conv.id}'))
+                if len(batch) >= BATCH_SIZE:
+                    Message.objects.bulk_create(batch)
+                    batch = []
+        Message.objects.bulk_create(batch)
+
+        Event.objects.bulk_create([
+            Event(
+                title=f'Load event {i}', description='Synthetic event', location='Main hall',
+                date=now + timedelta(days=i - events // 2), created_by=admin,
+                capacity=100 if i % 3 else None,
+            )
+            for i in range(events)
+        ], batch_size=BATCH_SIZE)
+        Notice.objects.bulk_create([
+            Notice(title=f'Load notice {i}', content='Synthetic notice', created_by=admin)
+            for i in range(notices)
+        ], batch_size=BATCH_SIZE)
+
+    # bulk_create sends no signals, so cached responses would not notice
+    invalidate_tags('alumni', 'users', 'user_names', 'events', 'notices')
+    return {
+        'run': run,
+        'alumni': alumni,
+        'conversations': conversations,
+        'messages': conversations * messages,
+        'events': events,
+        'notices': notices,
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# REPORTING
+# ──────────────────────────────────────────────────────────
+def percentile(samples, pct):
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(name, latencies_ms, wall_seconds, queries=(), errors=0, cache_hits=0):
+    return {
+        'scenario': name,
+        'requests': len(latencies_ms),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies_ms, 50), 2),
+        'p99_ms': round(percentile(latencies_ms, 99), 2),
+        'max_ms': round(max(latencies_ms, default=0), 2),
+        'throughput_rps': round(len(latencies_ms) / wall_seconds, 1) if wall_seconds else 0.0,
+        'avg_queries': round(statistics.mean(queries), 1) if queries else None,
+        'max_queries': max(queries) if queries else None,
+        'cache_hit_pct': round(100 * cache_hits / len(latencies_ms), 1) if latencies_ms else 0.0,
+    }
+
+
+def format_report(results):
+    header = (
+        f"{'scenario':<16}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'max ms':>10}{'req/s':>9}{'queries':>9}{'hit %':>7}"
+    )
+    lines = [header, '-' * len(header)]
+    for r in results:
+        queries = '-' if r['avg_queries'] is None else f"{r['avg_queries']:.1f}"
+        lines.append(
+            f"{r['scenario']:<16}{r['requests']:>7}{r['errors']:>6}{r['p50_ms']:>10.1f}"
+            f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['throughput_rps']:>9.1f}"
+            f"{queries:>9}{r['cache_hit_pct']:>7.1f}"
+        )
+    return '\n'.join(lines)
+
+
+# ──────────────────────────────────────────────────────────
+# REST LOAD
+# ──────────────────────────────────────────────────────────
+_SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def _load_fixtures():
+    """Users, tokens and conversation pairs the scenarios pick from"""
+    admin = CustomUser.objects.filter(
+        username__startswith=LOAD_PREFIX, user_type='admin'
+    ).order_by('-date_joined').first()
+    if admin is None:
+        raise ValueError("No load data found; run seed_load_data first")
+
+    pairs = list(
+        ConversationMember.objects.filter(user__username__startswith=LOAD_PREFIX)
+        .values_list('conversation_id', 'user_id')[:20000]
+    )
+    members = {}
+    for conversation_id, user_id in pairs:
+        members.setdefault(conversation_id, []).append(user_id)
+    conversations = [(cid, *ids) for cid, ids in members.items() if len(ids) == 2]
+    alumni_ids = list(
+        CustomUser.objects.filter(username__startswith=LOAD_PREFIX, user_type='alumni')
+        .values_list('id', flat=True)[:5000]
+    )
+    if not conversations or not alumni_ids:
+        raise ValueError("Load data has no alumni or conversations")
+
+    users = {u.id: u for u in CustomUser.objects.filter(
+        id__in={admin.id, *alumni_ids[:500], *(i for c in conversations[:500] for i in c[1:])}
+    )}
+    tokens = {uid: str(AccessToken.for_user(user)) for uid, user in users.items()}
+    conversations = [c for c in conversations if c[1] in tokens and c[2] in tokens]
+    return {
+        'admin': admin.id,
+        'alumni': [i for i in alumni_ids if i in tokens],
+        'conversations': conversations,
+        'pairs': [c[1:] for c in conversations],
+        'tokens': tokens,
+    }
+
+
+def rest_scenarios(fixtures):
+    """name -> function(rng) returning (path, user id)"""
+    def alumni(rng):
+        return '/api/alumni/', rng.choice(fixtures['alumni'])
+
+    def conversations(rng):
+        return '/api/chat/conversations/', rng.choice(rng.choice(fixtures['pairs']))
+
+    def messages(rng):
+        me, other = rng.sample(rng.choice(fixtures['pairs']), 2)
+        return f'/api/chat/messages/{other}/', me
+
+    def dashboard(rng):
+        return '/api/dashboard/stats/', fixtures['admin']
+
+    return {
+        'alumni': alumni,
+        'conversations': conversations,
+        'messages': messages,
+        'dashboard': dashboard,
+    }
+
+
+class _InProcessTransport:
+    def __init__(self):
+        self.local = threading.local()
+
+    def get(self, path, token):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(HTTP_HOST='localhost')
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = client.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+        return response.status_code, response.get('X-Cache'), recorder.count
+
+
+class _HttpTransport:
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.requests = requests
+        self.local = threading.local()
+
+    def get(self, path, token):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        response = session.get(self.base_url + path, headers={'Authorization': f'Bearer {token}'})
+        match = _SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+        return response.status_code, response.headers.get('X-Cache'), int(match.group(1)) if match else None
+
+
+def run_rest_load(names=None, requests=200, concurrency=8, base_url=None, seed=None):
+    """Run each REST scenario and return one summary per scenario"""
+    fixtures = _load_fixtures()
+    scenarios = rest_scenarios(fixtures)
+    transport = _HttpTransport(base_url) if base_url else _InProcessTransport()
+    results = []
+
+    for name in names or scenarios:
+        pick = scenarios[name]
+        rng = random.Random(seed)
+        plan = [pick(rng) for _ in range(requests)]
+
+        def one(item):
+            path, user_id = item
+            start = time.perf_counter()
+            status, cache_state, queries = transport.get(path, fixtures['tokens'][user_id])
+            return (time.perf_counter() - start) * 1000, status, cache_state, queries
+
+        def worker(items):
+            try:
+                return [one(item) for item in items]
+            finally:
+                connection.close()
+
+        chunks = [plan[i::concurrency] for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = [o for chunk in pool.map(worker, chunks) for o in chunk]
+        wall = time.perf_counter() - start
+
+        results.append(summarize(
+            name,
+            [o[0] for o in outcomes],
+            wall,
+            queries=[o[3] for o in outcomes if o[3] is not None],
+            errors=sum(1 for o in outcomes if o[1] >= 400),
+            cache_hits=sum(1 for o in outcomes if o[2] == 'HIT'),
+        ))
+    return results
+
+
+# ──────────────────────────────────────────────────────────
+# WEBSOCKET LOAD
+# ──────────────────────────────────────────────────────────
+async def _ws_client(application, token, conversation_id, count, timeout):
+    from channels.testing import WebsocketCommunicator
+
+    communicator = WebsocketCommunicator(application, f'/ws/chat/?token={token}')
+    start = time.perf_counter()
+    connected, _ = await communicator.connect(timeout=timeout)
+    connect_ms = (time.perf_counter() - start) * 1000
+    latencies, errors = [], 0
+    if not connected:
+        return connect_ms, latencies, count
+
+    try:
+        for i in range(count):
+            text = f'load {uuid.uuid4().hex}'
+            sent = time.perf_counter()
+            await communicator.send_json_to({
+                'type': 'send_message', 'conversation_id': str(conversation_id), 'message': text,
+            })
+            # our own copy comes back through the conversation group
+            while True:
+                try:
+                    event = await communicator.receive_json_from(timeout=timeout)
+                except asyncio.TimeoutError:
+                    errors += 1
+                    break
+                if event.get('type') == 'chat_message' and event.get('message') == text:
+                    latencies.append((time.perf_counter() - sent) * 1000)
+                    break
+    finally:
+        await communicator.disconnect()
+    return connect_ms, latencies, errors
+
+
+def run_ws_load(clients=20, messages=10, timeout=10, seed=None):
+    """
+    Connect ``clients`` sockets concurrently, then have each send
+    ``messages`` chat messages and wait for its own copy to come back.
+    Returns summaries for connects and message round trips.
+    """
+    from channels.routing import URLRouter
+
+    import chat.routing
+
+    fixtures = _load_fixtures()
+    rng = random.Random(seed)
+    application = URLRouter(chat.routing.websocket_urlpatterns)
+
+    # one socket per user, each talking in one of its conversations
+    conversations = list(fixtures['conversations'])
+    rng.shuffle(conversations)
+    senders = {}
+    for conversation_id, a, b in conversations:
+        for uid in (a, b):
+            senders.setdefault(uid, conversation_id)
+    senders = list(senders.items())[:clients]
+
+    # consumers query from the sync_to_async worker thread; record whatever
+    # connection it opens
+    recorder = QueryRecorder()
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(recorder)
+
+    connection_created.connect(install)
+
+    async def main():
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            _ws_client(application, fixtures['tokens'][uid], cid, messages, timeout)
+            for uid, cid in senders
+        ))
+        return outcomes, time.perf_counter() - start
+
+    try:
+        outcomes, wall = asyncio.run(main())
+    finally:
+        connection_created.disconnect(install)
+
+    latencies = [ms for _, lat, _ in outcomes for ms in lat]
+    per_message = [recorder.count / len(latencies)] if latencies else []
+    return [
+        summarize('ws connect', [o[0] for o in outcomes], wall),
+        summarize(
+            'ws message', latencies, wall,
+            queries=per_message, errors=sum(o[2] for o in outcomes),
+        ),
+    ]
+
+
+def dump_results(results, path):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=2)
@@ -0,0 +1,183 @@
+# atss_backend/log.py
+"""
+Structured, off-thread logging.
+
+settings.LOGGING_CONFIG points at configure_logging, which applies
+settings.LOGGING with dictConfig and then puts every configured handler
+behind a queue: the request thread (or the event loop) only builds the
+record and drops it on an in-memory queue, and a listener thread does the
+formatting and the write. When the queue is full records are dropped and
+counted rather than blocking the caller; the count is logged as an
+``atss.log`` WARNING once the queue has room again (or at exit).
+
+JsonFormatter writes one JSON object per line, including anything passed
+through ``extra=``. SamplingFilter keeps a fraction of the low-level records
+of chatty loggers (``LOG_SAMPLE_RATES``). Handler filters run before the
+record is queued, so sampled-out records cost next to nothing.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.config
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+QUEUE_SIZE = 10000
+
+# attributes every LogRecord has; anything else came from extra=
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listeners = []
+
+
+def parse_levels(value):
+    """'chat=DEBUG,atss.queries=WARNING' -> {'chat': 'DEBUG', 'atss.queries': 'WARNING'}"""
+    result = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, setting = item.partition('=')
+        result[name.strip()] = setting.strip()
+    return result
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep records at or below ``max_level`` from the loggers in ``rates``
+    ({logger name prefix: fraction kept}) with that probability. The longest
+    matching prefix wins; other loggers and higher levels always pass.
+    """
+
+    def __init__(self, rates=None, max_level='DEBUG'):
+        super().__init__()
+        self.rates = sorted(
+            ((name, float(rate)) for name, rate in (rates or {}).items()),
+            key=lambda item: len(item[0]), reverse=True,
+        )
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def _rate(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0      # since the handler was created
+        self.unreported = 0   # dropped since the last "records dropped" warning
+
+    def enqueue(self, record):
+        try:
+            if self.unreported:
+                self.queue.put_nowait(self.dropped_record())
+                self.unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.unreported += 1
+
+    def dropped_record(self):
+        """A ready-to-format WARNING reporting the unreported drops"""
+        record = logging.makeLogRecord({
+            'name': 'atss.log', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f'Log queue full, dropped {self.unreported} records',
+            'dropped_records': self.unreported,
+        })
+        record.message = record.msg
+        return record
+
+    def prepare(self, record):
+        # like QueueHandler.prepare, but keep the traceback separate from the
+        # message so the JSON formatter can put it in its own key
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _queued(handler):
+    """A queue handler feeding ``handler`` from a listener thread"""
+    records = queue.Queue(QUEUE_SIZE)
+    front = NonBlockingQueueHandler(records)
+    front.setLevel(handler.level)
+    # filters run in the caller, before the record is queued
+    for f in handler.filters:
+        front.addFilter(f)
+    handler.filters = []
+
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append((front, listener))
+    return front
+
+
+def configure_logging(config):
+    """LOGGING_CONFIG callable: dictConfig, then queue every configured handler"""
+    _flush()
+    if not config:
+        return
+    logging.config.dictConfig(config)
+
+    wrapped = {}
+    loggers = [logging.getLogger()] + [logging.getLogger(name) for name in config.get('loggers', {})]
+    for logger in loggers:
+        for i, handler in enumerate(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                continue
+            if handler not in wrapped:
+                wrapped[handler] = _queued(handler)
+            logger.handlers[i] = wrapped[handler]
+
+
+@atexit.register
+def _flush():
+    while _listeners:
+        front, listener = _listeners.pop()
+        listener.stop()
+        if front.unreported:
+            # nothing reads the queue any more; write the count directly
+            for handler in listener.handlers:
+                handler.handle(front.dropped_record())
+            front.unreported = 0
@@ -0,0 +1,343 @@
+# atss_backend/media.py
+"""
+Serving MEDIA_ROOT (event_images/, profile_pics/, chat_files/) in production.
+
+Every response carries an ETag and Last-Modified built from the file's
+mtime and size, and a long ``Cache-Control: public, max-age=MEDIA_MAX_AGE``.
+Files under MEDIA_PRIVATE_DIRS (chat attachments) are only served to a
+signed-in user (session or JWT) whom the directory's check lets in (for
+chat_files/, a member of the conversation) and marked ``private`` instead.
+Matching If-None-Match / If-Modified-Since requests get a 304. ``Range``
+requests (one range; If-Range respected) get a 206. Files are never read
+into memory as a whole.
+
+Two entry points share ``plan_response``:
+
+- ``MediaASGIApp`` wraps the Django ASGI application (asgi.py) and answers
+  GET/HEAD under MEDIA_URL before the middleware stack runs. It hands the
+  file to the server when it supports the ``http.response.pathsend`` or
+  ``http.response.zerocopysend`` extension (sendfile), and otherwise sends
+  CHUNK_SIZE chunks read in a worker thread. Private files go through
+  Django, which authenticates the request.
+- ``serve_media`` is the same thing as a Django view for WSGI servers and
+  the test client. Its FileResponse lets the WSGI server's file_wrapper
+  (gunicorn: sendfile) do the copy, ranges included.
+
+With MEDIA_OFFLOAD set, neither sends the body. A fronting proxy does,
+from an ``X-Accel-Redirect: MEDIA_ACCEL_PREFIX<name>`` header (nginx,
+``internal`` location aliased to MEDIA_ROOT) or an ``X-Sendfile: <path>``
+header (Apache mod_xsendfile, lighttpd). The proxy then also handles
+Range.
+"""
+
+import asyncio
+import mimetypes
+import os
+import stat
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.utils.module_loading import import_string
+
+CHUNK_SIZE = 64 * 1024
+
+OFFLOAD_ACCEL = 'accel'
+OFFLOAD_SENDFILE = 'sendfile'
+
+
+# ──────────────────────────────────────────────────────────
+# FILES
+# ──────────────────────────────────────────────────────────
+class MediaFile:
+    def __init__(self, name, path, st):
+        self.name = name
+        self.path = path
+        self.private = is_private(path)
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        content_type, encoding = mimetypes.guess_type(path)
+        # a .gz is served as is, not as the type it decompresses to
+        self.content_type = 'application/octet-stream' if encoding else (content_type or 'application/octet-stream')
+
+
+def media_path(name):
+    """Absolute path of ``name`` under MEDIA_ROOT, None if it points outside"""
+    try:
+        return safe_join(settings.MEDIA_ROOT, name)
+    except (SuspiciousFileOperation, ValueError):
+        return None
+
+
+def private_dir(path):
+    """(MEDIA_PRIVATE_DIRS entry, name below it) for a private ``path``, else None"""
+    # on the normalised path, so "x/../chat_files/..." is private too
+    name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    for directory in settings.MEDIA_PRIVATE_DIRS:
+        if name.startswith(directory):
+            return directory, name[len(directory):]
+    return None
+
+
+def is_private(path):
+    return private_dir(path) is not None
+
+
+def find_media(name):
+    """The regular file ``name`` under MEDIA_ROOT, or None. Blocks on a stat()."""
+    path = media_path(name)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return MediaFile(name, path, st)
+
+
+class RangeFile:
+    """
+    Read-only view of bytes ``start``..``end`` (inclusive) of a file. It
+    keeps the real file's fileno() and position, which is what a WSGI
+    server's sendfile path uses (with the Content-Length) for the copy.
+    """
+
+    def __init__(self, path, start, end):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+# ──────────────────────────────────────────────────────────
+# HEADERS
+# ──────────────────────────────────────────────────────────
+def parse_range(value, size):
+    """
+    (start, end) of a single ``bytes=`` range, clamped to ``size``; None to
+    ignore the header (malformed or several ranges); False if unsatisfiable.
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not first:
+            # suffix: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _not_modified(headers, media):
+    if 'if-none-match' in headers:
+        etags = parse_etags(headers['if-none-match'])
+        # weak comparison
+        return etags == ['*'] or media.etag in (etag.removeprefix('W/') for etag in etags)
+    since = parse_http_date_safe(headers.get('if-modified-since', ''))
+    return since is not None and media.mtime <= since
+
+
+def _if_range_matches(value, media):
+    if value is None:
+        return True
+    if value.startswith('"'):
+        return value == media.etag
+    return parse_http_date_safe(value) == media.mtime
+
+
+class ResponsePlan:
+    def __init__(self, status, headers, byte_range=None, send_body=True):
+        self.status = status
+        self.headers = headers
+        self.byte_range = byte_range
+        self.send_body = send_body
+
+
+def plan_response(media, method, headers):
+    """
+    What to answer a GET/HEAD of ``media`` with, given the request
+    ``headers`` (lower-case names): status, response headers, the byte
+    range to send (None for all) and whether to send a body at all.
+    """
+    response_headers = {
+        'ETag': media.etag,
+        'Last-Modified': http_date(media.mtime),
+        'Cache-Control': f"{'private' if media.private else 'public'}, max-age={settings.MEDIA_MAX_AGE}",
+        'X-Content-Type-Options': 'nosniff',
+    }
+    if _not_modified(headers, media):
+        return ResponsePlan(304, response_headers, send_body=False)
+
+    response_headers['Content-Type'] = media.content_type
+    if settings.MEDIA_OFFLOAD == OFFLOAD_ACCEL:
+        response_headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(media.name)
+        return ResponsePlan(200, response_headers, send_body=False)
+    if settings.MEDIA_OFFLOAD == OFFLOAD_SENDFILE:
+        response_headers['X-Sendfile'] = media.path
+        return ResponsePlan(200, response_headers, send_body=False)
+
+    response_headers['Accept-Ranges'] = 'bytes'
+    byte_range = None
+    if 'range' in headers and _if_range_matches(headers.get('if-range'), media):
+        byte_range = parse_range(headers['range'], media.size)
+        if byte_range is False:
+            response_headers['Content-Range'] = f'bytes */{media.size}'
+            response_headers['Content-Length'] = '0'
+            return ResponsePlan(416, response_headers, send_body=False)
+
+    if byte_range:
+        start, end = byte_range
+        response_headers['Content-Range'] = f'bytes {start}-{end}/{media.size}'
+        response_headers['Content-Length'] = str(end - start + 1)
+        status = 206
+    else:
+        response_headers['Content-Length'] = str(media.size)
+        status = 200
+    return ResponsePlan(status, response_headers, byte_range, send_body=method != 'HEAD')
+
+
+# ──────────────────────────────────────────────────────────
+# DJANGO VIEW
+# ──────────────────────────────────────────────────────────
+def _authenticated_user(request):
+    if request.user.is_authenticated:
+        return request.user
+    from accounts.tokens import VersionedJWTAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+
+    try:
+        result = VersionedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def serve_media(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=405, headers={'Allow': 'GET, HEAD'})
+    full_path = media_path(path)
+    private = private_dir(full_path) if full_path else None
+    # before the stat, so the answer doesn't tell whether the file exists
+    if private:
+        user = _authenticated_user(request)
+        if user is None:
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+        directory, name = private
+        if not import_string(settings.MEDIA_PRIVATE_DIRS[directory])(user, name):
+            raise Http404('No such file')
+    media = find_media(path)
+    if media is None:
+        raise Http404('No such file')
+
+    headers = {name.lower(): value for name, value in request.headers.items()}
+    plan = plan_response(media, request.method, headers)
+    if not plan.send_body:
+        response = HttpResponse(status=plan.status)
+    elif plan.byte_range:
+        response = FileResponse(RangeFile(media.path, *plan.byte_range), status=plan.status)
+    else:
+        response = FileResponse(open(media.path, 'rb'), status=plan.status)
+    response.block_size = CHUNK_SIZE
+    for name, value in plan.headers.items():
+        response[name] = value
+    return response
+
+
+# ──────────────────────────────────────────────────────────
+# ASGI
+# ──────────────────────────────────────────────────────────
+class MediaASGIApp:
+    """Answer GET/HEAD under MEDIA_URL directly, pass everything else to ``app``"""
+
+    def __init__(self, app, prefix=None):
+        self.app = app
+        self.prefix = prefix or settings.MEDIA_URL
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope['type'] != 'http'
+            or scope['method'] not in ('GET', 'HEAD')
+            or not scope['path'].startswith(self.prefix)
+        ):
+            return await self.app(scope, receive, send)
+
+        loop = asyncio.get_running_loop()
+        media = await loop.run_in_executor(None, find_media, unquote(scope['path'][len(self.prefix):]))
+        if media is None or media.private:
+            # Django's 404 page, logging and middleware as for any other
+            # URL; private files need its authentication
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        plan = plan_response(media, scope['method'], headers)
+        await send({
+            'type': 'http.response.start',
+            'status': plan.status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in plan.headers.items()],
+        })
+        if not plan.send_body:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        await self.send_file(scope, send, media, plan.byte_range)
+
+    async def send_file(self, scope, send, media, byte_range):
+        start, end = byte_range or (0, media.size - 1)
+        if end < start:
+            # empty file
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        extensions = scope.get('extensions') or {}
+        if byte_range is None and 'http.response.pathsend' in extensions:
+            await send({'type': 'http.response.pathsend', 'path': media.path})
+            return
+
+        with open(media.path, 'rb') as file:
+            if 'http.response.zerocopysend' in extensions:
+                await send({
+                    'type': 'http.response.zerocopysend', 'file': file,
+                    'offset': start, 'count': end - start + 1,
+                })
+                return
+            loop = asyncio.get_running_loop()
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+            if remaining > 0:
+                # the file shrank under us; end the response rather than hang
+                await send({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,160 @@
+# atss_backend/querycount.py
+"""
+Per-request database instrumentation.
+
+QueryRecorder hooks every connection's execute_wrapper and records the
+number of queries, the time spent in the database and how often each SQL
+fingerprint (the statement with parameters and IN-lists collapsed) ran. A
+fingerprint repeating within one request is the signature of an N+1.
+
+QueryCountMiddleware attaches the numbers to every response as a
+Server-Timing header (visible in the browser devtools) and logs one record
+per request on the ``atss.queries`` logger: at WARNING when the request
+crosses QUERY_COUNT_WARN queries or repeats a fingerprint
+QUERY_DUPLICATE_WARN times, at DEBUG otherwise. It wraps sync and async
+views alike, and is only installed when QUERY_INSTRUMENTATION is set (off
+by default: the header tells anyone how much database work a URL costs).
+atss_backend/testing.py uses the same recorder to enforce query budgets in
+tests.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('atss.queries')
+
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise a parameterised statement so repeats compare equal"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """execute_wrapper counting queries, DB time and repeated fingerprints"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+            self.statements.append(sql)
+
+    @contextmanager
+    def record(self):
+        """Record queries on every configured database while the block runs"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def duplicates(self):
+        """{fingerprint: times run} for statements that ran more than once"""
+        return {sql: n for sql, n in self.fingerprints.most_common() if n > 1}
+
+    @property
+    def max_repeats(self):
+        return max(self.fingerprints.values(), default=0)
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.duration * 1000, 2),
+            'duplicate_queries': sum(n - 1 for n in self.duplicates.values()),
+            'top_duplicates': [
+                {'sql': sql[:300], 'count': n} for sql, n in list(self.duplicates.items())[:3]
+            ],
+        }
+
+
+class QueryCountMiddleware:
+    """Server-Timing header and a structured log record for every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.count_warn = getattr(settings, 'QUERY_COUNT_WARN', 50)
+        self.duplicate_warn = getattr(settings, 'QUERY_DUPLICATE_WARN', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        self.report(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        # connections are per thread and async code queries through
+        # sync_to_async, so hook the connections of the thread those calls
+        # run in (one per request under ASGIHandler)
+        recording = recorder.record()
+        await sync_to_async(recording.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.__exit__)(None, None, None)
+        self.report(request, response, recorder, start)
+        return response
+
+    def report(self, request, response, recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        timing = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+            f'app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+        if existing := response.get('Server-Timing'):
+            timing = f'{existing}, {timing}'
+        response['Server-Timing'] = timing
+
+        suspicious = recorder.count > self.count_warn or recorder.max_repeats >= self.duplicate_warn
+        level = logging.WARNING if suspicious else logging.DEBUG
+        if not logger.isEnabledFor(level):
+            return
+        stats = recorder.as_dict()
+        stats.update({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+        })
+        logger.log(
+            level,
+            '%s %s: %d queries (%d duplicate) in %.1f ms',
+            request.method, request.path, recorder.count,
+            stats['duplicate_queries'], db_ms,
+            extra={'query_stats': stats},
+        )
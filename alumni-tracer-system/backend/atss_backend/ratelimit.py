@@ -0,0 +1,178 @@
+# atss_backend/ratelimit.py
+"""
+Token-bucket rate limiting for REST requests and WebSocket frames.
+
+Every (scope, client) pair has a bucket that holds up to N tokens and
+refills at N per period, so a rate of ``'10/min'`` allows a burst of ten
+and then one request every six seconds. Rates live in
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] under their scope name. A client is
+``user:<id>`` when authenticated and ``ip:<address>`` otherwise.
+
+Buckets are kept in the Django cache (RATE_LIMIT_BACKEND='cache', shared
+by every worker when the cache is) or in process memory ('memory', no I/O
+at all). The cache read-modify-write is not atomic, so concurrent requests
+from one client can occasionally get a token or two extra.
+
+DRF views get TokenBucketThrottle subclasses (UserThrottle / AnonThrottle
+by default, ``throttle(scope)`` per endpoint), which answer with DRF's 429
+and Retry-After before the view runs. Async views and consumers call
+``get_limiter().aconsume()`` directly.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill 10/60 tokens per second)"""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / _PERIODS[period[0]]
+
+
+def get_rate(scope):
+    return api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+
+
+def _take(state, now, capacity, refill, cost):
+    """Apply one request to a bucket: (new state, allowed, seconds to wait)"""
+    tokens, last = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - last) * refill)
+    if tokens >= cost:
+        return (tokens - cost, now), True, 0.0
+    return (tokens, now), False, (cost - tokens) / refill
+
+
+# ──────────────────────────────────────────────────────────
+# STORES
+# ──────────────────────────────────────────────────────────
+class MemoryStore:
+    """Per-process buckets, least recently used dropped beyond ``max_keys``"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, key, fn, timeout=None):
+        with self._lock:
+            state, result = fn(self._buckets.pop(key, None))
+            self._buckets[key] = state
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return result
+
+    async def aupdate(self, key, fn, timeout=None):
+        # no I/O, safe to run on the event loop
+        return self.update(key, fn)
+
+
+class CacheStore:
+    """Buckets in a Django cache, shared between workers"""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def _key(self, key):
+        return f'ratelimit:{key}'
+
+    def update(self, key, fn, timeout):
+        cache = caches[self.alias]
+        state, result = fn(cache.get(self._key(key)))
+        cache.set(self._key(key), state, timeout)
+        return result
+
+    async def aupdate(self, key, fn, timeout):
+        cache = caches[self.alias]
+        state, result = fn(await cache.aget(self._key(key)))
+        await cache.aset(self._key(key), state, timeout)
+        return result
+
+
+class TokenBucketLimiter:
+    def __init__(self, store):
+        self.store = store
+
+    def _apply(self, rate, cost):
+        capacity, refill = parse_rate(rate)
+        now = time.time()
+
+        def fn(state):
+            state, allowed, wait = _take(state, now, capacity, refill, cost)
+            return state, (allowed, wait)
+        # a full bucket and a missing one are the same, so expire the key once
+        # it would have refilled
+        return fn, int(capacity / refill) + 1
+
+    def consume(self, key, rate, cost=1):
+        """Take ``cost`` tokens from ``key``'s bucket: (allowed, seconds to wait)"""
+        return self.store.update(key, *self._apply(rate, cost))
+
+    async def aconsume(self, key, rate, cost=1):
+        return await self.store.aupdate(key, *self._apply(rate, cost))
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        if getattr(settings, 'RATE_LIMIT_BACKEND', 'cache') == 'memory':
+            _limiter = TokenBucketLimiter(MemoryStore())
+        else:
+            _limiter = TokenBucketLimiter(CacheStore(getattr(settings, 'RATE_LIMIT_CACHE', 'default')))
+    return _limiter
+
+
+# ──────────────────────────────────────────────────────────
+# DRF
+# ──────────────────────────────────────────────────────────
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket for ``scope``, keyed by user or client IP"""
+    scope = None
+
+    def client_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def applies(self, request):
+        return True
+
+    def allow_request(self, request, view):
+        rate = get_rate(self.scope)
+        if rate is None or not self.applies(request):
+            return True
+        allowed, self._wait = get_limiter().consume(f'{self.scope}:{self.client_key(request)}', rate)
+        return allowed
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class UserThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def applies(self, request):
+        return bool(request.user and request.user.is_authenticated)
+
+
+class AnonThrottle(TokenBucketThrottle):
+    scope = 'anon'
+
+    def applies(self, request):
+        return not (request.user and request.user.is_authenticated)
+
+
+def throttle(scope):
+    """Throttle class for one endpoint class: @throttle_classes([throttle('auth')])"""
+    return type(f'{scope.title()}Throttle', (TokenBucketThrottle,), {'scope': scope})
@@ -3,6 +3,7 @@ from os import getenv,path
 from pathlib import Path
 from django.core.management.utils import get_random_secret_key
 from datetime import timedelta
+from atss_backend.log import parse_levels
 from dotenv import load_dotenv
 import dotenv
 
@@ -31,10 +32,15 @@ ALLOWED_HOSTS =[  'localhost','127.0.0.1', '.acceskenya.org']
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# Processes that hash and verify passwords (accounts/hashing.py), so PBKDF2
+# doesn't hold the GIL of the request worker. 0 hashes inline.
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', '0' if DEBUG else '2'))
+
+# EmailAuthBackend answers every email login itself (see its docstring);
+# ModelBackend serves username logins (admin), allauth its own flows.
 AUTHENTICATION_BACKENDS = [
     'accounts.auth_backends.EmailAuthBackend',
     'django.contrib.auth.backends.ModelBackend',
-    'django.contrib.auth.backends.ModelBackend',
     'allauth.account.auth_backends.AuthenticationBackend',
 ]
 
@@ -66,6 +72,7 @@ INSTALLED_APPS = [
     'crispy_forms',
     'crispy_tailwind',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'django.contrib.sites',
   
 
@@ -82,6 +89,8 @@ CHANNEL_LAYERS = {
 
 
 MIDDLEWARE = [
+    # outermost, so it sees the queries of every other middleware too
+    'atss_backend.querycount.QueryCountMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -92,15 +101,54 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'alumni.middleware.UserActivityMiddleware',
-    
+
 ]
 
+# APP_PROFILE=api trims the process to what the JSON API, chat and the admin
+# use, for production ASGI workers: no django_extensions or crispy forms,
+# no allauth/dj_rest_auth stack (the API registers and logs in through its
+# own JWT views) or DRF's authtoken, and no daphne app, which only provides
+# runserver but imports Twisted. `python manage.py startup_report` shows
+# what each app costs at boot.
+APP_PROFILE = os.getenv('APP_PROFILE', 'full')
+
+if APP_PROFILE == 'api':
+    TRIMMED_APPS = {
+        'daphne',
+        'django_extensions',
+        'crispy_forms',
+        'crispy_tailwind',
+        'allauth',
+        'allauth.account',
+        'allauth.socialaccount',
+        'rest_framework.authtoken',
+        'django.contrib.sites',
+    }
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in TRIMMED_APPS]
+    MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith('allauth.')]
+    AUTHENTICATION_BACKENDS = [name for name in AUTHENTICATION_BACKENDS if not name.startswith('allauth.')]
+
+# Warm-up before the ASGI worker accepts connections (atss_backend/startup.py):
+# URL resolvers, cache tag versions, and a GET of each WARMUP_PATHS as the
+# first active admin (or WARMUP_USER, an email). Cached responses are keyed
+# by host and permission scope, so WARMUP_HOST (the public host name clients
+# use) is required and only that user's scope is warmed; per-user views
+# (the events list) gain nothing and aren't in the default paths.
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'False') == 'True'
+WARMUP_PATHS = [
+    p.strip() for p in
+    os.getenv('WARMUP_PATHS', '/api/dashboard/stats/,/api/notices/').split(',')
+    if p.strip()
+]
+WARMUP_HOST = os.getenv('WARMUP_HOST', '')
+WARMUP_USER = os.getenv('WARMUP_USER', '')
+
 ROOT_URLCONF = 'atss_backend.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -117,12 +165,65 @@ TEMPLATES = [
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default) or postgres. See atss_backend/db.py for the
+# replica router and the /api/health/ check.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'atss'),
+            'USER': os.getenv('DB_USER', 'atss'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # psycopg's pool and persistent connections are mutually exclusive
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            # re-check a persistent connection before reusing it for a new request
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+                **({'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+                    'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+                    'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+                }} if DB_POOL else {}),
+            },
+        }
+    }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # one connection per thread is cheap, keep it for the thread's life
+            'CONN_MAX_AGE': None,
+            'OPTIONS': {
+                # busy_timeout: wait for a competing writer instead of failing
+                # with "database is locked"
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+                # take the write lock when the transaction starts, so two
+                # readers can't both try to upgrade and deadlock
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets readers run alongside the writer; NORMAL is safe with WAL
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                ),
+            },
+        }
     }
-}
+
+DATABASE_ROUTERS = ['atss_backend.db.ReadReplicaRouter']
 
 
 # Password validation
@@ -175,15 +276,38 @@ ACCOUNT_LOGOUT_REDIRECT_URL = '/login'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.tokens.VersionedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+    'PAGE_SIZE': 20,
+    # proxies in front of the app that append to X-Forwarded-For. Anonymous
+    # clients are rate-limited by address; with 0 that's REMOTE_ADDR, since
+    # the client writes the header itself
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'atss_backend.ratelimit.UserThrottle',
+        'atss_backend.ratelimit.AnonThrottle',
+    ],
+    # token buckets (atss_backend/ratelimit.py): N/period is a burst of N
+    # refilled evenly over the period
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.getenv('THROTTLE_USER', '600/min'),
+        'anon': os.getenv('THROTTLE_ANON', '120/min'),
+        'auth': os.getenv('THROTTLE_AUTH', '10/min'),          # login, register
+        'email': os.getenv('THROTTLE_EMAIL', '5/hour'),        # reset / verification mail
+        'invitation': os.getenv('THROTTLE_INVITATION', '30/min'),
+        'chat': os.getenv('THROTTLE_CHAT', '120/min'),         # async chat REST views
+        'ws': os.getenv('THROTTLE_WS', '60/min'),              # WebSocket frames per user
+    },
 }
 
+# Where rate-limit buckets live: cache (CACHES['default'], shared between
+# workers when the cache is) or memory (per process, no cache round trip)
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'cache')
+
 # JWT Settings
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
@@ -191,6 +315,10 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # tokens carry the user's token version (accounts/tokens.py); expired
+    # blacklist rows are removed by `python manage.py purge_tokens` (cron)
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.tokens.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.TokenRefreshSerializer',
 }
 
 # CORS Settings
@@ -201,6 +329,104 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Cache
+# CACHE_BACKEND=locmem (default, per process), file (shared between workers on
+# one host) or redis (shared between hosts, REDIS_URL). The response cache in
+# atss_backend/caching.py relies on tag versions stored here, and chat
+# member lists are only invalidated in the cache they live in (with locmem
+# they are kept for CHAT_LOCAL_MEMBER_CACHE_TIMEOUT seconds, default 5), so
+# multi-worker deployments should use file or redis.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+            'KEY_PREFIX': 'atss',
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+            'KEY_PREFIX': 'atss',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'atss-default',
+            'KEY_PREFIX': 'atss',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Query instrumentation (atss_backend/querycount.py): Server-Timing header and
+# an ``atss.queries`` log record per request (DEBUG, WARNING past the limits).
+# Off unless asked for; loadtest --base-url needs it on the server.
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'False').lower() in ('1', 'true', 'yes')
+QUERY_COUNT_WARN = int(os.getenv('QUERY_COUNT_WARN', '50'))
+QUERY_DUPLICATE_WARN = int(os.getenv('QUERY_DUPLICATE_WARN', '5'))
+
+# Logging (atss_backend/log.py): JSON lines on stderr, written by a listener
+# thread so request handling never waits on the stream.
+# LOG_LEVELS overrides per module, e.g. "chat=DEBUG,django.db.backends=DEBUG".
+# LOG_SAMPLE_RATES keeps that fraction of DEBUG records, e.g. "chat=0.1".
+# LOG_FORMAT=text gives plain lines for local development.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOGGING_CONFIG = 'atss_backend.log.configure_logging'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'atss_backend.log.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'filters': {
+        'sample': {
+            '()': 'atss_backend.log.SamplingFilter',
+            'rates': {
+                name: float(rate)
+                for name, rate in parse_levels(os.getenv('LOG_SAMPLE_RATES', 'chat=0.1')).items()
+            },
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': os.getenv('LOG_FORMAT', 'json'),
+            'filters': ['sample'],
+        },
+    },
+    'root': {'handlers': ['console'], 'level': LOG_LEVEL},
+    'loggers': {
+        name: {'level': level, 'handlers': [], 'propagate': True}
+        for name, level in {
+            'django': LOG_LEVEL,
+            'django.db.backends': 'INFO',
+            'accounts': LOG_LEVEL,
+            'alumni': LOG_LEVEL,
+            'chat': LOG_LEVEL,
+            'atss': LOG_LEVEL,
+            'atss_backend': LOG_LEVEL,
+            **parse_levels(os.getenv('LOG_LEVELS')),
+        }.items()
+    },
+}
+
+# Chat retention (applied by `python manage.py archive_messages`, see chat/retention.py)
+CHAT_RETENTION = {
+    'ARCHIVE_AFTER_DAYS': int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', '180')),
+    'BATCH_SIZE': int(os.getenv('CHAT_ARCHIVE_BATCH_SIZE', '500')),
+    'BACKEND': os.getenv('CHAT_ARCHIVE_BACKEND', 'table'),  # 'table' or 'jsonl'
+    'ARCHIVE_DIR': os.path.join(BASE_DIR, 'chat_archive'),
+    'PURGE_DELETED_CONVERSATIONS': True,
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -224,6 +450,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media serving (atss_backend/media.py): ETag/Last-Modified revalidation and
+# Range, cached by clients and CDNs for MEDIA_MAX_AGE seconds. MEDIA_OFFLOAD=
+# accel (nginx X-Accel-Redirect to MEDIA_ACCEL_PREFIX, an internal location
+# aliased to MEDIA_ROOT) or sendfile (X-Sendfile) leaves the body to the proxy.
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', str(60 * 60 * 24 * 30)))
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Directories only some signed-in users may fetch, each with the function
+# deciding who: (user, name below the directory) -> bool. Their files are
+# sent with Cache-Control: private so shared caches and CDNs don't keep them
+MEDIA_PRIVATE_DIRS = {'chat_files/': 'chat.services.can_read_chat_file'}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,249 @@
+# atss_backend/startup.py
+"""
+Boot-time report and cache warm-up for the server entry points.
+
+``timed_setup`` runs Django's setup (``get_asgi_application`` in asgi.py)
+and times, per installed app, importing the app module, importing its
+models and running ``ready()``. asgi.py logs the result as one
+``atss.startup`` record; ``python manage.py startup_report`` prints it for
+a fresh process, e.g. to compare APP_PROFILE=full and api.
+
+``warm_up`` (STARTUP_WARMUP=True) runs before the worker accepts
+connections: it compiles the URL resolvers, loads the cache tag versions
+and sends a GET of each WARMUP_PATHS through the whole middleware stack as
+the warm-up admin on WARMUP_HOST. That opens the database connection and
+imports everything the request path imports lazily, so the first real
+request doesn't pay for it.
+
+The responses it caches only help requests with the same cache key: the
+same host (hence WARMUP_HOST is required, not guessed) and the warm-up
+user's permission scope. Admins get warm dashboard stats and lists; alumni
+and per-user views still fill their own entries on first use.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger('atss.startup')
+
+# every tag a cached view depends on (atss_backend/caching.py)
+WARMUP_TAGS = ('alumni', 'events', 'notices', 'users', 'user_names')
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+# ──────────────────────────────────────────────────────────
+# IMPORT TIMINGS
+# ──────────────────────────────────────────────────────────
+class StartupReport:
+    PHASES = ('import', 'models', 'ready')
+
+    def __init__(self):
+        self.apps = {}       # app name -> {phase: seconds}
+        self.settings = 0.0  # importing the settings module
+        self.total = 0.0
+
+    def add(self, app, phase, seconds):
+        self.apps.setdefault(app, {})[phase] = seconds
+
+    def app_total(self, app):
+        return sum(self.apps[app].values())
+
+    @property
+    def other(self):
+        """Setup time outside the apps: logging, middleware, handler"""
+        return max(self.total - self.settings - sum(map(self.app_total, self.apps)), 0.0)
+
+    def slowest(self, limit=None):
+        """[(app name, {phase: seconds}, total)], slowest first"""
+        rows = [(app, phases, self.app_total(app)) for app, phases in self.apps.items()]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def as_dict(self):
+        return {
+            'total_ms': _ms(self.total),
+            'settings_ms': _ms(self.settings),
+            'other_ms': _ms(self.other),
+            'apps': {
+                app: {phase: _ms(phases.get(phase, 0.0)) for phase in self.PHASES}
+                for app, phases, _ in self.slowest()
+            },
+        }
+
+    def log(self):
+        data = self.as_dict()
+        logger.info(
+            "Started in %.0f ms (%d apps)", data['total_ms'], len(data['apps']),
+            extra={'startup': data},
+        )
+
+
+def _timed(report, app, phase, method):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            report.add(app, phase, time.perf_counter() - start)
+    return wrapper
+
+
+def timed_setup(setup):
+    """
+    Call ``setup`` (``django.setup`` or ``get_asgi_application``) while
+    timing every app. Returns (its result, StartupReport). If the app
+    registry is already populated the report only has the total.
+    """
+    report = StartupReport()
+    start = time.perf_counter()
+    settings.INSTALLED_APPS  # imports the settings module
+    report.settings = time.perf_counter() - start
+
+    create = AppConfig.__dict__['create']
+
+    def timed_create(cls, entry):
+        app_start = time.perf_counter()
+        app_config = create.__func__(cls, entry)
+        report.add(app_config.name, 'import', time.perf_counter() - app_start)
+        # populate() calls these on the instance, so shadow them there
+        app_config.import_models = _timed(report, app_config.name, 'models', app_config.import_models)
+        app_config.ready = _timed(report, app_config.name, 'ready', app_config.ready)
+        return app_config
+
+    AppConfig.create = classmethod(timed_create)
+    try:
+        result = setup()
+    finally:
+        AppConfig.create = create
+        report.total = time.perf_counter() - start
+    _unshadow()
+    return result, report
+
+
+def _unshadow():
+    from django.apps import apps
+    if not apps.ready:
+        return
+    for app_config in apps.get_app_configs():
+        vars(app_config).pop('import_models', None)
+        vars(app_config).pop('ready', None)
+
+
+def main():
+    """Entry point of the startup_report subprocess: set up, print the report as JSON"""
+    import json
+    import sys
+
+    import django
+
+    _, report = timed_setup(django.setup)
+    data = report.as_dict()
+    if '--warm-up' in sys.argv:
+        data['warm_up'] = {step: _ms(seconds) for step, seconds in warm_up().items()}
+    json.dump(data, sys.stdout)
+
+
+# ──────────────────────────────────────────────────────────
+# WARM-UP
+# ──────────────────────────────────────────────────────────
+def warm_urls(resolver=None):
+    """Build the reverse tables and compile the pattern of every URL"""
+    from django.urls import URLResolver, get_resolver
+
+    resolver = resolver or get_resolver()
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            warm_urls(pattern)
+
+
+def get_warm_up_user():
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.filter(is_active=True)
+    if settings.WARMUP_USER:
+        return users.filter(email__iexact=settings.WARMUP_USER).first()
+    return users.filter(user_type='admin').order_by('date_joined').first()
+
+
+def _warm_paths(paths, host):
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from accounts.tokens import VERSION_CLAIM
+
+    user = get_warm_up_user()
+    if user is None:
+        logger.warning("No warm-up user, skipping %s", ', '.join(paths))
+        return
+    # an access token only: a refresh token would add a blacklist row per boot
+    token = AccessToken.for_user(user)
+    token[VERSION_CLAIM] = user.token_version
+    client = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Bearer {token}', raise_request_exception=False)
+    for path in paths:
+        yield path, lambda path=path: client.get(path).status_code
+
+
+def _warm_up(paths, host):
+    from .caching import get_tag_versions
+
+    steps = [
+        ('urls', warm_urls),
+        ('cache tags', lambda: get_tag_versions(*WARMUP_TAGS)),
+    ]
+    timings = {}
+    for name, step in steps:
+        timings[name] = _run_step(name, step)
+    try:
+        for name, step in _warm_paths(paths, host):
+            timings[name] = _run_step(name, step)
+    except Exception:
+        logger.exception("Warm-up requests failed")
+    return timings
+
+
+def _run_step(name, step):
+    start = time.perf_counter()
+    try:
+        result = step()
+    except Exception:
+        # a cold cache is slower, not broken; never keep the worker from starting
+        logger.exception("Warm-up step %s failed", name)
+        result = None
+    seconds = time.perf_counter() - start
+    if isinstance(result, int) and result != 200:
+        logger.warning("Warm-up GET %s returned %s", name, result)
+    return seconds
+
+
+def warm_up(paths=None, host=None):
+    """Prime the caches before serving. Returns {step: seconds}."""
+    paths = settings.WARMUP_PATHS if paths is None else paths
+    host = host or settings.WARMUP_HOST
+    if paths and not host:
+        # the host is part of every cache key; a guess fills entries nobody reads
+        raise ImproperlyConfigured("Set WARMUP_HOST to the public host name to warm up WARMUP_PATHS")
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        timings = _warm_up(paths, host)
+    else:
+        # servers that import the application inside their event loop
+        # (uvicorn): the ORM has to run off it
+        with ThreadPoolExecutor(1) as pool:
+            timings = pool.submit(_warm_up, paths, host).result()
+    logger.info(
+        "Warmed up in %.0f ms", _ms(sum(timings.values())),
+        extra={'warm_up': {step: _ms(seconds) for step, seconds in timings.items()}},
+    )
+    return timings
@@ -0,0 +1,49 @@
+# atss_backend/testing.py
+"""
+Test helpers for query budgets.
+
+    class EventQueryTests(QueryBudgetMixin, TestCase):
+        def test_list(self):
+            with self.assertQueryBudget(8, max_duplicates=0):
+                self.client.get('/api/events/')
+
+The budget fails the test when the block runs more queries than allowed,
+or (with ``max_duplicates``) repeats the same SQL fingerprint more often
+than that, which is how an N+1 shows up. The failure message lists the
+offending statements.
+"""
+
+from contextlib import contextmanager
+
+from .querycount import QueryRecorder
+
+
+@contextmanager
+def query_budget(max_queries, max_duplicates=None):
+    """Raise AssertionError if the block exceeds the budget"""
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+
+    problems = []
+    if recorder.count > max_queries:
+        problems.append(f"{recorder.count} queries, budget is {max_queries}")
+    duplicates = sum(n - 1 for n in recorder.duplicates.values())
+    if max_duplicates is not None and duplicates > max_duplicates:
+        problems.append(f"{duplicates} repeated queries, budget is {max_duplicates}")
+    if not problems:
+        return
+
+    lines = ['Query budget exceeded: ' + '; '.join(problems)]
+    for sql, n in recorder.duplicates.items():
+        lines.append(f"  x{n} {sql[:200]}")
+    lines.append('Queries:')
+    lines.extend(f"  {i}. {sql[:200]}" for i, sql in enumerate(recorder.statements, 1))
+    raise AssertionError('\n'.join(lines))
+
+
+class QueryBudgetMixin:
+    """TestCase mixin exposing query_budget as an assertion"""
+
+    def assertQueryBudget(self, max_queries, max_duplicates=None):
+        return query_budget(max_queries, max_duplicates=max_duplicates)
@@ -1,14 +1,16 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from .db import health
+from .media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/health/', health, name='health'),
     path('api/auth/', include('accounts.urls')),
     path('api/', include('alumni.urls')),
     path('api/chat/', include('chat.urls')),  # Changed from 'chat/' to 'api/chat/'
+    # under ASGI, MediaASGIApp (asgi.py) answers these before Django
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,5 +1,33 @@
 from django.contrib import admin
-from .models import Conversation,Message
-# Register your models here.
-admin.site.register(Conversation)
-admin.site.register(Message)
\ No newline at end of file
+
+from atss_backend.largetables import LargeTableAdmin
+from .models import Conversation, ConversationMember, Message
+
+
+# Keys are random UUIDs and no single-column date index exists, so these
+# page by number; counts are still estimated and foreign keys autocomplete.
+@admin.register(Conversation)
+class ConversationAdmin(LargeTableAdmin):
+    keyset_fields = None
+    list_display = ('id', 'title', 'is_group', 'modified_at')
+    list_filter = ('is_group',)
+    search_fields = ('=id', '=direct_key')
+
+
+@admin.register(ConversationMember)
+class ConversationMemberAdmin(LargeTableAdmin):
+    keyset_fields = None
+    list_display = ('user', 'conversation', 'role', 'joined_at')
+    list_filter = ('role',)
+    list_select_related = ('user', 'conversation')
+    autocomplete_fields = ('user', 'conversation')
+    search_fields = ('=conversation__id', '^user__username')
+
+
+@admin.register(Message)
+class MessageAdmin(LargeTableAdmin):
+    keyset_fields = None
+    list_display = ('sender', 'conversation', 'created_at')
+    list_select_related = ('sender', 'conversation')
+    autocomplete_fields = ('sender', 'conversation')
+    search_fields = ('=conversation__id', '^sender__username')
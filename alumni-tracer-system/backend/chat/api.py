@@ -1,27 +1,41 @@
-from datetime import timezone
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.http import JsonResponse
+from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from .models import Conversation, DeletedConversation, Message
-from django.db.models import Prefetch
+from .auth import async_api_view, request_data
+from .models import Conversation, ConversationMember, DeletedConversation, Message
+from .retention import load_archived_messages
+from .services import (
+    MembershipError, add_members, aget_direct_conversation, chat_message_payload,
+    create_group, get_membership, is_member, notify_users, publish_message,
+    remove_members, save_message,
+)
+from django.db.models import Prefetch, aprefetch_related_objects
 from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_datetime
+from atss_backend.fieldsets import get_sparse_params, select_fields
 
+logger = logging.getLogger(__name__)
 User = get_user_model()
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_conversations(request):
+# get_conversations, get_messages, send_message and delete_conversation are
+# native async views on the async ORM: under ASGI they run on the event loop
+# instead of a worker thread, and sends go straight to the channel layer.
+
+@async_api_view(['GET'])
+async def get_conversations(request):
     """Get all conversations for the current user (excluding deleted ones)"""
     try:
-        print(f"🔐 User: {request.user.username}")
-        
         # Get deleted conversation IDs for this user
         deleted_conversation_ids = DeletedConversation.objects.filter(
             user=request.user
-        ).values_list('conversation_id', flat=True)
-        
-        print(f"🗑️ Excluding {len(deleted_conversation_ids)} deleted conversations")
+        ).values('conversation_id')
         
         conversations = Conversation.objects.filter(
             participants=request.user
@@ -29,17 +43,23 @@ def get_conversations(request):
             id__in=deleted_conversation_ids
         ).prefetch_related(
             Prefetch('participants'),
-            Prefetch('messages', queryset=Message.objects.select_related('sender').order_by('-created_at'))
+            # newest message only, fetched for all conversations in one query
+            Prefetch(
+                'messages',
+                queryset=Message.objects.select_related('sender').order_by('-created_at')[:1],
+                to_attr='latest_messages',
+            ),
         ).order_by('-modified_at')
         
-        print(f"📞 Found {conversations.count()} active conversations")
-        
-        # ... rest of your existing get_conversations code remains the same
         conversation_list = []
-        for conv in conversations:
+        async for conv in conversations:
+            if conv.is_group:
+                conversation_list.append(_group_conversation_entry(conv))
+                continue
+
             other_user = conv.get_other_participant(request.user)
             if other_user:
-                last_message = conv.messages.last()
+                last_message = _latest_message(conv)
                 
                 other_user_name = other_user.get_full_name()
                 if not other_user_name.strip():
@@ -49,6 +69,7 @@ def get_conversations(request):
                 
                 conversation_list.append({
                     'id': str(conv.id),
+                    'is_group': False,
                     'other_user_id': str(other_user.id),
                     'other_user_name': other_user_name,
                     'other_user': {
@@ -76,34 +97,158 @@ def get_conversations(request):
                     'timestamp': conv.modified_at.isoformat(),
                 })
         
-        return JsonResponse(conversation_list, safe=False)
+        logger.debug("Listed conversations", extra={
+            'user_id': str(request.user.id), 'conversations': len(conversation_list),
+        })
+        return JsonResponse(select_fields(conversation_list, get_sparse_params(request)[0]), safe=False)
         
     except Exception as e:
-        print(f"❌ Error in get_conversations: {str(e)}")
+        logger.exception("Error in get_conversations")
         return JsonResponse(
             {'error': f'Failed to fetch conversations: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_messages(request, user_id):
-    """Get all messages between current user and specified user"""
+def _latest_message(conv):
+    if hasattr(conv, 'latest_messages'):
+        return conv.latest_messages[0] if conv.latest_messages else None
+    return conv.messages.order_by('-created_at').select_related('sender').first()
+
+
+def _group_conversation_entry(conv):
+    """Inbox entry for a group conversation"""
+    last_message = _latest_message(conv)
+    return {
+        'id': str(conv.id),
+        'is_group': True,
+        'title': conv.title,
+        'member_count': len(conv.participants.all()),
+        'other_user_id': None,
+        'other_user': None,
+        'last_message': {
+            'id': str(last_message.id),
+            'sender': str(last_message.sender.id),
+            'receiver': None,
+            'message': last_message.body,
+            'message_type': 'text',
+            'timestamp': last_message.created_at.isoformat(),
+            'is_read': False,
+            'sender_name': last_message.sender.get_full_name() or last_message.sender.username,
+            'receiver_name': conv.title,
+        } if last_message else None,
+        'unread_count': 0,
+        'timestamp': conv.modified_at.isoformat(),
+    }
+
+
+def _user_ids(value):
+    """``value`` as a list of user id strings, or None unless it is a list of UUIDs"""
+    if not isinstance(value, list):
+        return None
     try:
-        print(f"📨 Fetching messages between {request.user.id} and {user_id}")
-        
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(
-            participants__id=user_id
-        ).prefetch_related('messages__sender').first()
+        return [str(uuid.UUID(str(v))) for v in value]
+    except ValueError:
+        return None
+
+
+def _history_params(request):
+    """
+    Optional ?before=<iso datetime>&limit=<n> paging for message history.
+    Raises ValueError for a ``before`` that isn't a valid datetime.
+    """
+    before = request.GET.get('before')
+    limit = request.GET.get('limit')
+    if before:
+        try:
+            # None when malformed, ValueError when well formed but impossible
+            before = parse_datetime(before)
+        except ValueError:
+            before = None
+        if before is None:
+            raise ValueError('before must be an ISO 8601 datetime')
+    else:
+        before = None
+    limit = max(int(limit), 0) if limit and limit.isdigit() else None
+    return before, limit
+
+
+def _history_messages(conversation, before):
+    # only what the history payloads render, not the sender's whole user row
+    messages = conversation.messages.select_related('sender').only(
+        'id', 'body', 'created_at', 'conversation_id', 'sender__id',
+        'sender__username', 'sender__first_name', 'sender__last_name',
+    )
+    if before is not None:
+        messages = messages.filter(created_at__lt=before)
+    return messages
+
+
+def _history_page(conversation, before, limit):
+    """
+    Hot messages for a history page, oldest first, plus how many more
+    should be read from the archive to fill the page (None means all).
+    """
+    messages = _history_messages(conversation, before)
+    if limit is None:
+        return list(messages.order_by('created_at')), None
+
+    page = list(messages.order_by('-created_at')[:limit])
+    page.reverse()
+    return page, limit - len(page)
+
+
+async def _ahistory_page(conversation, before, limit):
+    """Async _history_page"""
+    messages = _history_messages(conversation, before)
+    if limit is None:
+        return [msg async for msg in messages.order_by('created_at')], None
+
+    page = [msg async for msg in messages.order_by('-created_at')[:limit]]
+    page.reverse()
+    return page, limit - len(page)
+
+
+@async_api_view(['GET'])
+async def get_messages(request, user_id):
+    """
+    Get messages between current user and specified user.
+    Pages past the oldest message in the hot table read through to the archive.
+    """
+    try:
+        before, limit = _history_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        conversation = await aget_direct_conversation(request.user.id, user_id)
 
         if not conversation:
-            print("📨 No conversation found, returning empty list")
             return JsonResponse([], safe=False)
+        # get_other_participant runs per message below
+        await aprefetch_related_objects([conversation], 'participants')
 
-        messages = conversation.messages.select_related('sender').order_by('created_at')
+        messages, remaining = await _ahistory_page(conversation, before, limit)
         
         message_list = []
+        if remaining is None or remaining > 0:
+            other_user = conversation.get_other_participant(request.user)
+            archived = await sync_to_async(load_archived_messages)(
+                conversation.id, before=before, limit=remaining
+            )
+            for record in archived:
+                sent_by_me = record['sender_id'] == str(request.user.id)
+                receiver = other_user if sent_by_me else request.user
+                message_list.append({
+                    'id': record['id'],
+                    'sender': record['sender_id'],
+                    'receiver': str(receiver.id) if receiver else None,
+                    'message': record['body'],
+                    'message_type': 'text',
+                    'timestamp': record['created_at'],
+                    'is_read': False,
+                    'sender_name': record['sender_name'],
+                    'receiver_name': receiver.get_full_name() or receiver.username if receiver else None,
+                    'archived': True,
+                })
+
         for msg in messages:
             # FIX: Pass the sender as argument to get_other_participant
             other_user = conversation.get_other_participant(msg.sender)
@@ -119,27 +264,127 @@ def get_messages(request, user_id):
                 'receiver_name': other_user.get_full_name() or other_user.username if other_user else request.user.get_full_name() or request.user.username,
             })
             
-        print(f"📨 Returning {len(message_list)} messages")
-        return JsonResponse(message_list, safe=False)
+        logger.debug("Fetched messages", extra={
+            'user_id': str(request.user.id), 'conversation_id': str(conversation.id),
+            'messages': len(message_list),
+        })
+        return JsonResponse(select_fields(message_list, get_sparse_params(request)[0]), safe=False)
 
     except Exception as e:
-        print(f"❌ Error in get_messages: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_messages")
         return JsonResponse(
             {'error': f'Failed to fetch messages: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(['POST'])
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def send_message(request):
-    """Send a message to another user"""
-    receiver_id = request.data.get('receiver_id')
-    message_text = request.data.get('message')
-    
-    print(f"📤 Sending message from {request.user.id} to {receiver_id}: {message_text}")
+def get_conversation_messages(request, conversation_id):
+    """
+    Get messages in a conversation the current user belongs to (used for groups).
+    Supports the same ?before=&limit= paging as get_messages.
+    """
+    conversation = Conversation.objects.filter(id=conversation_id).first()
+    if not conversation or not is_member(conversation.id, request.user.id):
+        return JsonResponse(
+            {'error': 'Conversation not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        before, limit = _history_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    messages, remaining = _history_page(conversation, before, limit)
+
+    message_list = []
+    if remaining is None or remaining > 0:
+        message_list = [
+            {
+                'id': record['id'],
+                'sender': record['sender_id'],
+                'receiver': None,
+                'conversation_id': str(conversation.id),
+                'message': record['body'],
+                'message_type': 'text',
+                'timestamp': record['created_at'],
+                'is_read': False,
+                'sender_name': record['sender_name'],
+                'receiver_name': conversation.title,
+                'archived': True,
+            }
+            for record in load_archived_messages(conversation.id, before=before, limit=remaining)
+        ]
+
+    message_list += [
+        {
+            'id': str(msg.id),
+            'sender': str(msg.sender.id),
+            'receiver': None,
+            'conversation_id': str(conversation.id),
+            'message': msg.body,
+            'message_type': 'text',
+            'timestamp': msg.created_at.isoformat(),
+            'is_read': False,
+            'sender_name': msg.sender.get_full_name() or msg.sender.username,
+            'receiver_name': conversation.title,
+        }
+        for msg in messages
+    ]
+    return JsonResponse(select_fields(message_list, get_sparse_params(request)[0]), safe=False)
+
+
+async def _send_group_message(request, conversation_id, message_text):
+    conversation = await Conversation.objects.filter(id=conversation_id, is_group=True).afirst()
+    if conversation is not None:
+        try:
+            message, _, member_ids, _ = await save_message(
+                request.user, message_text, conversation=conversation
+            )
+        except MembershipError:
+            conversation = None
+    if conversation is None:
+        return JsonResponse(
+            {'error': 'Conversation not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    await publish_message(chat_message_payload(message, conversation, member_ids))
+    logger.debug("Message sent", extra={
+        'user_id': str(request.user.id), 'conversation_id': str(conversation.id),
+        'message_id': str(message.id),
+    })
+
+    return JsonResponse({
+        'id': str(message.id),
+        'sender': str(request.user.id),
+        'receiver': None,
+        'conversation_id': str(conversation.id),
+        'message': message_text,
+        'message_type': 'text',
+        'timestamp': message.created_at.isoformat(),
+        'is_read': False,
+        'sender_name': request.user.get_full_name() or request.user.username,
+        'receiver_name': conversation.title,
+    }, status=status.HTTP_201_CREATED)
+
+
+@async_api_view(['POST'])
+async def send_message(request):
+    """
+    Send a message to another user, or to a group when conversation_id is given.
+    The message is pushed to the members' sockets like one sent over the websocket.
+    """
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+    receiver_id = data.get('receiver_id')
+    conversation_id = data.get('conversation_id')
+    message_text = data.get('message')
     
+    if conversation_id and message_text and not receiver_id:
+        return await _send_group_message(request, conversation_id, message_text)
+
     if not receiver_id or not message_text:
         return JsonResponse(
             {'error': 'receiver_id and message are required'}, 
@@ -147,105 +392,188 @@ def send_message(request):
         )
     
     try:
-        receiver = User.objects.get(id=receiver_id)
+        receiver = await User.objects.aget(id=receiver_id)
         
-        # Find or create conversation
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(
-            participants=receiver
-        ).first()
-        
-        if not conversation:
-            print("📤 Creating new conversation")
-            conversation = Conversation.objects.create()
-            conversation.participants.add(request.user, receiver)
-        
-        # Create message
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=request.user,
-            body=message_text
+        # Find or create conversation and store the message
+        message, conversation, member_ids, created = await save_message(
+            request.user, message_text, receiver=receiver
+        )
+
+        # deliver to both users' sockets (and SSE streams) without polling
+        await publish_message(
+            chat_message_payload(message, conversation, member_ids, is_new_conversation=created),
+            member_ids if created else None,
         )
-        
-        # Update conversation modified time
-        conversation.save()
-        
-        # Get the other participant for the response
-        other_user = conversation.get_other_participant(request.user)
         
         # Return formatted response
         response_data = {
             'id': str(message.id),
             'sender': str(request.user.id),
             'receiver': str(receiver.id),
+            'conversation_id': str(conversation.id),
             'message': message_text,
             'message_type': 'text',
             'timestamp': message.created_at.isoformat(),
             'is_read': False,
             'sender_name': request.user.get_full_name() or request.user.username,
-            'receiver_name': other_user.get_full_name() or other_user.username if other_user else receiver.get_full_name() or receiver.username,
+            'receiver_name': receiver.get_full_name() or receiver.username,
         }
         
-        print(f"✅ Message sent successfully: {response_data}")
+        logger.debug("Message sent", extra={
+            'user_id': str(request.user.id), 'conversation_id': str(conversation.id),
+            'message_id': str(message.id), 'new_conversation': created,
+        })
         return JsonResponse(response_data, status=status.HTTP_201_CREATED)
         
-    except User.DoesNotExist:
-        print(f"❌ Receiver not found: {receiver_id}")
+    except (User.DoesNotExist, ValidationError):
         return JsonResponse(
             {'error': 'Receiver not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
     except Exception as e:
-        print(f"❌ Error in send_message: {str(e)}")
+        logger.exception("Error in send_message")
         return JsonResponse(
             {'error': f'Failed to send message: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-        
-# chat/api.py - ADD THIS FUNCTION
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def delete_conversation(request, conversation_id):
+
+
+@async_api_view(['POST'])
+async def delete_conversation(request, conversation_id):
     """Delete a conversation for the current user (soft delete)"""
     try:
-        print(f"🗑️ User {request.user.username} deleting conversation {conversation_id}")
-        
         # Get the conversation
-        conversation = Conversation.objects.filter(
+        conversation = await Conversation.objects.filter(
             id=conversation_id,
             participants=request.user
-        ).first()
+        ).afirst()
         
         if not conversation:
-            print(f"❌ Conversation {conversation_id} not found or user not a participant")
             return JsonResponse(
                 {'error': 'Conversation not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Create deleted conversation record
-        deleted_conv, created = DeletedConversation.objects.get_or_create(
+        # Create or refresh the deleted conversation record
+        await DeletedConversation.objects.aupdate_or_create(
             user=request.user,
             conversation=conversation,
             defaults={'deleted_at': timezone.now()}
         )
         
-        if not created:
-            deleted_conv.deleted_at = timezone.now()
-            deleted_conv.save()
-        
-        print(f"✅ Conversation {conversation_id} deleted for user {request.user.username}")
+        logger.info("Conversation deleted", extra={
+            'user_id': str(request.user.id), 'conversation_id': str(conversation.id),
+        })
         return JsonResponse({
             'success': True,
             'message': 'Conversation deleted successfully'
         })
         
     except Exception as e:
-        print(f"❌ Error deleting conversation: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting conversation")
         return JsonResponse(
             {'error': f'Failed to delete conversation: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_group_conversation(request):
+    """Create a group conversation. The creator becomes its owner."""
+    title = (request.data.get('title') or '').strip()
+    member_ids = _user_ids(request.data.get('member_ids') or [])
+
+    if not title or member_ids is None:
+        return JsonResponse(
+            {'error': 'title and a list of member user ids are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    existing_ids = User.objects.filter(id__in=member_ids).values_list('id', flat=True)
+
+    try:
+        conversation = create_group(request.user, title, existing_ids)
+    except MembershipError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    notify_users(existing_ids, {
+        'type': 'conversation_joined',
+        'conversation_id': str(conversation.id),
+        'title': conversation.title,
+        'is_group': True,
+    })
+
+    return JsonResponse({
+        'id': str(conversation.id),
+        'is_group': True,
+        'title': conversation.title,
+        'member_count': len(set(map(str, existing_ids)) | {str(request.user.id)}),
+        'timestamp': conversation.modified_at.isoformat(),
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def group_members(request, conversation_id):
+    """
+    GET lists members, POST adds member_ids, DELETE removes member_ids.
+    Only owners/admins may add others, or remove members below their role;
+    anyone may remove themselves (an owner who leaves hands the group over).
+    """
+    conversation = Conversation.objects.filter(id=conversation_id, is_group=True).first()
+    membership = get_membership(conversation, request.user) if conversation else None
+    if not membership:
+        return JsonResponse(
+            {'error': 'Conversation not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if request.method == 'GET':
+        members = ConversationMember.objects.filter(
+            conversation=conversation
+        ).select_related('user').order_by('joined_at')
+        return JsonResponse([
+            {
+                'id': str(m.user.id),
+                'username': m.user.username,
+                'name': m.user.get_full_name() or m.user.username,
+                'role': m.role,
+                'joined_at': m.joined_at.isoformat(),
+            }
+            for m in members
+        ], safe=False)
+
+    member_ids = _user_ids(request.data.get('member_ids'))
+    if not member_ids:
+        return JsonResponse(
+            {'error': 'member_ids must be a non-empty list of user ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    leaving_only = request.method == 'DELETE' and set(member_ids) == {str(request.user.id)}
+    if not membership.can_manage and not leaving_only:
+        return JsonResponse(
+            {'error': 'Only group admins can manage members'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    event = {
+        'conversation_id': str(conversation.id),
+        'title': conversation.title,
+        'is_group': True,
+    }
+    try:
+        if request.method == 'POST':
+            existing_ids = User.objects.filter(id__in=member_ids).values_list('id', flat=True)
+            changed = add_members(conversation, existing_ids)
+            notify_users(changed, {'type': 'conversation_joined', **event})
+        else:
+            changed = remove_members(conversation, member_ids, by=membership)
+            notify_users(changed, {'type': 'conversation_left', **event})
+    except MembershipError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except PermissionDenied as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    return JsonResponse({'success': True, 'member_ids': changed})
@@ -0,0 +1,112 @@
+# chat/auth.py
+"""
+JWT authentication shared by the websocket consumer, the SSE stream and the
+async REST views.
+"""
+
+import json
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.throttling import BaseThrottle
+
+from accounts.tokens import VersionedJWTAuthentication
+from atss_backend.ratelimit import get_limiter, get_rate
+
+User = get_user_model()
+
+_jwt_authentication = VersionedJWTAuthentication()
+
+
+def get_user_from_jwt(token):
+    """
+    Return the user for a simplejwt access token, or AnonymousUser. The
+    same checks as the REST API: token type and expiry (AccessToken), then
+    an active user and a current token version.
+    """
+    if not token:
+        return AnonymousUser()
+    try:
+        validated = _jwt_authentication.get_validated_token(token)
+        return _jwt_authentication.get_user(validated)
+    except AuthenticationFailed:
+        return AnonymousUser()
+
+
+def _unauthorized(detail):
+    response = JsonResponse(detail if isinstance(detail, dict) else {"detail": detail}, status=401)
+    response["WWW-Authenticate"] = _jwt_authentication.authenticate_header(None)
+    return response
+
+
+def _throttled(wait):
+    response = JsonResponse(
+        {"detail": f"Request was throttled. Expected available in {math.ceil(wait)} seconds."},
+        status=429,
+    )
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+async def athrottle(scope, client):
+    """Take a token from ``client``'s ``scope`` bucket; the 429 response if it is empty"""
+    rate = get_rate(scope)
+    if rate:
+        allowed, wait = await get_limiter().aconsume(f"{scope}:{client}", rate)
+        if not allowed:
+            return _throttled(wait)
+    return None
+
+
+def async_api_view(methods, scope="chat", authenticated=True):
+    """
+    Native async counterpart of DRF's ``@api_view(methods)`` with
+    ``IsAuthenticated``: checks the method, authenticates the
+    ``Authorization: Bearer`` header with simplejwt and sets request.user /
+    request.auth, then takes a token from the user's ``scope`` bucket
+    (atss_backend/ratelimit.py). With ``authenticated=False`` (AllowAny:
+    login, registration) nothing is authenticated and the bucket is the
+    client address's, as AnonThrottle would key it. Error responses have
+    DRF's shape. The view must be an ``async def`` returning a JsonResponse.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'}, status=405
+                )
+            if authenticated:
+                try:
+                    result = await sync_to_async(_jwt_authentication.authenticate)(request)
+                except AuthenticationFailed as exc:
+                    return _unauthorized(exc.detail)
+                if result is None:
+                    return _unauthorized("Authentication credentials were not provided.")
+                request.user, request.auth = result
+                client = f"user:{request.user.pk}"
+            else:
+                client = f"ip:{BaseThrottle().get_ident(request)}"
+            if throttled := await athrottle(scope, client):
+                return throttled
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def request_data(request):
+    """Parsed JSON or form body, like DRF's request.data. None if the JSON is malformed."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
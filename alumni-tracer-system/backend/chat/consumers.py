@@ -1,13 +1,18 @@
 # chat/consumers.py
 
 import json
-import jwt
 import logging
-from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+
+from alumni.signals import BROADCAST_GROUP
+from atss_backend.ratelimit import get_limiter, get_rate
+
+from .auth import get_user_from_jwt
+from .services import MembershipError, chat_message_payload, publish_message, save_message
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -33,6 +38,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.accept()
 
             await self._join_core_groups()
+            await self._join_conversation_groups()
             await self._send_online_notification()
             await self._confirm_connection()
 
@@ -45,12 +51,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         await self._leave_core_groups()
+        await self._leave_conversation_groups()
         await self._send_offline_notification()
 
     # ──────────────────────────────────────────────────────────
     # MESSAGE ROUTER
     # ──────────────────────────────────────────────────────────
     async def receive(self, text_data):
+        # every frame costs a token from the user's ``ws`` bucket; a client
+        # that keeps sending past it is disconnected rather than answered
+        rate = get_rate("ws")
+        if rate:
+            allowed, _ = await get_limiter().aconsume(f"ws:user:{self.user.id}", rate)
+            if not allowed:
+                logger.warning("Closing websocket of user %s: frame rate exceeded", self.user.id)
+                return await self.close(code=4029)
+
         try:
             data = json.loads(text_data)
         except json.JSONDecodeError:
@@ -76,34 +92,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
     # ──────────────────────────────────────────────────────────
     async def handle_join_conversation(self, data):
         cid = data.get("conversation_id")
-        if cid:
-            await self.channel_layer.group_add(f"conversation_{cid}", self.channel_name)
+        if cid and await self.is_conversation_member(cid):
+            await self._join_conversation_group(cid)
 
     async def handle_send_message(self, data):
         conversation_id = data.get("conversation_id")
         message_text = data.get("message")
         receiver_id = data.get("receiver_id")
 
-        if not all([conversation_id, message_text, receiver_id]):
+        if not all([conversation_id, message_text]):
+            return
+        # a receiver is only needed to open a new direct conversation
+        if conversation_id.startswith("temp-") and not receiver_id:
             return
 
-        message_data, final_conversation_id = await self.save_message_to_db(
+        message_data, new_member_ids = await self.save_message(
             conversation_id, message_text, receiver_id
         )
         if not message_data:
             return
 
-        # broadcast to conversation
-        await self.channel_layer.group_send(
-            f"conversation_{final_conversation_id}",
-            {"type": "chat_message", "message": message_data},
-        )
-
-        # notify receiver personally
-        await self.channel_layer.group_send(
-            f"user_{receiver_id}",
-            {"type": "chat_message", "message": message_data},
-        )
+        await self._join_conversation_group(message_data["conversation_id"])
+        await publish_message(message_data, new_member_ids)
 
     async def handle_mark_as_read(self, data):
         message_id = data.get("message_id")
@@ -139,7 +149,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
     # GROUP EVENT HANDLERS (broadcast → client)
     # ──────────────────────────────────────────────────────────
     async def chat_message(self, event):
-        await self._send_json("chat_message", event["message"])
+        message = event["message"]
+        if cid := message.get("conversation_id"):
+            await self._join_conversation_group(cid)
+        await self._send_json("chat_message", message)
+
+    async def conversation_joined(self, event):
+        await self._join_conversation_group(event["conversation_id"])
+        await self._send_json("conversation_joined", event)
+
+    async def conversation_left(self, event):
+        await self._leave_conversation_group(event["conversation_id"])
+        await self._send_json("conversation_left", event)
 
     async def message_read(self, event):
         await self._send_json("message_read", event)
@@ -153,6 +174,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def typing_indicator(self, event):
         await self._send_json("typing_indicator", event)
 
+    async def notice_update(self, event):
+        await self._send_json("notice_update", event)
+
+    async def event_update(self, event):
+        await self._send_json("event_update", event)
+
     # ──────────────────────────────────────────────────────────
     # UTILITIES
     # ──────────────────────────────────────────────────────────
@@ -186,11 +213,37 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.user_room = f"user_{self.user.id}"
         await self.channel_layer.group_add(self.user_room, self.channel_name)
         await self.channel_layer.group_add("online_users", self.channel_name)
+        await self.channel_layer.group_add(BROADCAST_GROUP, self.channel_name)
 
     async def _leave_core_groups(self):
         if hasattr(self, "user_room"):
             await self.channel_layer.group_discard(self.user_room, self.channel_name)
         await self.channel_layer.group_discard("online_users", self.channel_name)
+        await self.channel_layer.group_discard(BROADCAST_GROUP, self.channel_name)
+
+    async def _join_conversation_groups(self):
+        self.conversation_groups = set()
+        for cid in await self.get_conversation_ids():
+            await self._join_conversation_group(cid)
+
+    async def _leave_conversation_groups(self):
+        for group in getattr(self, "conversation_groups", set()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.conversation_groups = set()
+
+    async def _join_conversation_group(self, cid):
+        group = f"conversation_{cid}"
+        if not hasattr(self, "conversation_groups"):
+            self.conversation_groups = set()
+        if group in self.conversation_groups:
+            return
+        await self.channel_layer.group_add(group, self.channel_name)
+        self.conversation_groups.add(group)
+
+    async def _leave_conversation_group(self, cid):
+        group = f"conversation_{cid}"
+        await self.channel_layer.group_discard(group, self.channel_name)
+        getattr(self, "conversation_groups", set()).discard(group)
 
     async def _send_online_notification(self):
         await self.channel_layer.group_send(
@@ -217,63 +270,53 @@ class ChatConsumer(AsyncWebsocketConsumer):
     # ──────────────────────────────────────────────────────────
     @database_sync_to_async
     def get_user_from_jwt(self, token):
-        try:
-            payload = jwt.decode(
-                token,
-                settings.SECRET_KEY,
-                algorithms=["HS256"],
-                options={"verify_exp": True},
-            )
-            uid = payload.get("user_id")
-            return User.objects.get(pk=uid)
-        except Exception:
-            return AnonymousUser()
+        return get_user_from_jwt(token)
 
     @database_sync_to_async
-    def save_message_to_db(self, conversation_id, message_text, receiver_id):
-        from .models import Conversation, Message
+    def get_conversation_ids(self):
+        from .services import get_user_conversation_ids
 
-        try:
-            is_new = conversation_id.startswith("temp-")
+        return get_user_conversation_ids(self.user.id)
 
-            if is_new:
-                conversation = Conversation.objects.filter(
-                    participants=self.user, participants__id=receiver_id
-                ).first()
+    @database_sync_to_async
+    def is_conversation_member(self, conversation_id):
+        from .services import is_member
 
-                if not conversation:
-                    receiver = User.objects.get(id=receiver_id)
-                    conversation = Conversation.objects.create()
-                    conversation.participants.add(self.user, receiver)
+        try:
+            return is_member(conversation_id, self.user.id)
+        except Exception:
+            return False
 
-                conversation_id = str(conversation.id)
-            else:
-                conversation = Conversation.objects.get(id=conversation_id)
+    async def save_message(self, conversation_id, message_text, receiver_id):
+        """
+        Returns (message_data, new_member_ids). new_member_ids is only set
+        when the conversation was created by this message.
+        """
+        from .models import Conversation
 
-            msg = Message.objects.create(
-                conversation=conversation, sender=self.user, body=message_text
+        is_new = conversation_id.startswith("temp-")
+        try:
+            if is_new:
+                conversation, receiver = None, await User.objects.aget(id=receiver_id)
+            else:
+                conversation, receiver = await Conversation.objects.aget(id=conversation_id), None
+            message, conversation, member_ids, created = await save_message(
+                self.user, message_text, conversation=conversation, receiver=receiver
             )
-
-            receiver = User.objects.get(id=receiver_id)
-
-            return (
-                {
-                    "id": str(msg.id),
-                    "sender": str(self.user.id),
-                    "receiver": str(receiver.id),
-                    "message": message_text,
-                    "message_type": "text",
-                    "timestamp": msg.created_at.isoformat(),
-                    "conversation_id": conversation_id,
-                    "is_new_conversation": is_new,
-                },
-                conversation_id,
+        except MembershipError:
+            logger.warning(
+                "User %s is not a member of conversation %s", self.user.id, conversation_id
             )
-
-        except Exception as exc:
+            return None, None
+        except (User.DoesNotExist, Conversation.DoesNotExist, ValidationError, ValueError) as exc:
             logger.error("DB error saving message: %s", exc)
             return None, None
 
+        return (
+            chat_message_payload(message, conversation, member_ids, is_new),
+            member_ids if created else None,
+        )
+
     @database_sync_to_async
     def mark_message_as_read(self, message_id):
         from .models import Message
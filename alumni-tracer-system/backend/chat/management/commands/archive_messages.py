@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.retention import archive_messages, get_policy, purge_deleted_conversations
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the chat retention policy: hard-delete conversations every member "
+        "has deleted and move old messages into compressed archive chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive messages older than this many days')
+        parser.add_argument('--batch-size', type=int, help='Messages per archive chunk/transaction')
+        parser.add_argument('--backend', choices=['table', 'jsonl'], help='Where archived chunks are stored')
+        parser.add_argument('--archive-dir', help='Directory for the jsonl backend')
+        parser.add_argument('--skip-purge', action='store_true', help="Don't delete fully-deleted conversations")
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        try:
+            policy = get_policy(
+                ARCHIVE_AFTER_DAYS=options['days'],
+                BATCH_SIZE=options['batch_size'],
+                BACKEND=options['backend'],
+                ARCHIVE_DIR=options['archive_dir'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        if policy['BATCH_SIZE'] <= 0:
+            raise CommandError('Batch size must be positive')
+
+        dry_run = options['dry_run']
+        prefix = '[dry run] ' if dry_run else ''
+
+        if policy['PURGE_DELETED_CONVERSATIONS'] and not options['skip_purge']:
+            purged = purge_deleted_conversations(dry_run=dry_run)
+            self.stdout.write(f"{prefix}Deleted {purged} conversations removed by all participants")
+
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        archived = archive_messages(policy, dry_run=dry_run, log=log)
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Archived {archived} messages older than {policy['ARCHIVE_AFTER_DAYS']} days "
+            f"({policy['BACKEND']} backend)"
+        ))
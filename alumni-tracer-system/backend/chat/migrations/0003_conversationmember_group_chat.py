@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_deletedconversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='is_group',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='title',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        # Promote the auto-created participants table to an explicit through
+        # model without touching existing rows.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationMember',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                        ('user', models.ForeignKey(db_column='customuser_id', on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='chat.ConversationMember', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='role',
+            field=models.CharField(choices=[('owner', 'Owner'), ('admin', 'Admin'), ('member', 'Member')], default='member', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='joined_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
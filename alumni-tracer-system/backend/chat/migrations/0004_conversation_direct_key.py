@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+def populate_direct_keys(apps, schema_editor):
+    """
+    Give every existing two-person conversation its pair key. If duplicates
+    already exist for a pair, the most recently active one gets the key and
+    the older ones are left as they are (NULL key) so no history is lost.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationMember = apps.get_model('chat', 'ConversationMember')
+
+    members = {}
+    for conversation_id, user_id in ConversationMember.objects.filter(
+        conversation__is_group=False
+    ).values_list('conversation_id', 'user_id'):
+        members.setdefault(conversation_id, []).append(user_id)
+
+    seen = set()
+    for conversation in Conversation.objects.filter(is_group=False).order_by('-modified_at'):
+        user_ids = members.get(conversation.id, [])
+        if len(user_ids) != 2:
+            continue
+        key = ":".join(sorted(uid.hex for uid in user_ids))
+        if key in seen:
+            continue
+        seen.add(key)
+        conversation.direct_key = key
+        conversation.save(update_fields=['direct_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversationmember_group_chat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='direct_key',
+            field=models.CharField(blank=True, editable=False, max_length=65, null=True, unique=True),
+        ),
+        migrations.RunPython(populate_direct_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_conversation_direct_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessageChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('payload', models.BinaryField(blank=True, null=True)),
+                ('file_path', models.CharField(blank=True, max_length=500)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['first_created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at'], name='chat_msg_conv_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessagechunk',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_chunks', to='chat.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessagechunk',
+            index=models.Index(fields=['conversation', 'last_created_at'], name='chat_archive_conv_last_idx'),
+        ),
+    ]
@@ -8,17 +8,85 @@ from django.utils import timezone
 
 class Conversation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='conversations')
+    participants = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        related_name='conversations',
+        through='ConversationMember',
+    )
+    is_group = models.BooleanField(default=False)
+    title = models.CharField(max_length=200, blank=True)
+    # Sorted "<user_a>:<user_b>" ids for direct conversations, NULL for groups.
+    # The unique index makes find-or-create a single lookup and stops
+    # concurrent first messages from creating duplicate conversations.
+    direct_key = models.CharField(max_length=65, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-modified_at']
 
+    @staticmethod
+    def direct_key_for(user_id, other_user_id):
+        """Canonical key for the direct conversation between two users"""
+        ids = sorted(uuid.UUID(str(uid)).hex for uid in (user_id, other_user_id))
+        return ":".join(ids)
+
+    @property
+    def group_name(self):
+        """Channel-layer group every member's socket joins"""
+        return f"conversation_{self.id}"
+
     def get_other_participant(self, user):
-        """Get the other participant in the conversation"""
+        """Get the other participant in the conversation (direct chats only)"""
+        if self.is_group:
+            return None
+        if 'participants' in getattr(self, '_prefetched_objects_cache', {}):
+            # avoid a query per conversation when listing
+            return next((p for p in self.participants.all() if p.id != user.id), None)
         return self.participants.exclude(id=user.id).first()
 
+
+class ConversationMember(models.Model):
+    """Membership row for a conversation.
+
+    Uses the table Django originally auto-created for ``participants`` so
+    existing direct conversations keep their members.
+    """
+    ROLE_OWNER = 'owner'
+    ROLE_ADMIN = 'admin'
+    ROLE_MEMBER = 'member'
+    ROLE_CHOICES = [
+        (ROLE_OWNER, 'Owner'),
+        (ROLE_ADMIN, 'Admin'),
+        (ROLE_MEMBER, 'Member'),
+    ]
+
+    conversation = models.ForeignKey(Conversation, related_name='memberships', on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='conversation_memberships',
+        db_column='customuser_id',
+    )
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=ROLE_MEMBER)
+    joined_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'chat_conversation_participants'
+        unique_together = ['conversation', 'user']
+
+    def __str__(self):
+        return f"{self.user} in {self.conversation_id} ({self.role})"
+
+    ROLE_RANKS = {ROLE_OWNER: 2, ROLE_ADMIN: 1, ROLE_MEMBER: 0}
+
+    @property
+    def can_manage(self):
+        return self.role in (self.ROLE_OWNER, self.ROLE_ADMIN)
+
+    def outranks(self, other):
+        return self.ROLE_RANKS[self.role] > self.ROLE_RANKS[other.role]
+
 class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     conversation = models.ForeignKey(Conversation, related_name='messages', on_delete=models.CASCADE)
@@ -32,10 +100,38 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # history pages and the retention cutoff scan
+            models.Index(fields=['conversation', 'created_at'], name='chat_msg_conv_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender} -> {self.conversation}: {self.body[:50]}"
 
+
+class ArchivedMessageChunk(models.Model):
+    """
+    A batch of old messages moved out of the hot Message table by
+    ``manage.py archive_messages``. The messages live either in ``payload``
+    (zlib-compressed JSON) or in a gzipped JSONL file at ``file_path``.
+    """
+    conversation = models.ForeignKey(Conversation, related_name='archived_chunks', on_delete=models.CASCADE)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    payload = models.BinaryField(blank=True, null=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['first_created_at']
+        indexes = [
+            models.Index(fields=['conversation', 'last_created_at'], name='chat_archive_conv_last_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.conversation_id}: {self.message_count} messages up to {self.last_created_at}"
+
 class DeletedConversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE)
@@ -0,0 +1,211 @@
+# chat/retention.py
+"""
+Message retention for the chat tables.
+
+Old messages are moved out of ``chat_message`` into ArchivedMessageChunk
+rows in batches, so the hot table and its indexes only hold recent history.
+Chunks are stored either compressed in the database ("table" backend) or as
+gzipped JSONL files ("jsonl" backend); the chunk row is kept in both cases
+and acts as the index used for read-through.
+
+Policy comes from settings.CHAT_RETENTION:
+
+    CHAT_RETENTION = {
+        'ARCHIVE_AFTER_DAYS': 180,
+        'BATCH_SIZE': 500,
+        'BACKEND': 'table',            # or 'jsonl'
+        'ARCHIVE_DIR': BASE_DIR / 'chat_archive',
+        'PURGE_DELETED_CONVERSATIONS': True,
+    }
+"""
+
+import gzip
+import json
+import os
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedMessageChunk, Conversation, DeletedConversation, Message
+
+DEFAULT_POLICY = {
+    'ARCHIVE_AFTER_DAYS': 180,
+    'BATCH_SIZE': 500,
+    'BACKEND': 'table',
+    'ARCHIVE_DIR': os.path.join(settings.BASE_DIR, 'chat_archive'),
+    'PURGE_DELETED_CONVERSATIONS': True,
+}
+
+
+def get_policy(**overrides):
+    policy = {**DEFAULT_POLICY, **getattr(settings, 'CHAT_RETENTION', {})}
+    policy.update({k: v for k, v in overrides.items() if v is not None})
+    if policy['BACKEND'] not in ('table', 'jsonl'):
+        raise ValueError(f"Unknown chat archive backend: {policy['BACKEND']}")
+    return policy
+
+
+# ──────────────────────────────────────────────────────────
+# ENCODING
+# ──────────────────────────────────────────────────────────
+def _message_record(msg):
+    return {
+        'id': str(msg.id),
+        'sender_id': str(msg.sender_id),
+        'sender_name': msg.sender.get_full_name() or msg.sender.username,
+        'body': msg.body,
+        'created_at': msg.created_at.isoformat(),
+    }
+
+
+def _write_chunk(conversation_id, records, policy):
+    """Persist records and return the ArchivedMessageChunk (unsaved fields filled in)"""
+    chunk = ArchivedMessageChunk(
+        conversation_id=conversation_id,
+        first_created_at=parse_datetime(records[0]['created_at']),
+        last_created_at=parse_datetime(records[-1]['created_at']),
+        message_count=len(records),
+    )
+
+    if policy['BACKEND'] == 'jsonl':
+        directory = os.path.join(policy['ARCHIVE_DIR'], str(conversation_id))
+        os.makedirs(directory, exist_ok=True)
+        stamp = chunk.first_created_at.strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(directory, f"{stamp}-{records[0]['id']}.jsonl.gz")
+        with gzip.open(path, 'wt', encoding='utf-8') as fh:
+            for record in records:
+                fh.write(json.dumps(record) + '\n')
+        chunk.file_path = path
+    else:
+        chunk.payload = zlib.compress(json.dumps(records).encode('utf-8'))
+
+    return chunk
+
+
+def read_chunk(chunk):
+    """Return the archived message records of a chunk, oldest first"""
+    if chunk.file_path:
+        with gzip.open(chunk.file_path, 'rt', encoding='utf-8') as fh:
+            return [json.loads(line) for line in fh if line.strip()]
+    return json.loads(zlib.decompress(bytes(chunk.payload)).decode('utf-8'))
+
+
+# ──────────────────────────────────────────────────────────
+# ARCHIVAL / COMPACTION
+# ──────────────────────────────────────────────────────────
+def purge_deleted_conversations(dry_run=False):
+    """
+    Hard-delete conversations that every current member has deleted since
+    their last activity. Messages and archive chunks go with them through the FK
+    cascade. A direct conversation is reused when the pair talks again, so
+    a deletion older than the latest message or modification doesn't count.
+    """
+    last_message = (
+        Message.objects.filter(conversation=OuterRef('pk'))
+        .order_by('-created_at').values('created_at')[:1]
+    )
+    # only deletions by current members: someone who deleted and then left
+    # a group doesn't stand in for a member who still has it
+    current_deletions = (
+        DeletedConversation.objects.filter(
+            conversation=OuterRef('pk'), deleted_at__gt=OuterRef('last_activity'),
+            conversation__memberships__user=F('user'),
+        )
+        .values('conversation').annotate(count=Count('pk')).values('count')
+    )
+    conversations = Conversation.objects.annotate(
+        last_activity=Greatest('modified_at', Coalesce(Subquery(last_message), 'modified_at')),
+    ).annotate(
+        member_count=Count('memberships', distinct=True),
+        deleted_count=Coalesce(Subquery(current_deletions), 0),
+    ).filter(member_count__gt=0, deleted_count__gte=F('member_count'))
+
+    ids = list(conversations.values_list('id', flat=True))
+    if ids and not dry_run:
+        for chunk in ArchivedMessageChunk.objects.filter(conversation_id__in=ids).exclude(file_path=''):
+            if os.path.exists(chunk.file_path):
+                os.remove(chunk.file_path)
+        Conversation.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_messages(policy=None, dry_run=False, log=None):
+    """
+    Move messages older than the retention window into archive chunks, one
+    batch per transaction. Returns the number of messages archived.
+    """
+    policy = policy or get_policy()
+    cutoff = timezone.now() - timedelta(days=policy['ARCHIVE_AFTER_DAYS'])
+    batch_size = policy['BATCH_SIZE']
+
+    if dry_run:
+        return Message.objects.filter(created_at__lt=cutoff).count()
+
+    conversation_ids = (
+        Message.objects.filter(created_at__lt=cutoff)
+        .values_list('conversation_id', flat=True)
+        .distinct()
+    )
+
+    total = 0
+    for conversation_id in list(conversation_ids):
+        while True:
+            batch = list(
+                Message.objects.filter(conversation_id=conversation_id, created_at__lt=cutoff)
+                .select_related('sender')
+                .order_by('created_at')[:batch_size]
+            )
+            if not batch:
+                break
+
+            records = [_message_record(msg) for msg in batch]
+            chunk = _write_chunk(conversation_id, records, policy)
+            with transaction.atomic():
+                chunk.save()
+                Message.objects.filter(id__in=[msg.id for msg in batch]).delete()
+
+            total += len(batch)
+            if log:
+                log(f"Archived {len(batch)} messages from conversation {conversation_id}")
+            if len(batch) < batch_size:
+                break
+
+    return total
+
+
+# ──────────────────────────────────────────────────────────
+# READ-THROUGH
+# ──────────────────────────────────────────────────────────
+def load_archived_messages(conversation_id, before=None, limit=None):
+    """
+    Archived message records for a conversation, oldest first.
+
+    ``before`` restricts to messages created before that datetime and
+    ``limit`` keeps only the newest ``limit`` of those, so history pages can
+    continue seamlessly past the oldest message still in the hot table.
+    """
+    chunks = ArchivedMessageChunk.objects.filter(conversation_id=conversation_id)
+    if before is not None:
+        chunks = chunks.filter(first_created_at__lt=before)
+    chunks = chunks.order_by('-last_created_at')
+
+    records = []
+    for chunk in chunks.iterator():
+        chunk_records = read_chunk(chunk)
+        if before is not None:
+            chunk_records = [
+                r for r in chunk_records if parse_datetime(r['created_at']) < before
+            ]
+        records = chunk_records + records
+        if limit is not None and len(records) >= limit:
+            break
+
+    if limit is not None:
+        records = records[-limit:] if limit else []
+    return records
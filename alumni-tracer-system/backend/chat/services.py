@@ -0,0 +1,332 @@
+# chat/services.py
+"""
+Conversation membership and messaging helpers shared by the REST api and
+ChatConsumer.
+
+Member lists are cached so that fan-out and permission checks don't hit the
+participants table on every message. Anything that changes membership must
+go through these helpers (or trigger the signals in chat/signals.py) so the
+cache stays in sync.
+
+That invalidation only reaches other workers through a shared cache
+(CACHE_BACKEND=file or redis). With the per-process locmem cache, another
+worker keeps its copy until it expires, so a removed member could go on
+posting there; the lists are then only kept for
+LOCAL_MEMBER_CACHE_TIMEOUT seconds, which bounds that window.
+"""
+
+import uuid
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+
+from .models import Conversation, ConversationMember, Message
+
+MEMBER_CACHE_TIMEOUT = 60 * 5
+LOCAL_MEMBER_CACHE_TIMEOUT = getattr(settings, "CHAT_LOCAL_MEMBER_CACHE_TIMEOUT", 5)
+GROUP_MAX_MEMBERS = getattr(settings, "CHAT_GROUP_MAX_MEMBERS", 500)
+
+
+class MembershipError(Exception):
+    """Raised when a membership change is not allowed"""
+
+
+# ──────────────────────────────────────────────────────────
+# CACHE
+# ──────────────────────────────────────────────────────────
+def member_cache_key(conversation_id):
+    return f"chat:members:{conversation_id}"
+
+
+def user_conversations_cache_key(user_id):
+    return f"chat:user_conversations:{user_id}"
+
+
+def member_cache_timeout():
+    if isinstance(caches["default"], LocMemCache):
+        return LOCAL_MEMBER_CACHE_TIMEOUT
+    return MEMBER_CACHE_TIMEOUT
+
+
+def get_member_ids(conversation_id):
+    """Return the ids (as strings) of everyone in a conversation"""
+    key = member_cache_key(conversation_id)
+    member_ids = cache.get(key)
+    if member_ids is None:
+        member_ids = [
+            str(uid)
+            for uid in ConversationMember.objects.filter(
+                conversation_id=conversation_id
+            ).values_list("user_id", flat=True)
+        ]
+        cache.set(key, member_ids, member_cache_timeout())
+    return member_ids
+
+
+def get_user_conversation_ids(user_id):
+    """Return the ids (as strings) of every conversation a user belongs to"""
+    key = user_conversations_cache_key(user_id)
+    conversation_ids = cache.get(key)
+    if conversation_ids is None:
+        conversation_ids = [
+            str(cid)
+            for cid in ConversationMember.objects.filter(
+                user_id=user_id
+            ).values_list("conversation_id", flat=True)
+        ]
+        cache.set(key, conversation_ids, member_cache_timeout())
+    return conversation_ids
+
+
+async def aget_member_ids(conversation_id):
+    """Async get_member_ids"""
+    key = member_cache_key(conversation_id)
+    member_ids = await cache.aget(key)
+    if member_ids is None:
+        member_ids = [
+            str(uid)
+            async for uid in ConversationMember.objects.filter(
+                conversation_id=conversation_id
+            ).values_list("user_id", flat=True)
+        ]
+        await cache.aset(key, member_ids, member_cache_timeout())
+    return member_ids
+
+
+def is_member(conversation_id, user_id):
+    return str(user_id) in get_member_ids(conversation_id)
+
+
+def invalidate_membership(conversation_id, user_ids=()):
+    keys = [member_cache_key(conversation_id)]
+    keys += [user_conversations_cache_key(uid) for uid in user_ids]
+    cache.delete_many(keys)
+
+
+# ──────────────────────────────────────────────────────────
+# DIRECT CONVERSATIONS
+# ──────────────────────────────────────────────────────────
+def get_direct_conversation(user_id, other_user_id):
+    """Single indexed lookup on the pair key. Returns None if there is none yet."""
+    try:
+        key = Conversation.direct_key_for(user_id, other_user_id)
+    except ValueError:
+        return None
+    return Conversation.objects.filter(direct_key=key).first()
+
+
+async def aget_direct_conversation(user_id, other_user_id):
+    """Async get_direct_conversation"""
+    try:
+        key = Conversation.direct_key_for(user_id, other_user_id)
+    except ValueError:
+        return None
+    return await Conversation.objects.filter(direct_key=key).afirst()
+
+
+def get_or_create_direct_conversation(user, other_user):
+    """
+    Find or create the direct conversation between two users.
+
+    Returns (conversation, created). The unique pair key makes this safe
+    against concurrent first messages: the losing insert falls back to
+    fetching the winner's row.
+    """
+    key = Conversation.direct_key_for(user.id, other_user.id)
+    with transaction.atomic():
+        conversation, created = Conversation.objects.get_or_create(direct_key=key)
+        if created:
+            conversation.participants.add(user, other_user)
+    return conversation, created
+
+
+# ──────────────────────────────────────────────────────────
+# MESSAGES
+# ──────────────────────────────────────────────────────────
+async def save_message(sender, message_text, conversation=None, receiver=None):
+    """
+    Store a message in ``conversation``, or in the direct conversation with
+    ``receiver`` (created on the first message).
+
+    Returns (message, conversation, member_ids, created). Raises
+    MembershipError when the sender is not a member.
+    """
+    created = False
+    if conversation is None:
+        # the find-or-create needs a transaction, which the async ORM lacks
+        conversation, created = await sync_to_async(get_or_create_direct_conversation)(
+            sender, receiver
+        )
+
+    member_ids = await aget_member_ids(conversation.id)
+    if str(sender.id) not in member_ids:
+        raise MembershipError("Not a member of this conversation")
+
+    message = await Message.objects.acreate(
+        conversation=conversation, sender=sender, body=message_text
+    )
+    # bump modified_at so the conversation sorts to the top of inboxes
+    await conversation.asave(update_fields=["modified_at"])
+    return message, conversation, member_ids, created
+
+
+def chat_message_payload(message, conversation, member_ids, is_new_conversation=False):
+    """The ``chat_message`` body delivered to sockets and SSE streams"""
+    receiver = None
+    if not conversation.is_group:
+        receiver = next((m for m in member_ids if m != str(message.sender_id)), None)
+    return {
+        "id": str(message.id),
+        "sender": str(message.sender_id),
+        "receiver": receiver,
+        "message": message.body,
+        "message_type": "text",
+        "timestamp": message.created_at.isoformat(),
+        "conversation_id": str(conversation.id),
+        "is_group": conversation.is_group,
+        "is_new_conversation": is_new_conversation,
+    }
+
+
+async def publish_message(payload, new_member_ids=None):
+    """
+    Push a chat_message to every member's sockets. ``new_member_ids`` is set
+    when the message created the conversation.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    event = {"type": "chat_message", "message": payload}
+    if new_member_ids:
+        # Nobody is subscribed to a brand new conversation yet, so reach the
+        # members through their personal groups; their sockets join the
+        # conversation group when the message arrives.
+        for member_id in new_member_ids:
+            await channel_layer.group_send(f"user_{member_id}", event)
+    else:
+        # Every member's socket is already in the conversation group, so
+        # one dispatch reaches them all regardless of group size.
+        await channel_layer.group_send(f"conversation_{payload['conversation_id']}", event)
+
+
+# ──────────────────────────────────────────────────────────
+# GROUP MANAGEMENT
+# ──────────────────────────────────────────────────────────
+def get_membership(conversation, user):
+    return ConversationMember.objects.filter(conversation=conversation, user=user).first()
+
+
+def create_group(owner, title, member_ids):
+    """Create a group conversation owned by ``owner``"""
+    member_ids = {str(uid) for uid in member_ids} - {str(owner.id)}
+    if len(member_ids) + 1 > GROUP_MAX_MEMBERS:
+        raise MembershipError(f"Groups are limited to {GROUP_MAX_MEMBERS} members")
+
+    with transaction.atomic():
+        conversation = Conversation.objects.create(is_group=True, title=title)
+        ConversationMember.objects.bulk_create(
+            [ConversationMember(conversation=conversation, user=owner, role=ConversationMember.ROLE_OWNER)]
+            + [ConversationMember(conversation=conversation, user_id=uid) for uid in member_ids]
+        )
+
+    invalidate_membership(conversation.id, [owner.id, *member_ids])
+    return conversation
+
+
+def add_members(conversation, user_ids):
+    """Add users to a group. Returns the ids that were actually added."""
+    if not conversation.is_group:
+        raise MembershipError("Members can only be added to group conversations")
+
+    current = set(get_member_ids(conversation.id))
+    new_ids = {str(uid) for uid in user_ids} - current
+    if len(current) + len(new_ids) > GROUP_MAX_MEMBERS:
+        raise MembershipError(f"Groups are limited to {GROUP_MAX_MEMBERS} members")
+
+    ConversationMember.objects.bulk_create(
+        [ConversationMember(conversation=conversation, user_id=uid) for uid in new_ids],
+        ignore_conflicts=True,
+    )
+    invalidate_membership(conversation.id, new_ids)
+    return sorted(new_ids)
+
+
+def remove_members(conversation, user_ids, by=None):
+    """
+    Remove users from a group. Returns the ids that were actually removed.
+
+    ``by`` is the membership of whoever asked: anyone may remove themselves,
+    others only if ``by`` outranks them (PermissionDenied otherwise), so
+    nobody can remove the owner.
+    When the owner leaves, the longest-standing admin (else member) takes
+    over the group.
+    """
+    if not conversation.is_group:
+        raise MembershipError("Members can only be removed from group conversations")
+
+    user_ids = {str(uid) for uid in user_ids}
+    with transaction.atomic():
+        memberships = list(
+            ConversationMember.objects.select_for_update().filter(
+                conversation=conversation, user_id__in=user_ids
+            )
+        )
+        for membership in memberships:
+            if by is not None and membership.user_id != by.user_id and not by.outranks(membership):
+                raise PermissionDenied(f"A group {by.role} can't remove a group {membership.role}")
+
+        ConversationMember.objects.filter(pk__in=[m.pk for m in memberships]).delete()
+        if any(m.role == ConversationMember.ROLE_OWNER for m in memberships):
+            _hand_over(conversation)
+
+    removed = sorted(str(m.user_id) for m in memberships)
+    invalidate_membership(conversation.id, removed)
+    return removed
+
+
+def _hand_over(conversation):
+    remaining = ConversationMember.objects.filter(conversation=conversation).order_by('joined_at', 'pk')
+    successor = (
+        remaining.filter(role=ConversationMember.ROLE_ADMIN).first()
+        or remaining.first()
+    )
+    if successor is not None:
+        successor.role = ConversationMember.ROLE_OWNER
+        successor.save(update_fields=['role'])
+
+
+# ──────────────────────────────────────────────────────────
+# ATTACHMENTS
+# ──────────────────────────────────────────────────────────
+def can_read_chat_file(user, name):
+    """
+    MEDIA_PRIVATE_DIRS check for chat_files/. Attachments live under
+    chat_files/<conversation id>/ and only that conversation's members may
+    fetch them; files outside a conversation directory only staff.
+    """
+    conversation_id, sep, _ = name.partition('/')
+    if not sep:
+        return user.is_staff
+    try:
+        conversation_id = uuid.UUID(conversation_id)
+    except ValueError:
+        return False
+    return is_member(conversation_id, user.id)
+
+
+# ──────────────────────────────────────────────────────────
+# CHANNEL LAYER
+# ──────────────────────────────────────────────────────────
+def notify_users(user_ids, event):
+    """Send an event to each user's personal group (used for membership changes)"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    send = async_to_sync(channel_layer.group_send)
+    for uid in user_ids:
+        send(f"user_{uid}", event)
@@ -0,0 +1,27 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Conversation, ConversationMember
+from .services import invalidate_membership
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def participants_changed(sender, instance, action, pk_set, **kwargs):
+    """Keep the member cache in sync when participants.add()/remove() is used"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # post_clear has no pk_set; clear() deletes the ConversationMember rows,
+    # so membership_changed below invalidates each member
+    if isinstance(instance, Conversation):
+        invalidate_membership(instance.id, pk_set or ())
+    else:
+        # Reverse side: user.conversations.add(...)
+        for conversation_id in pk_set or ():
+            invalidate_membership(conversation_id, [instance.id])
+
+
+@receiver(post_save, sender=ConversationMember)
+@receiver(post_delete, sender=ConversationMember)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.conversation_id, [instance.user_id])
@@ -0,0 +1,254 @@
+# chat/sse.py
+"""
+Server-sent events fallback for clients whose networks block WebSockets.
+
+    POST /api/chat/events/token/   (Authorization: Bearer <access token>)
+    GET  /api/chat/events/?ticket=<stream token>
+
+Streams the same events ChatConsumer delivers (the user's ``user_{id}``
+group, every conversation group they belong to and the notice/event
+broadcast group) over one long-lived HTTP response, so those clients no
+longer need to poll get_conversations / get_messages.
+
+EventSource can't send an Authorization header, and a URL ends up in access
+and error logs, so the stream takes a stream token instead of the access
+token: it only opens the stream, expires after STREAM_TOKEN_MAX_AGE seconds
+and is revoked with the user's other tokens. Clients fetch a new one
+whenever they (re)open the stream. Clients that can set headers may send
+the access token as ``Authorization: Bearer`` instead. Opening a stream
+takes a token from the user's "chat" rate limit bucket.
+
+Chat messages carry their timestamp (epoch microseconds, the precision
+created_at is stored with) as the event id; other events carry none, so
+Last-Event-ID always names a message. When the browser reconnects with it,
+chat messages created after that point are replayed from the database
+before live streaming resumes.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+
+from alumni.signals import BROADCAST_GROUP
+
+from .auth import async_api_view, athrottle, get_user_from_jwt
+from .models import Message
+from .services import get_member_ids, get_user_conversation_ids
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+HEARTBEAT_SECONDS = getattr(settings, "CHAT_SSE_HEARTBEAT_SECONDS", 15)
+# Responses are closed after this long so proxies and workers recycle them;
+# the client reopens with a fresh stream token and resumes from Last-Event-ID.
+MAX_STREAM_SECONDS = getattr(settings, "CHAT_SSE_MAX_STREAM_SECONDS", 30 * 60)
+RETRY_MS = 3000
+REPLAY_LIMIT = 500
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+STREAM_TOKEN_SALT = "chat.sse.stream"
+STREAM_TOKEN_MAX_AGE = getattr(settings, "CHAT_SSE_TOKEN_MAX_AGE", 60)
+
+
+def stream_token(user):
+    """Signed token that opens ``user``'s event stream for STREAM_TOKEN_MAX_AGE seconds"""
+    return signing.dumps({"user": str(user.pk), "ver": user.token_version}, salt=STREAM_TOKEN_SALT)
+
+
+def get_user_from_stream_token(token):
+    """The user a current stream token was issued to, or AnonymousUser"""
+    try:
+        payload = signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=STREAM_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return AnonymousUser()
+    user = User.objects.filter(pk=payload.get("user"), is_active=True).first()
+    if user is None or user.token_version != payload.get("ver"):
+        return AnonymousUser()
+    return user
+
+
+def _authenticate(request):
+    if ticket := request.GET.get("ticket"):
+        return get_user_from_stream_token(ticket)
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return get_user_from_jwt(header[len("Bearer "):].strip())
+    return AnonymousUser()
+
+
+def _event_id(when=None):
+    when = when or timezone.now()
+    # exact integer arithmetic: a float timestamp can be off by a microsecond
+    return str((when - EPOCH) // timedelta(microseconds=1))
+
+
+def _parse_event_id(value):
+    """
+    Last-Event-ID is epoch microseconds; ids from before that change are
+    milliseconds (13 digits), and an ISO timestamp is accepted too.
+    """
+    if not value:
+        return None
+    if value.isdigit():
+        unit = timedelta(microseconds=1) if len(value) > 13 else timedelta(milliseconds=1)
+        return EPOCH + int(value) * unit
+    return parse_datetime(value)
+
+
+def _format(event_type, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _format_channel_event(event):
+    """Render a channel-layer event the way ChatConsumer._send_json would"""
+    event_type = event.get("type")
+    if event_type == "chat_message":
+        message = event["message"]
+        when = parse_datetime(message.get("timestamp", "")) if isinstance(message, dict) else None
+        return _format(event_type, {"type": event_type, **message}, _event_id(when) if when else None)
+    # no id: replay resumes from messages only, and the time this event was
+    # sent could be later than a message still on its way
+    return _format(event_type, event)
+
+
+def _replay_messages(user, since):
+    """Chat messages the user missed since ``since``, oldest first"""
+    conversation_ids = get_user_conversation_ids(user.id)
+    messages = (
+        Message.objects.filter(conversation_id__in=conversation_ids, created_at__gt=since)
+        .select_related("conversation")
+        .order_by("created_at")[:REPLAY_LIMIT]
+    )
+
+    events = []
+    for msg in messages:
+        conversation = msg.conversation
+        receiver = None
+        if not conversation.is_group:
+            receiver = next(
+                (m for m in get_member_ids(conversation.id) if m != str(msg.sender_id)), None
+            )
+        events.append({
+            "type": "chat_message",
+            "message": {
+                "id": str(msg.id),
+                "sender": str(msg.sender_id),
+                "receiver": receiver,
+                "message": msg.body,
+                "message_type": "text",
+                "timestamp": msg.created_at.isoformat(),
+                "conversation_id": str(conversation.id),
+                "is_group": conversation.is_group,
+                "is_new_conversation": False,
+            },
+        })
+    return events
+
+
+async def _stream(user, last_event_id):
+    channel_layer = get_channel_layer()
+    channel_name = await channel_layer.new_channel()
+    groups = {f"user_{user.id}", BROADCAST_GROUP}
+    groups.update(
+        f"conversation_{cid}"
+        for cid in await sync_to_async(get_user_conversation_ids)(user.id)
+    )
+    for group in groups:
+        await channel_layer.group_add(group, channel_name)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        yield _format("connection_established", {
+            "type": "connection_established",
+            "message": "Event stream established successfully",
+            "user_id": str(user.id),
+        })
+
+        if since := _parse_event_id(last_event_id):
+            for event in await sync_to_async(_replay_messages)(user, since):
+                yield _format_channel_event(event)
+
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(
+                    channel_layer.receive(channel_name), timeout=HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+
+            event_type = event.get("type")
+            # keep group membership in step with the conversation list,
+            # like ChatConsumer does
+            if event_type == "chat_message" and isinstance(event.get("message"), dict):
+                if cid := event["message"].get("conversation_id"):
+                    group = f"conversation_{cid}"
+                    if group not in groups:
+                        await channel_layer.group_add(group, channel_name)
+                        groups.add(group)
+            elif event_type == "conversation_joined":
+                group = f"conversation_{event['conversation_id']}"
+                await channel_layer.group_add(group, channel_name)
+                groups.add(group)
+            elif event_type == "conversation_left":
+                group = f"conversation_{event['conversation_id']}"
+                await channel_layer.group_discard(group, channel_name)
+                groups.discard(group)
+
+            yield _format_channel_event(event)
+    finally:
+        for group in groups:
+            await channel_layer.group_discard(group, channel_name)
+
+
+@async_api_view(["POST"])
+async def event_stream_token(request):
+    """A stream token for the current user, and the stream URL that uses it"""
+    token = stream_token(request.user)
+    return JsonResponse({
+        "token": token,
+        "url": f"{reverse('chat_event_stream')}?{urlencode({'ticket': token})}",
+        "expires_in": STREAM_TOKEN_MAX_AGE,
+    })
+
+
+async def event_stream(request):
+    """Async SSE endpoint, authenticated with a stream token or the access token"""
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    user = await sync_to_async(_authenticate)(request)
+    if user.is_anonymous:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    if throttled := await athrottle("chat", f"user:{user.pk}"):
+        return throttled
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+
+    response = StreamingHttpResponse(
+        _stream(user, last_event_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -1,3 +1,661 @@
-from django.test import TestCase
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from accounts.models import CustomUser
+from alumni.models import UserProfile
+from atss_backend.testing import QueryBudgetMixin
+
+from .models import ArchivedMessageChunk, Conversation, ConversationMember, DeletedConversation, Message
+from .retention import archive_messages, get_policy, load_archived_messages, purge_deleted_conversations
+from .routing import websocket_urlpatterns
+from .sse import _event_id, event_stream, stream_token
+from .services import (
+    LOCAL_MEMBER_CACHE_TIMEOUT,
+    MEMBER_CACHE_TIMEOUT,
+    MembershipError,
+    add_members,
+    create_group,
+    get_member_ids,
+    get_or_create_direct_conversation,
+    get_user_conversation_ids,
+    member_cache_timeout,
+    remove_members,
+)
+
+
+class ChatQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Inbox and history must not issue a query per conversation or message"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='me', email='me@example.com', password='pw'
+        )
+        # as registration would; the first request would otherwise create it
+        UserProfile.objects.provision(cls.user)
+        cls.others = [
+            CustomUser.objects.create_user(
+                username=f'friend{i}', email=f'friend{i}@example.com', password='pw'
+            )
+            for i in range(4)
+        ]
+        for other in cls.others:
+            conversation, _ = get_or_create_direct_conversation(cls.user, other)
+            for i in range(3):
+                Message.objects.create(conversation=conversation, sender=other, body=f'hi {i}')
+        group = create_group(cls.user, 'Class of 2020', [u.id for u in cls.others])
+        Message.objects.create(conversation=group, sender=cls.user, body='welcome')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        # the chat endpoints are async views that authenticate the header
+        # themselves; the user lookup counts towards each budget
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_conversation_list(self):
+        with self.assertQueryBudget(6, max_duplicates=0):
+            response = self.client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(self.others) + 1)
+
+    def test_direct_history(self):
+        with self.assertQueryBudget(6, max_duplicates=0):
+            response = self.client.get(f'/api/chat/messages/{self.others[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 401)
+
+
+class ChatSparseFieldsTests(TestCase):
+    """?fields= narrows the chat payloads; chat has nothing to ?expand="""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='me', email='me@example.com', password='pw')
+        cls.other = CustomUser.objects.create_user(
+            username='friend', email='friend@example.com', password='pw', first_name='Fran',
+        )
+        conversation, _ = get_or_create_direct_conversation(cls.user, cls.other)
+        cls.message = Message.objects.create(conversation=conversation, sender=cls.other, body='hi')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response.json()
+
+    def test_conversations(self):
+        url = '/api/chat/conversations/'
+        self.assertEqual(
+            self.get(url, fields='other_user.first_name,last_message.message,nope'),
+            [{'other_user': {'first_name': 'Fran'}, 'last_message': {'message': 'hi'}}],
+        )
+        self.assertEqual(self.get(url, fields='is_group', expand='other_user'), [{'is_group': False}])
+        self.assertEqual(self.get(url, fields='nope'), [{}])
+
+    def test_messages(self):
+        url = f'/api/chat/messages/{self.other.id}/'
+        self.assertEqual(
+            self.get(url, fields='id,message,message.nope'),
+            [{'id': str(self.message.id), 'message': 'hi'}],
+        )
+        self.assertEqual(len(self.get(url, expand='sender')[0]), len(self.get(url)[0]))
+
+
+class RestSendPushTests(TestCase):
+    """A message sent over REST reaches the receiver's sockets through the channel layer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = CustomUser.objects.create_user(
+            username='sender', email='sender@example.com', password='pw'
+        )
+        cls.receiver = CustomUser.objects.create_user(
+            username='receiver', email='receiver@example.com', password='pw'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.sender)}')
+
+    def receive(self, channel):
+        return async_to_sync(get_channel_layer().receive)(channel)
+
+    def listen(self, group):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group, channel)
+        return channel
+
+    def test_first_message_reaches_personal_group(self):
+        channel = self.listen(f'user_{self.receiver.id}')
+        response = self.client.post(
+            '/api/chat/send/', {'receiver_id': str(self.receiver.id), 'message': 'hello'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+        event = self.receive(channel)
+        self.assertEqual(event['type'], 'chat_message')
+        self.assertEqual(event['message']['id'], response.json()['id'])
+        self.assertEqual(event['message']['receiver'], str(self.receiver.id))
+        self.assertTrue(event['message']['is_new_conversation'])
+
+    def test_later_messages_reach_conversation_group(self):
+        conversation, _ = get_or_create_direct_conversation(self.sender, self.receiver)
+        channel = self.listen(conversation.group_name)
+        response = self.client.post(
+            '/api/chat/send/', {'receiver_id': str(self.receiver.id), 'message': 'again'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.receive(channel)['message']['message'], 'again')
+
+
+def with_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class ChatRateLimitTests(TestCase):
+    """The async chat views answer 429 and sockets are closed once a bucket is empty"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='chatty', email='chatty@example.com', password='pw'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    @with_rates(chat='2/min')
+    def test_rest_view_throttled(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/chat/conversations/').status_code, 200)
+        response = self.client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response['Retry-After']), range(1, 31))
+
+    @with_rates(ws='2/min')
+    def test_socket_closed_past_frame_rate(self):
+        async def run():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), f'/ws/chat/?token={AccessToken.for_user(self.user)}'
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()  # connection confirmation
+            for _ in range(3):
+                await communicator.send_json_to({'type': 'typing_start', 'conversation_id': 'x'})
+            output = await communicator.receive_output()
+            while output['type'] != 'websocket.close':
+                output = await communicator.receive_output()
+            self.assertEqual(output['code'], 4029)
+            await communicator.disconnect()
+
+        async_to_sync(run)()
+
+
+class RetentionTests(TestCase):
+    """Archive batching, read-through paging and purging (chat/retention.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = CustomUser.objects.create_user(username='ann', email='ann@example.com', password='pw')
+        cls.b = CustomUser.objects.create_user(username='ben', email='ben@example.com', password='pw')
+
+    def setUp(self):
+        self.conversation, _ = get_or_create_direct_conversation(self.a, self.b)
+        self.old = timezone.now() - timedelta(days=400)
+        for i in range(5):
+            message = Message.objects.create(conversation=self.conversation, sender=self.a, body=f'old {i}')
+            Message.objects.filter(pk=message.pk).update(created_at=self.old + timedelta(minutes=i))
+        Message.objects.create(conversation=self.conversation, sender=self.b, body='recent')
+
+    def archive(self, **overrides):
+        return archive_messages(get_policy(ARCHIVE_AFTER_DAYS=180, BATCH_SIZE=2, **overrides))
+
+    def test_archives_old_messages_in_batches(self):
+        self.assertEqual(self.archive(), 5)
+        chunks = ArchivedMessageChunk.objects.filter(conversation=self.conversation)
+        self.assertEqual(sorted(chunk.message_count for chunk in chunks), [1, 2, 2])
+        self.assertEqual(list(Message.objects.values_list('body', flat=True)), ['recent'])
+
+    def test_jsonl_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(self.archive(BACKEND='jsonl', ARCHIVE_DIR=directory), 5)
+            records = load_archived_messages(self.conversation.id)
+        self.assertEqual([r['body'] for r in records], [f'old {i}' for i in range(5)])
+
+    def test_read_through_pages_back_from_before(self):
+        self.archive()
+        page = load_archived_messages(self.conversation.id, before=self.old + timedelta(minutes=3), limit=2)
+        self.assertEqual([r['body'] for r in page], ['old 1', 'old 2'])
+        page = load_archived_messages(self.conversation.id, before=self.old + timedelta(minutes=1), limit=2)
+        self.assertEqual([r['body'] for r in page], ['old 0'])
+
+    def test_history_rejects_invalid_before(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.a)}')
+        for url in (f'/api/chat/messages/{self.b.id}/', f'/api/chat/conversations/{self.conversation.id}/messages/'):
+            for before in ('2024-02-30T00:00:00', 'yesterday'):
+                response = client.get(url, {'before': before})
+                self.assertEqual(response.status_code, 400, (url, before))
+            response = client.get(url, {'before': (self.old + timedelta(minutes=2)).isoformat()})
+            self.assertEqual([m['message'] for m in response.json()], ['old 0', 'old 1'])
+
+    def delete_for(self, user, when, conversation=None):
+        DeletedConversation.objects.update_or_create(
+            user=user, conversation=conversation or self.conversation, defaults={'deleted_at': when}
+        )
+
+    def test_purges_conversations_every_member_deleted(self):
+        later = timezone.now() + timedelta(minutes=1)
+        self.delete_for(self.a, later)
+        self.assertEqual(purge_deleted_conversations(), 0)
+        self.delete_for(self.b, later)
+        self.assertEqual(purge_deleted_conversations(), 1)
+        self.assertFalse(Conversation.objects.filter(pk=self.conversation.pk).exists())
+
+    def test_deletions_by_former_members_dont_count(self):
+        c = CustomUser.objects.create_user(username='cat', email='cat@example.com', password='pw')
+        group = create_group(self.a, 'Committee', [self.b.id, c.id])
+        later = timezone.now() + timedelta(minutes=1)
+        self.delete_for(self.a, later, group)
+        remove_members(group, [self.a.id])
+        self.delete_for(self.b, later, group)
+        self.assertEqual(purge_deleted_conversations(), 0)
+        self.delete_for(c, later, group)
+        self.assertEqual(purge_deleted_conversations(), 1)
+        self.assertFalse(Conversation.objects.filter(pk=group.pk).exists())
+
+    def test_keeps_conversations_with_newer_messages(self):
+        earlier = timezone.now() - timedelta(minutes=1)
+        # both deleted it, then the pair talked again in the same conversation
+        self.delete_for(self.a, earlier)
+        self.delete_for(self.b, earlier)
+        self.assertEqual(purge_deleted_conversations(), 0)
+        self.assertTrue(Message.objects.filter(body='recent').exists())
+
+
+class EventStreamTests(TestCase):
+    """SSE fallback: authentication, heartbeats and Last-Event-ID replay"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='listener', email='listener@example.com', password='pw'
+        )
+        cls.other = CustomUser.objects.create_user(
+            username='talker', email='talker@example.com', password='pw'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def open(self, ticket=None, **headers):
+        if ticket is None:
+            ticket = stream_token(self.user)
+        request = RequestFactory().get('/api/chat/events/', {'ticket': ticket} if ticket else {}, headers=headers)
+        return async_to_sync(event_stream)(request)
+
+    def access(self, user=None):
+        token = AccessToken.for_user(user or self.user)
+        return {'Authorization': f'Bearer {token}'}
+
+    def read(self, response, count):
+        """The first ``count`` chunks of the stream, then close it"""
+        async def read():
+            chunks = []
+            stream = response.streaming_content
+            async for chunk in stream:
+                chunks.append(chunk.decode())
+                if len(chunks) == count:
+                    break
+            await stream.aclose()
+            return chunks
+        return async_to_sync(read)()
+
+    def test_stream_token(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/chat/events/token/').status_code, 401)
+        client.credentials(HTTP_AUTHORIZATION=self.access()['Authorization'])
+        response = client.post('/api/chat/events/token/')
+        self.assertEqual(response.status_code, 200)
+        token = response.json()['token']
+        self.assertEqual(response.json()['url'], f"/api/chat/events/?{urlencode({'ticket': token})}")
+        self.assertEqual(self.open(token).status_code, 200)
+
+    def test_rejects_other_tokens(self):
+        self.assertEqual(self.open('').status_code, 401)
+        self.assertEqual(self.open('nope').status_code, 401)
+        # access tokens only in the header, never in the URL
+        self.assertEqual(self.open(str(AccessToken.for_user(self.user))).status_code, 401)
+        self.assertEqual(self.open('', Authorization=f'Bearer {RefreshToken.for_user(self.user)}').status_code, 401)
+        self.assertEqual(self.open('', **self.access()).status_code, 200)
+
+        with mock.patch('chat.sse.STREAM_TOKEN_MAX_AGE', -1):
+            self.assertEqual(self.open().status_code, 401)
+        ticket, headers = stream_token(self.user), self.access()
+        CustomUser.objects.filter(pk=self.user.pk).update(token_version=1)
+        self.assertEqual(self.open(ticket).status_code, 401)
+        self.assertEqual(self.open('', **headers).status_code, 401)
+
+    @with_rates(chat='2/min')
+    def test_throttled(self):
+        for _ in range(2):
+            self.assertEqual(self.open().status_code, 200)
+        self.assertEqual(self.open().status_code, 429)
+
+    @mock.patch('chat.sse.HEARTBEAT_SECONDS', 0.01)
+    def test_only_messages_have_ids(self):
+        response = self.open()
+        layer = get_channel_layer()
+        conversation, _ = get_or_create_direct_conversation(self.user, self.other)
+        message = Message.objects.create(conversation=conversation, sender=self.other, body='hi')
+
+        async def send():
+            await layer.group_send(f'user_{self.user.id}', {'type': 'conversation_left', 'conversation_id': 'x'})
+            await layer.group_send(f'user_{self.user.id}', {
+                'type': 'chat_message', 'message': {'id': str(message.id), 'timestamp': message.created_at.isoformat()},
+            })
+        async def read():
+            events = []
+            stream = response.streaming_content
+            async for chunk in stream:
+                events.append(chunk.decode())
+                if len(events) == 2:
+                    # subscribed once the stream has started
+                    await send()
+                if len([e for e in events[2:] if not e.startswith(':')]) == 2:
+                    break
+            await stream.aclose()
+            return events
+        _, established, *events = async_to_sync(read)()
+        self.assertNotIn('id: ', established)
+        left, chat = [event for event in events if not event.startswith(':')]
+        self.assertTrue(left.startswith('event: conversation_left'))
+        self.assertTrue(chat.startswith(f'id: {_event_id(message.created_at)}\nevent: chat_message'))
+
+    @mock.patch('chat.sse.HEARTBEAT_SECONDS', 0.01)
+    def test_heartbeat(self):
+        response = self.open()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        retry, established, heartbeat = self.read(response, 3)
+        self.assertTrue(retry.startswith('retry: '))
+        self.assertIn('event: connection_established', established)
+        self.assertEqual(heartbeat, ': heartbeat\n\n')
+
+    @mock.patch('chat.sse.HEARTBEAT_SECONDS', 0.01)
+    def test_resume_replays_missed_messages(self):
+        conversation, _ = get_or_create_direct_conversation(self.user, self.other)
+        seen = Message.objects.create(conversation=conversation, sender=self.other, body='seen')
+        missed = Message.objects.create(conversation=conversation, sender=self.other, body='missed')
+        Message.objects.filter(pk=seen.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        seen.refresh_from_db()
+        last_event_id = _event_id(seen.created_at)
+
+        response = self.open(**{'Last-Event-ID': last_event_id})
+        _, _, replayed, after = self.read(response, 4)
+        self.assertIn('event: chat_message', replayed)
+        self.assertIn(f'"id": "{missed.id}"', replayed)
+        self.assertIn(f'"receiver": "{self.user.id}"', replayed)
+        self.assertEqual(after, ': heartbeat\n\n')
+
+
+class GroupMembershipTests(QueryBudgetMixin, TestCase):
+    """Group creation, roles and the cached member lists"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.member, cls.outsider = [
+            CustomUser.objects.create_user(username=name, email=f'{name}@example.com', password='pw')
+            for name in ('owner', 'member', 'outsider')
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.group = create_group(self.owner, 'Reunion committee', [self.member.id, self.owner.id])
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def roles(self):
+        return dict(ConversationMember.objects.filter(conversation=self.group).values_list('user_id', 'role'))
+
+    def test_create_group(self):
+        # the owner listed among the members is still one owner row
+        self.assertEqual(self.roles(), {
+            self.owner.id: ConversationMember.ROLE_OWNER,
+            self.member.id: ConversationMember.ROLE_MEMBER,
+        })
+        with mock.patch('chat.services.GROUP_MAX_MEMBERS', 2):
+            with self.assertRaises(MembershipError):
+                create_group(self.owner, 'Too big', [self.member.id, self.outsider.id])
+
+    def test_only_admins_manage_members(self):
+        url = f'/api/chat/groups/{self.group.id}/members/'
+        payload = {'member_ids': [str(self.outsider.id)]}
+        self.assertEqual(self.client_for(self.member).post(url, payload, format='json').status_code, 403)
+        self.assertEqual(self.client_for(self.outsider).get(url).status_code, 404)
+
+        response = self.client_for(self.owner).post(url, payload, format='json')
+        self.assertEqual(response.json()['member_ids'], [str(self.outsider.id)])
+
+        ConversationMember.objects.filter(conversation=self.group, user=self.member).update(
+            role=ConversationMember.ROLE_ADMIN
+        )
+        response = self.client_for(self.member).delete(url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # anyone may leave
+        ConversationMember.objects.filter(conversation=self.group, user=self.member).update(
+            role=ConversationMember.ROLE_MEMBER
+        )
+        response = self.client_for(self.member).delete(url, {'member_ids': [str(self.member.id)]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(self.roles()), {self.owner.id})
+
+    def test_only_actual_members_are_removed(self):
+        url = f'/api/chat/groups/{self.group.id}/members/'
+        stranger = str(uuid.uuid4())
+        with mock.patch('chat.api.notify_users') as notify:
+            response = self.client_for(self.owner).delete(
+                url, {'member_ids': [stranger, str(self.outsider.id), str(self.member.id)]}, format='json'
+            )
+        self.assertEqual(response.json()['member_ids'], [str(self.member.id)])
+        self.assertEqual(list(notify.call_args.args[0]), [str(self.member.id)])
+
+    def test_roles_rank(self):
+        url = f'/api/chat/groups/{self.group.id}/members/'
+        add_members(self.group, [self.outsider.id])
+        ConversationMember.objects.filter(conversation=self.group, user__in=[self.member, self.outsider]).update(
+            role=ConversationMember.ROLE_ADMIN
+        )
+        admin = self.client_for(self.member)
+        for target in (self.owner, self.outsider):
+            response = admin.delete(url, {'member_ids': [str(target.id)]}, format='json')
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(len(self.roles()), 3)
+
+        response = self.client_for(self.owner).delete(url, {'member_ids': [str(self.outsider.id)]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_owner_leaving_hands_over(self):
+        add_members(self.group, [self.outsider.id])
+        ConversationMember.objects.filter(conversation=self.group, user=self.outsider).update(
+            role=ConversationMember.ROLE_ADMIN
+        )
+        remove_members(self.group, [self.owner.id])
+        self.assertEqual(self.roles(), {
+            self.member.id: ConversationMember.ROLE_MEMBER,
+            self.outsider.id: ConversationMember.ROLE_OWNER,
+        })
+        # without an admin the longest-standing member takes over
+        remove_members(self.group, [self.outsider.id])
+        self.assertEqual(self.roles(), {self.member.id: ConversationMember.ROLE_OWNER})
+
+    def test_malformed_member_ids(self):
+        client = self.client_for(self.owner)
+        url = f'/api/chat/groups/{self.group.id}/members/'
+        for member_ids in (['nope'], [str(self.outsider.id), 42], 'nope'):
+            payload = {'member_ids': member_ids}
+            self.assertEqual(client.post('/api/chat/groups/', {'title': 't', **payload}, format='json').status_code, 400)
+            self.assertEqual(client.post(url, payload, format='json').status_code, 400)
+            self.assertEqual(client.delete(url, payload, format='json').status_code, 400)
+        self.assertEqual(set(self.roles()), {self.owner.id, self.member.id})
+
+    def test_member_list_is_cached(self):
+        members = {str(self.owner.id), str(self.member.id)}
+        self.assertEqual(set(get_member_ids(self.group.id)), members)
+        get_user_conversation_ids(self.owner.id)
+        with self.assertQueryBudget(0):
+            self.assertEqual(set(get_member_ids(self.group.id)), members)
+            self.assertIn(str(self.group.id), get_user_conversation_ids(self.owner.id))
+
+    def test_process_local_cache_keeps_lists_briefly(self):
+        self.assertEqual(member_cache_timeout(), LOCAL_MEMBER_CACHE_TIMEOUT)
+        with mock.patch.object(cache, 'set') as cache_set:
+            get_member_ids(self.group.id)
+        self.assertEqual(cache_set.call_args.args[2], LOCAL_MEMBER_CACHE_TIMEOUT)
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.gettempdir(),
+        }}
+        with override_settings(CACHES=shared):
+            self.assertEqual(member_cache_timeout(), MEMBER_CACHE_TIMEOUT)
+
+    def test_service_changes_invalidate(self):
+        get_user_conversation_ids(self.outsider.id)
+        add_members(self.group, [self.outsider.id])
+        self.assertIn(str(self.outsider.id), get_member_ids(self.group.id))
+        self.assertIn(str(self.group.id), get_user_conversation_ids(self.outsider.id))
+
+        remove_members(self.group, [self.outsider.id])
+        self.assertNotIn(str(self.outsider.id), get_member_ids(self.group.id))
+        self.assertEqual(get_user_conversation_ids(self.outsider.id), [])
+
+    def test_m2m_changes_invalidate(self):
+        get_member_ids(self.group.id)
+        get_user_conversation_ids(self.outsider.id)
+        self.group.participants.add(self.outsider)
+        self.assertIn(str(self.outsider.id), get_member_ids(self.group.id))
+        self.assertEqual(get_user_conversation_ids(self.outsider.id), [str(self.group.id)])
+
+        self.outsider.conversations.remove(self.group)
+        self.assertNotIn(str(self.outsider.id), get_member_ids(self.group.id))
+
+    def test_clear_invalidates_every_member(self):
+        # post_clear carries no pk_set; the deleted member rows invalidate
+        get_member_ids(self.group.id)
+        get_user_conversation_ids(self.member.id)
+        self.group.participants.clear()
+        self.assertEqual(get_member_ids(self.group.id), [])
+        self.assertEqual(get_user_conversation_ids(self.member.id), [])
+
+        # and from the user's side
+        other = create_group(self.owner, 'Second', [self.member.id])
+        get_member_ids(other.id)
+        self.member.conversations.clear()
+        self.assertEqual(get_member_ids(other.id), [str(self.owner.id)])
+
+
+class DirectConversationTests(TestCase):
+    """One conversation per pair of users, however the pair is written"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = [
+            CustomUser.objects.create_user(username=name, email=f'{name}@example.com', password='pw')
+            for name in ('alice', 'bob')
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_direct_key_is_canonical(self):
+        a, b = self.alice.id, self.bob.id
+        key = Conversation.direct_key_for(a, b)
+        self.assertEqual(key, Conversation.direct_key_for(b, a))
+        self.assertEqual(key, Conversation.direct_key_for(str(a).upper(), b.hex))
+        self.assertEqual(key, ':'.join(sorted([a.hex, b.hex])))
+        with self.assertRaises(ValueError):
+            Conversation.direct_key_for(a, 'not-a-uuid')
+
+    def test_get_or_create(self):
+        conversation, created = get_or_create_direct_conversation(self.alice, self.bob)
+        self.assertTrue(created)
+        self.assertEqual(set(get_member_ids(conversation.id)), {str(self.alice.id), str(self.bob.id)})
+        self.assertEqual(get_or_create_direct_conversation(self.bob, self.alice), (conversation, False))
+
+    def test_losing_a_concurrent_create(self):
+        winner, _ = get_or_create_direct_conversation(self.alice, self.bob)
+        real_get = QuerySet.get
+        lookups = []
+
+        def get(queryset, *args, **kwargs):
+            # the first lookup runs before the other request's insert
+            lookups.append(kwargs)
+            if len(lookups) == 1:
+                raise queryset.model.DoesNotExist
+            return real_get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', get):
+            conversation, created = get_or_create_direct_conversation(self.bob, self.alice)
+        self.assertEqual((conversation, created), (winner, False))
+        self.assertEqual(len(lookups), 2)  # the insert hit the unique key
+        self.assertEqual(Conversation.objects.count(), 1)
+        self.assertEqual(ConversationMember.objects.filter(conversation=winner).count(), 2)
+
+    def test_message_to_yourself(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.alice)}')
+        payload = {'receiver_id': str(self.alice.id), 'message': 'note to self'}
+        first = client.post('/api/chat/send/', payload, format='json')
+        self.assertEqual(first.status_code, 201)
+        second = client.post('/api/chat/send/', payload, format='json')
+        self.assertEqual(second.json()['conversation_id'], first.json()['conversation_id'])
+
+        conversation = Conversation.objects.get(pk=first.json()['conversation_id'])
+        self.assertEqual(conversation.direct_key, f'{self.alice.id.hex}:{self.alice.id.hex}')
+        self.assertEqual(get_member_ids(conversation.id), [str(self.alice.id)])
+        self.assertEqual(conversation.messages.count(), 2)
+
+    def test_unknown_receiver(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.alice)}')
+        response = client.post(
+            '/api/chat/send/', {'receiver_id': str(uuid.uuid4()), 'message': 'hello?'}, format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Conversation.objects.exists())
@@ -1,10 +1,15 @@
 from django.urls import path
-from . import api
+from . import api, sse
 
 urlpatterns = [
     path('conversations/', api.get_conversations, name='get_conversations'),
     path('messages/<str:user_id>/', api.get_messages, name='get_messages'),  # Changed to str
     path('send/', api.send_message, name='send_message'),
     path('conversations/<uuid:conversation_id>/delete/', api.delete_conversation, name='delete_conversation'),
+    path('conversations/<uuid:conversation_id>/messages/', api.get_conversation_messages, name='get_conversation_messages'),
+    path('groups/', api.create_group_conversation, name='create_group_conversation'),
+    path('groups/<uuid:conversation_id>/members/', api.group_members, name='group_members'),
+    path('events/', sse.event_stream, name='chat_event_stream'),
+    path('events/token/', sse.event_stream_token, name='chat_event_stream_token'),
 
 ]
\ No newline at end of file